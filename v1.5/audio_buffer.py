@@ -0,0 +1,157 @@
+# audio_buffer.py
+
+import queue
+import logging
+import multiprocessing
+from dataclasses import dataclass
+import numpy as np
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Default budgets for audio waiting to be played
+DEFAULT_MAX_SECONDS = 60.0
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Once a budget is hit, producers wait until the buffer drains below this fraction of it
+DEFAULT_LOW_WATER_FRACTION = 0.5
+
+@dataclass
+class AudioClip:
+    """A synthesized clip on its way to the player"""
+    samples: np.ndarray
+    sample_rate: int
+    gap_after: float = 0.0  # Seconds of silence the player leaves after this clip
+    kind: str = 'clip'  # 'clip' for produced content, 'filler' for lines the player inserts
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    @property
+    def nbytes(self):
+        return self.samples.nbytes
+
+class AudioBuffer:
+    """
+    Cross-process audio queue bounded by seconds of audio and by bytes instead of clip count.
+    Producers block once either budget (high watermark) would be exceeded and resume when the
+    buffer has drained below the low watermark. A clip is always accepted into an empty buffer.
+    """
+
+    def __init__(
+        self,
+        stop_event,
+        max_seconds=DEFAULT_MAX_SECONDS,
+        max_bytes=DEFAULT_MAX_BYTES,
+        low_water_fraction=DEFAULT_LOW_WATER_FRACTION
+    ):
+        self.stop_event = stop_event
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.low_water_seconds = max_seconds * low_water_fraction
+        self.low_water_bytes = max_bytes * low_water_fraction
+
+        self._queue = multiprocessing.Queue()
+        self._cond = multiprocessing.Condition()
+        # Shared counters, guarded by the condition's lock
+        self._seconds = multiprocessing.Value('d', 0.0, lock=False)
+        self._bytes = multiprocessing.Value('q', 0, lock=False)
+        self._clips = multiprocessing.Value('i', 0, lock=False)
+        # Set while producers wait for the buffer to drain to the low watermark
+        self._draining = multiprocessing.Value('b', 0, lock=False)
+        # Set by the player's buffer controller while playback is at risk of running dry;
+        # producers shorten their scripts and skip pauses while it is set
+        self.low_water = multiprocessing.Event()
+        # Filler libraries offered by producers, and playback events reported back to them
+        self._fillers = multiprocessing.Queue()
+        self._events = multiprocessing.Queue()
+
+    def _has_room(self, clip):
+        if self._clips.value == 0:
+            return True
+        if self._draining.value:
+            if self._seconds.value > self.low_water_seconds or self._bytes.value > self.low_water_bytes:
+                return False
+            self._draining.value = 0
+        if (self._seconds.value + clip.duration > self.max_seconds
+                or self._bytes.value + clip.nbytes > self.max_bytes):
+            self._draining.value = 1
+            return False
+        return True
+
+    def put(self, samples, sample_rate, gap_after=0.0):
+        """
+        Queue a clip for playback, blocking while the buffer is over budget.
+        gap_after is the pause the listener should hear after the clip.
+        Returns False if the session stopped before the clip could be queued.
+        """
+        clip = AudioClip(np.asarray(samples, dtype=np.float32), sample_rate, gap_after)
+        with self._cond:
+            while not self._has_room(clip):
+                if self.stop_event.is_set():
+                    return False
+                self._cond.wait()
+            self._seconds.value += clip.duration
+            self._bytes.value += clip.nbytes
+            self._clips.value += 1
+        self._queue.put(clip)
+        return True
+
+    def get(self, timeout=None):
+        """Take the next clip for playback; raises queue.Empty on timeout."""
+        clip = self._queue.get(timeout=timeout)
+        with self._cond:
+            self._seconds.value = max(self._seconds.value - clip.duration, 0.0)
+            self._bytes.value = max(self._bytes.value - clip.nbytes, 0)
+            self._clips.value -= 1
+            self._cond.notify_all()
+        return clip
+
+    def wake(self):
+        """Wake blocked producers so they can notice the session is stopping."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def offer_fillers(self, fillers):
+        """Hand a pre-rendered filler library to the player."""
+        if fillers:
+            self._fillers.put(list(fillers))
+            # Never hold up producer exit on a library the player did not collect
+            self._fillers.cancel_join_thread()
+
+    def take_fillers(self):
+        """Filler libraries offered since the last call (player side)."""
+        fillers = []
+        while True:
+            try:
+                fillers.extend(self._fillers.get_nowait())
+            except queue.Empty:
+                return fillers
+
+    def report_event(self, event):
+        """Report a playback event, such as an inserted filler, back to the producers."""
+        self._events.put(event)
+
+    def drain_events(self):
+        """Playback events reported since the last call (producer side)."""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def empty(self):
+        return self._clips.value == 0
+
+    def buffered_seconds(self):
+        return self._seconds.value
+
+    def depth(self):
+        """Current buffer depth, for progress reporting and logs."""
+        with self._cond:
+            return {
+                'buffered_seconds': self._seconds.value,
+                'buffered_bytes': self._bytes.value,
+                'buffered_clips': self._clips.value
+            }
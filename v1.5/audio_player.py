@@ -1,29 +1,74 @@
 # audio_player.py
 
-import sounddevice as sd
-import numpy as np
-
-def audio_player_process(audio_queue, stop_event, selected_audio_device):
-    # Set the default output device to the selected device
-    sd.default.device[1] = selected_audio_device  # Set the default output device
-    devices = sd.query_devices()
-    print(f"\nAudio Player Process: Using Output Device: {devices[selected_audio_device]['name']}")
-
-    while not stop_event.is_set() or not audio_queue.empty():
-        try:
-            # Get audio data from the queue with a timeout
-            wav = audio_queue.get(timeout=1)
-            play_audio(wav)
-        except Exception:
-            # Timeout or empty queue
-            if stop_event.is_set():
-                break  # Exit if stop event is set and queue is empty
-
-def play_audio(audio_data):
+import logging
+from buffer_controller import BufferController, DEFAULT_PREROLL_SECONDS
+from playback_ring import PlaybackRing
+from audio_processing import LoudnessNormalizer
+from stream_recorder import StreamRecorder
+from audio_sinks import DeviceSink
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+def audio_player_process(
+    audio_buffer,
+    stop_event,
+    sink,
+    preroll_seconds=DEFAULT_PREROLL_SECONDS,
+    recording_dir=None
+):
+    # A device number selects that sound device; otherwise sink is an audio_sinks sink
+    if not hasattr(sink, 'start'):
+        sink = DeviceSink(sink)
+    print(f"\nAudio Player Process: Using {sink.describe()}")
+
+    controller = BufferController(audio_buffer, stop_event, preroll_seconds=preroll_seconds)
+    controller.wait_for_preroll()
+
+    # Tees everything sent to the device into rotating files on disk
+    recorder = StreamRecorder(recording_dir) if recording_dir else None
+    if recorder is not None:
+        print(f"Audio Player Process: Recording stream to {recording_dir}")
+
+    ring = None
+    normalizer = None
     try:
-        # Adjust this to match your audio settings
-        sample_rate = 22050
-        sd.play(audio_data, sample_rate)
-        sd.wait()
+        while True:
+            # Get the next clip from the buffer; None once the session is over
+            clip = controller.next_clip()
+            if clip is None:
+                break
+
+            # The sink runs at the clip's sample rate; restart it on a new ring if that changes
+            if ring is None or clip.sample_rate != ring.sample_rate:
+                if ring is not None:
+                    ring.drain(on_wait=controller.update)
+                    sink.stop()
+                ring = PlaybackRing(clip.sample_rate)
+                sink.start(ring)
+                controller.attach_ring(ring)
+                if recorder is not None:
+                    recorder.attach(ring)
+                # Evens out loudness across producers and fillers for the listener
+                normalizer = LoudnessNormalizer.for_sink('playback', clip.sample_rate)
+
+            logger.debug(f"Playing {clip.duration:.1f}s clip; buffer depth {audio_buffer.depth()}")
+            normalizer.process(clip.samples)
+            if recorder is not None:
+                recorder.mark(clip.kind, clip.duration, clip.gap_after)
+            ring.write(clip.samples, on_wait=controller.update)
+            if clip.gap_after > 0:
+                # Pacing pause requested by the producer, rendered as silence
+                ring.write_silence(clip.gap_after, on_wait=controller.update)
+
+        if ring is not None:
+            ring.drain(on_wait=controller.update)
     except Exception as e:
         print(f"Error playing audio: {e}")
+        logger.error(f"Error playing audio: {e}", exc_info=True)
+    finally:
+        sink.close()
+        if recorder is not None:
+            recorder.close()
+
+    controller.report()
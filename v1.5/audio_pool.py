@@ -0,0 +1,148 @@
+# audio_pool.py
+
+import os
+import sys
+import queue
+import threading
+import logging
+import numpy as np
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Buffers kept for reuse; clips beyond this many in flight get a plain allocation
+DEFAULT_MAX_BUFFERS = 8
+# New buffers get headroom so slightly longer clips can reuse them
+GROWTH_FACTOR = 1.25
+
+class BufferPool:
+    """
+    Reusable float32 buffers for the post-synthesis path.
+    acquire() hands out a view of a pooled buffer; the buffer returns to the pool by itself once
+    that view and every view derived from it are gone, which is detected from its reference count.
+    """
+
+    def __init__(self, max_buffers=DEFAULT_MAX_BUFFERS):
+        self.max_buffers = max_buffers
+        self._buffers = []
+        self._lock = threading.Lock()
+        self._free_refs = self._free_baseline()
+        # Metrics
+        self.allocations = 0
+        self.reuses = 0
+        self.overflows = 0
+
+    @staticmethod
+    def _refcount(buffer):
+        return sys.getrefcount(buffer)
+
+    def _free_baseline(self):
+        """Reference count of a buffer only the pool holds, measured the same way acquire() checks it."""
+        probe = [np.empty(0, dtype=np.float32)]
+        for buffer in probe:
+            return self._refcount(buffer)
+
+    def acquire(self, length):
+        """A float32 array of the given length, backed by a pooled buffer whenever one is free."""
+        with self._lock:
+            free = None
+            smallest_free = None
+            for buffer in self._buffers:
+                if self._refcount(buffer) > self._free_refs:
+                    continue  # Still referenced through a view
+                if len(buffer) >= length and (free is None or len(buffer) < len(free)):
+                    free = buffer
+                elif smallest_free is None or len(buffer) < len(smallest_free):
+                    smallest_free = buffer
+            if free is not None:
+                self.reuses += 1
+                return free[:length]
+
+            if len(self._buffers) >= self.max_buffers:
+                if smallest_free is None:
+                    self.overflows += 1
+                    logger.debug(f"Buffer pool exhausted; allocating {length} samples outside the pool")
+                    return np.empty(length, dtype=np.float32)
+                # Every free buffer is too small: replace the smallest one with a larger buffer
+                self._buffers = [buffer for buffer in self._buffers if buffer is not smallest_free]
+                smallest_free = None
+
+            buffer = np.empty(int(length * GROWTH_FACTOR), dtype=np.float32)
+            self._buffers.append(buffer)
+            self.allocations += 1
+            return buffer[:length]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffers': len(self._buffers),
+                'pooled_samples': sum(len(buffer) for buffer in self._buffers),
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'overflows': self.overflows
+            }
+
+class WorkerModels:
+    """
+    One TTS model per synthesis worker thread: a model is never used by two threads at once.
+    The first worker takes the model passed in; the others build theirs with factory() on their
+    first synthesis. With several workers, torch's CPU threads are split between them instead of
+    every model using all of them.
+    """
+
+    def __init__(self, model, factory, workers=1):
+        self.factory = factory
+        self.workers = max(1, workers)
+        self._idle = queue.SimpleQueue()
+        self._idle.put(model)
+        self._local = threading.local()
+        if self.workers > 1:
+            import torch
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+            logger.info(f"{self.workers} TTS workers, {torch.get_num_threads()} threads each")
+
+    def get(self):
+        """The calling worker's model, loaded on its first synthesis."""
+        model = getattr(self._local, 'model', None)
+        if model is None:
+            try:
+                model = self._idle.get_nowait()
+            except queue.Empty:
+                logger.info(f"Loading a TTS model for {threading.current_thread().name}")
+                model = self.factory()
+            self._local.model = model
+        return model
+
+def synthesize_pooled(tts_model, pool, text, speaker=None, cache=None, stats=None, **tts_kwargs):
+    """
+    Synthesize text with the model's public tts() API and copy the output into a pooled float32 buffer.
+    tts_kwargs (speed and the like) are passed on to tts() unchanged.
+    cache: optional SynthesisCache of sentence audio. The text is then synthesized one sentence per
+    tts() call, so sentences already heard with the same voice and settings are taken from it.
+    stats: optional dict filled with reused_samples and total_samples of speech.
+    """
+    reused_samples = 0
+    if cache is None:
+        pieces = [tts_model.tts(text, speaker=speaker, **tts_kwargs)]
+    else:
+        voice = (speaker, tuple(sorted(tts_kwargs.items())))
+        pieces = []
+        for sentence in tts_model.synthesizer.split_into_sentences(text):
+            waveform = cache.get(sentence, voice)
+            if waveform is None:
+                # Includes the pause Coqui leaves after every sentence, as a whole-text tts() call would
+                waveform = np.asarray(tts_model.tts(sentence, speaker=speaker, **tts_kwargs), dtype=np.float32)
+                cache.put(sentence, waveform, voice)
+            else:
+                reused_samples += len(waveform)
+            pieces.append(waveform)
+
+    out = pool.acquire(sum(len(piece) for piece in pieces))
+    position = 0
+    for piece in pieces:
+        out[position:position + len(piece)] = piece
+        position += len(piece)
+    if stats is not None:
+        stats['reused_samples'] = reused_samples
+        stats['total_samples'] = len(out)
+    return out
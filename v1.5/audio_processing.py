@@ -0,0 +1,209 @@
+# audio_processing.py
+
+import math
+from functools import lru_cache
+import numpy as np
+
+# Frames quieter than this, relative to the loudest frame, count as silence at the clip edges
+DEFAULT_TRIM_THRESHOLD_DB = -45.0
+DEFAULT_TRIM_FRAME_MS = 10
+# Silence kept around the speech so consonants are not clipped
+DEFAULT_TRIM_KEEP_MS = 30
+# Fade applied at the edges of exported files
+DEFAULT_EDGE_FADE_MS = 10
+# Overlap between consecutive clips (and between a clip and a pause) when they are joined
+DEFAULT_CROSSFADE_MS = 30
+
+# Speech loudness targets (RMS dBFS) for each kind of output
+LOUDNESS_TARGETS = {
+    'playback': -20.0,
+    'file': -18.0,
+}
+# Peak ceiling enforced by the limiter, in dBFS
+DEFAULT_CEILING_DB = -1.0
+# Loudness is tracked over this many seconds of speech
+DEFAULT_LOUDNESS_WINDOW_SECONDS = 3.0
+DEFAULT_LOOKAHEAD_MS = 20
+DEFAULT_RELEASE_MS = 200
+DEFAULT_MAX_GAIN_DB = 30.0
+# Frames quieter than this do not move the loudness estimate
+LOUDNESS_GATE_DB = -50.0
+LOUDNESS_FRAME_MS = 10
+# Frames whose gain envelopes are built at once in the preallocated scratch buffer
+GAIN_BLOCK_FRAMES = 64
+
+def db_to_gain(db):
+    return 10 ** (db / 20)
+
+def trim_silence(
+    wav,
+    sample_rate,
+    threshold_db=DEFAULT_TRIM_THRESHOLD_DB,
+    frame_ms=DEFAULT_TRIM_FRAME_MS,
+    keep_ms=DEFAULT_TRIM_KEEP_MS
+):
+    """
+    Trim leading and trailing silence using per-frame energy.
+    Returns a view of wav, so no audio is copied; silent clips are returned unchanged.
+    """
+    frame = max(int(sample_rate * frame_ms / 1000), 1)
+    num_frames = len(wav) // frame
+    if num_frames == 0:
+        return wav
+    # Frame matrix is a view of the clip; einsum sums squares without materializing them
+    frames = wav[:num_frames * frame].reshape(num_frames, frame)
+    energy = np.einsum('ij,ij->i', frames, frames)
+    peak = energy.max()
+    if peak <= 0:
+        return wav
+    active = np.flatnonzero(energy > peak * 10 ** (threshold_db / 10))
+    keep = int(sample_rate * keep_ms / 1000)
+    start = max(active[0] * frame - keep, 0)
+    end = min((active[-1] + 1) * frame + keep, len(wav))
+    return wav[start:end]
+
+@lru_cache(maxsize=32)
+def equal_power_curves(length):
+    """Fade-out and fade-in gains whose squares sum to one, so a crossfade keeps loudness constant."""
+    t = (np.arange(length, dtype=np.float32) + 0.5) / length * (np.pi / 2)
+    fade_out = np.cos(t).astype(np.float32)
+    fade_in = np.sin(t).astype(np.float32)
+    # Shared between callers through the cache
+    fade_out.setflags(write=False)
+    fade_in.setflags(write=False)
+    return fade_out, fade_in
+
+def apply_edge_fades(wav, sample_rate, fade_ms=DEFAULT_EDGE_FADE_MS):
+    """Equal-power fade-in and fade-out at the clip edges, in place."""
+    length = min(int(sample_rate * fade_ms / 1000), len(wav) // 2)
+    if length <= 0:
+        return wav
+    fade_out, fade_in = equal_power_curves(length)
+    wav[:length] *= fade_in
+    wav[-length:] *= fade_out
+    return wav
+
+def join_clips(wavs, sample_rate, gap_seconds=0.0, crossfade_ms=DEFAULT_CROSSFADE_MS):
+    """
+    Concatenate clips the way the playback ring joins them: an equal-power crossfade between
+    neighbours, or, with a gap, a fade out into the silence and a fade in from it.
+    """
+    fade_length = int(sample_rate * crossfade_ms / 1000)
+    gap = np.zeros(int(gap_seconds * sample_rate), dtype=np.float32)
+    pieces = []
+    for index, wav in enumerate(wavs):
+        if index > 0 and len(gap) > 0:
+            pieces.append(gap)
+        pieces.append(wav)
+    joined = np.empty(sum(len(piece) for piece in pieces), dtype=np.float32)
+    end = 0
+    held = 0
+    for piece in pieces:
+        overlap = min(held, len(piece))
+        if overlap > 0:
+            fade_out, fade_in = equal_power_curves(overlap)
+            joined[end - overlap:end] *= fade_out
+            joined[end - overlap:end] += piece[:overlap] * fade_in
+        joined[end:end + len(piece) - overlap] = piece[overlap:]
+        end += len(piece) - overlap
+        held = min(fade_length, len(piece))
+    return joined[:end]
+
+class LoudnessNormalizer:
+    """
+    Loudness normalization for one output sink; each clip should go through it exactly once.
+    Every clip is measured as a whole to seed the loudness estimate, so a quiet clip after a loud
+    one is not played at the loud clip's gain. Within the clip the gain follows a windowed RMS
+    estimate of the speech towards the sink's target, and a look-ahead limiter keeps peaks under
+    the ceiling. Works in place on float32 buffers; silent audio is left unchanged.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        target_db=LOUDNESS_TARGETS['playback'],
+        ceiling_db=DEFAULT_CEILING_DB,
+        window_seconds=DEFAULT_LOUDNESS_WINDOW_SECONDS,
+        lookahead_ms=DEFAULT_LOOKAHEAD_MS,
+        release_ms=DEFAULT_RELEASE_MS,
+        max_gain_db=DEFAULT_MAX_GAIN_DB
+    ):
+        self.sample_rate = sample_rate
+        self.frame = max(int(sample_rate * LOUDNESS_FRAME_MS / 1000), 1)
+        self.target = db_to_gain(target_db)
+        self.ceiling = db_to_gain(ceiling_db)
+        self.max_gain = db_to_gain(max_gain_db)
+        self.gate = db_to_gain(LOUDNESS_GATE_DB) ** 2
+        self.window_alpha = min(self.frame / (window_seconds * sample_rate), 1.0)
+        self.release_alpha = min(self.frame / (release_ms / 1000 * sample_rate), 1.0)
+        self.lookahead = max(math.ceil(lookahead_ms / LOUDNESS_FRAME_MS), 1)
+        # Gain ramps from the previous frame's gain to the current one across each frame
+        self._ramp = (np.arange(self.frame, dtype=np.float32) + 1) / self.frame
+        self._scratch = np.empty((GAIN_BLOCK_FRAMES, self.frame), dtype=np.float32)
+        # Running state within the clip being processed
+        self._mean_square = None
+        self._limiter_gain = 1.0
+        self._last_gain = None
+
+    @classmethod
+    def for_sink(cls, sink, sample_rate, **kwargs):
+        """Normalizer using the loudness target configured for an output sink."""
+        return cls(sample_rate, target_db=LOUDNESS_TARGETS[sink], **kwargs)
+
+    def _frame_gains(self, energy, peaks, voiced):
+        num_frames = len(energy)
+        # Loudest peak within the look-ahead, so the limiter starts reducing before it arrives
+        ahead = peaks.copy()
+        for shift in range(1, min(self.lookahead, num_frames - 1) + 1):
+            np.maximum(ahead[:-shift], peaks[shift:], out=ahead[:-shift])
+
+        gains = np.empty(num_frames, dtype=np.float32)
+        mean_square = self._mean_square
+        limiter_gain = self._limiter_gain
+        for i in range(num_frames):
+            if voiced[i]:
+                mean_square += self.window_alpha * (energy[i] - mean_square)
+            gain = min(self.target / math.sqrt(mean_square), self.max_gain)
+            peak = ahead[i] * gain
+            required = self.ceiling / peak if peak > self.ceiling else 1.0
+            # Reduce instantly, recover gradually
+            limiter_gain = min(required, limiter_gain + (1.0 - limiter_gain) * self.release_alpha)
+            gains[i] = gain * limiter_gain
+        self._mean_square = mean_square
+        self._limiter_gain = limiter_gain
+        return gains
+
+    def _apply_gains(self, frames, gains):
+        previous = np.empty_like(gains)
+        previous[0] = self._last_gain if self._last_gain is not None else gains[0]
+        previous[1:] = gains[:-1]
+        delta = gains - previous
+        for start in range(0, len(gains), GAIN_BLOCK_FRAMES):
+            stop = min(start + GAIN_BLOCK_FRAMES, len(gains))
+            envelope = self._scratch[:stop - start]
+            np.multiply(delta[start:stop, None], self._ramp[None, :], out=envelope)
+            envelope += previous[start:stop, None]
+            frames[start:stop] *= envelope
+        self._last_gain = float(gains[-1])
+
+    def process(self, wav):
+        """Normalize a float32 clip in place. Returns wav."""
+        self._mean_square = None
+        self._limiter_gain = 1.0
+        self._last_gain = None
+        num_frames = len(wav) // self.frame
+        if num_frames > 0:
+            frames = wav[:num_frames * self.frame].reshape(num_frames, self.frame)
+            energy = np.einsum('ij,ij->i', frames, frames) / self.frame
+            peaks = np.maximum(frames.max(axis=1), -frames.min(axis=1))
+            voiced = energy > self.gate
+            if not voiced.any():
+                return wav  # Silence: nothing to normalize against
+            self._mean_square = float(energy[voiced].mean())
+            self._apply_gains(frames, self._frame_gains(energy, peaks, voiced))
+        if self._last_gain is None:
+            return wav
+        # Samples after the last whole frame keep the last gain
+        wav[num_frames * self.frame:] *= self._last_gain
+        np.clip(wav, -self.ceiling, self.ceiling, out=wav)
+        return wav
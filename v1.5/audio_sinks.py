@@ -0,0 +1,239 @@
+# audio_sinks.py
+
+import os
+import time
+import errno
+import threading
+import logging
+import numpy as np
+import soundfile as sf
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Sinks selectable from the command line
+SINK_TYPES = ('device', 'null', 'wav', 'fifo')
+# Frames pulled from the playback ring at a time by the sinks without a device
+BLOCK_FRAMES = 1024
+# How long an unthrottled sink waits for audio before re-checking whether it was stopped
+READ_TIMEOUT = 0.1
+# A real-time sink that falls further behind than this restarts its clock instead of catching up
+MAX_LAG_SECONDS = 0.5
+# How often a FIFO sink retries while nothing is reading the pipe
+FIFO_RETRY_INTERVAL = 0.5
+
+class DeviceSink:
+    """Plays the ring on a sound device through a sounddevice output stream."""
+
+    realtime = True
+
+    def __init__(self, device=None):
+        self.device = device
+        self._stream = None
+
+    def describe(self):
+        import sounddevice as sd
+        device = self.device if self.device is not None else sd.default.device[1]
+        return f"Output Device: {sd.query_devices()[device]['name']}"
+
+    def start(self, ring):
+        """Start consuming a playback ring."""
+        import sounddevice as sd
+        self._stream = sd.OutputStream(
+            samplerate=ring.sample_rate, channels=1, dtype=np.float32, callback=ring.callback, device=self.device
+        )
+        self._stream.start()
+
+    def stop(self):
+        """Stop consuming the current ring."""
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        """Release the sink at the end of the session."""
+        self.stop()
+
+class ThreadedSink:
+    """
+    Base for sinks without a sound device: a thread pulls audio from the ring through the same
+    callback a device uses. Real-time sinks pull a block per block period and pad underruns with
+    silence, as a device would; unthrottled sinks take audio as soon as it is committed.
+    """
+
+    realtime = True
+
+    def __init__(self, realtime=None):
+        if realtime is not None:
+            self.realtime = realtime
+        self._thread = None
+        self._running = False
+
+    def describe(self):
+        return type(self).__name__
+
+    def start(self, ring):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(ring,), name=f"{type(self).__name__}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def _open(self, sample_rate):
+        """Prepare to consume audio at sample_rate; called on the sink thread."""
+
+    def _consume(self, samples):
+        """Handle a block of mono float32 audio pulled from the ring."""
+
+    def _run(self, ring):
+        try:
+            self._open(ring.sample_rate)
+            block = np.zeros((BLOCK_FRAMES, 1), dtype=np.float32)
+            block_seconds = BLOCK_FRAMES / ring.sample_rate
+            next_block = time.monotonic()
+            while self._running:
+                if self.realtime:
+                    ring.callback(block, BLOCK_FRAMES, None, None)
+                    self._consume(block[:, 0])
+                    next_block += block_seconds
+                    delay = next_block - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif delay < -MAX_LAG_SECONDS:
+                        next_block = time.monotonic()
+                else:
+                    frames = min(ring.wait_readable(READ_TIMEOUT), BLOCK_FRAMES)
+                    if frames > 0:
+                        ring.callback(block[:frames], frames, None, None)
+                        self._consume(block[:frames, 0])
+        except Exception as e:
+            print(f"Error in audio sink: {e}")
+            logger.error(f"Error in audio sink {self.describe()}: {e}", exc_info=True)
+
+class NullSink(ThreadedSink):
+    """Discards audio, at real-time pace or as fast as it is produced (for benchmarks and tests)."""
+
+    def __init__(self, realtime=True):
+        super().__init__(realtime)
+        self.consumed_samples = 0
+
+    def describe(self):
+        return f"Null Sink ({'real time' if self.realtime else 'unthrottled'})"
+
+    def _consume(self, samples):
+        self.consumed_samples += len(samples)
+
+class WavFileSink(ThreadedSink):
+    """Writes everything played to a WAV file; a sample rate change starts a numbered file."""
+
+    realtime = False
+
+    def __init__(self, path, realtime=None):
+        super().__init__(realtime)
+        self.path = path
+        self._file = None
+        self._files = 0
+
+    def describe(self):
+        return f"WAV File Sink: {self.path}"
+
+    def _open(self, sample_rate):
+        if self._file is not None and self._file.samplerate == sample_rate:
+            return
+        self._close_file()
+        self._files += 1
+        path = self.path if self._files == 1 else f"{os.path.splitext(self.path)[0]}_{self._files}.wav"
+        self._file = sf.SoundFile(path, mode='w', samplerate=sample_rate, channels=1, format='WAV', subtype='PCM_16')
+        logger.info(f"Writing played audio to {path}")
+
+    def _consume(self, samples):
+        self._file.write(samples)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self.stop()
+        self._close_file()
+
+class FifoSink(ThreadedSink):
+    """
+    Writes raw 16-bit little-endian mono PCM to a named pipe, for OBS or ffmpeg
+    (e.g. ffmpeg -f s16le -ar 22050 -ac 1 -i <path>). In real time the stream goes on while no
+    reader is attached, like a broadcast nobody has tuned into; unthrottled, it waits for a reader.
+    """
+
+    def __init__(self, path, realtime=None):
+        super().__init__(realtime)
+        self.path = path
+        self._fd = None
+        self._last_attempt = 0.0
+        self._pcm = np.empty(BLOCK_FRAMES, dtype='<i2')
+
+    def describe(self):
+        return f"FIFO Sink: {self.path}"
+
+    def _open(self, sample_rate):
+        if not os.path.exists(self.path):
+            os.mkfifo(self.path)
+        if self._fd is None:
+            logger.info(f"Streaming to {self.path} once a reader attaches ({sample_rate} Hz s16le mono)")
+
+    def _attach(self):
+        """Open the pipe if a reader is attached; never blocks."""
+        self._last_attempt = time.monotonic()
+        try:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            return False
+        os.set_blocking(self._fd, True)
+        logger.info(f"Reader attached to {self.path}")
+        return True
+
+    def _consume(self, samples):
+        while self._fd is None:
+            if time.monotonic() - self._last_attempt >= FIFO_RETRY_INTERVAL and self._attach():
+                break
+            if self.realtime or not self._running:
+                return  # Nobody is listening: this block is not sent anywhere
+            time.sleep(FIFO_RETRY_INTERVAL)
+        pcm = self._pcm[:len(samples)]
+        np.clip(samples, -1.0, 1.0, out=samples)
+        np.multiply(samples, 32767, out=pcm, casting='unsafe')
+        try:
+            os.write(self._fd, pcm.tobytes())
+        except BrokenPipeError:
+            logger.info(f"Reader detached from {self.path}")
+            os.close(self._fd)
+            self._fd = None
+
+    def close(self):
+        self.stop()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def create_sink(sink_type='device', path=None, realtime=None, device=None):
+    """Build a sink from its settings; headless sinks need no sound device or sounddevice install."""
+    if sink_type == 'device':
+        return DeviceSink(device)
+    if sink_type == 'null':
+        return NullSink(realtime=True if realtime is None else realtime)
+    if sink_type in ('wav', 'fifo'):
+        if not path:
+            raise ValueError(f"The {sink_type} sink needs a path")
+        return WavFileSink(path, realtime) if sink_type == 'wav' else FifoSink(path, realtime)
+    raise ValueError(f"Unknown audio sink '{sink_type}', choose from {', '.join(SINK_TYPES)}")
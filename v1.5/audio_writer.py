@@ -0,0 +1,193 @@
+# audio_writer.py
+
+import os
+import time
+import queue
+import threading
+import logging
+import numpy as np
+import soundfile as sf
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Selectable output formats: extension, soundfile format, subtype
+AUDIO_FORMATS = {
+    'wav': ('.wav', 'WAV', 'PCM_16'),
+    'flac': ('.flac', 'FLAC', 'PCM_16'),
+    'ogg': ('.ogg', 'OGG', 'VORBIS'),
+    'opus': ('.opus', 'OGG', 'OPUS'),
+}
+DEFAULT_AUDIO_FORMAT = 'wav'
+# Opus only supports these sample rates; audio is resampled to the nearest one above
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Files written before their data is flushed to disk together
+DEFAULT_FSYNC_BATCH = 8
+# Longest a written file waits for the fsync of its batch, in seconds
+DEFAULT_FSYNC_INTERVAL = 5.0
+DEFAULT_QUEUE_SIZE = 16
+
+_STOP = object()
+
+def resample_linear(wav, sample_rate, target_rate):
+    """Linear-interpolation resampling, adequate for speech going into a lossy codec."""
+    length = int(round(len(wav) * target_rate / sample_rate))
+    positions = np.arange(length, dtype=np.float64) * (sample_rate / target_rate)
+    return np.interp(positions, np.arange(len(wav)), wav).astype(np.float32)
+
+class AudioFileWriter:
+    """
+    Background writer for audio files. submit() hands a clip to a writer thread through a bounded
+    queue and returns immediately, so generators never wait on disk I/O unless the queue is full.
+    Written files are fsynced in batches, and throughput and queue depth are tracked.
+    """
+
+    def __init__(
+        self,
+        audio_format=DEFAULT_AUDIO_FORMAT,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        fsync_batch=DEFAULT_FSYNC_BATCH,
+        fsync_interval=DEFAULT_FSYNC_INTERVAL
+    ):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format '{audio_format}', choose from {', '.join(AUDIO_FORMATS)}")
+        self.audio_format = audio_format
+        self.extension, self._format, self._subtype = AUDIO_FORMATS[audio_format]
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending_sync = []  # (path, on_written) written but not yet flushed
+        self._last_sync = time.monotonic()
+        # Metrics
+        self.files_written = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self.max_queue_depth = 0
+        self.stalls = 0  # submit() calls that found the queue full
+        self.errors = 0
+        self.callback_errors = 0
+        self._thread = threading.Thread(target=self._run, name="audio-file-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def path_for(self, base_path):
+        """Output path for a file name given without extension."""
+        return f"{base_path}{self.extension}"
+
+    def submit(self, base_path, wav, sample_rate, on_written=None):
+        """
+        Queue a clip to be written to base_path plus the format's extension; returns that path.
+        wav must not be modified afterwards. on_written(path) is called from the writer thread once
+        the file has been flushed to disk; exceptions it raises are logged and do not stop the writer.
+        """
+        path = self.path_for(base_path)
+        item = (path, wav, sample_rate, on_written)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stalls += 1
+            logger.warning(f"Audio writer queue full ({self._queue.qsize()} files); waiting for disk")
+            self._queue.put(item)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return path
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _write(self, path, wav, sample_rate):
+        if self.audio_format == 'opus' and sample_rate not in OPUS_SAMPLE_RATES:
+            target_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= sample_rate), OPUS_SAMPLE_RATES[-1])
+            wav = resample_linear(wav, sample_rate, target_rate)
+            sample_rate = target_rate
+        sf.write(path, wav, samplerate=sample_rate, format=self._format, subtype=self._subtype)
+
+    def _sync(self):
+        """Flush every file written since the last batch, and their directories, to disk, then report them written."""
+        directories = set()
+        for path, _ in self._pending_sync:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                directories.add(os.path.dirname(os.path.abspath(path)))
+            except OSError as e:
+                logger.error(f"Could not fsync {path}: {e}")
+        for directory in directories:
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass  # Directories cannot be fsynced on every platform
+        synced, self._pending_sync = self._pending_sync, []
+        self._last_sync = time.monotonic()
+        for path, on_written in synced:
+            if on_written is None:
+                continue
+            try:
+                on_written(path)
+            except Exception as e:
+                self.callback_errors += 1
+                logger.error(f"Error in the written callback of {path}: {e}", exc_info=True)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                if self._pending_sync:
+                    self._sync()
+                continue
+            if item is _STOP:
+                break
+            path, wav, sample_rate, on_written = item
+            started = time.perf_counter()
+            try:
+                self._write(path, wav, sample_rate)
+                self.files_written += 1
+                self.bytes_written += os.path.getsize(path)
+                self._pending_sync.append((path, on_written))
+                if len(self._pending_sync) >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error writing audio file {path}: {e}", exc_info=True)
+                print(f"Error writing audio file {path}: {e}")
+            finally:
+                self.write_seconds += time.perf_counter() - started
+        if self._pending_sync:
+            self._sync()
+
+    def close(self):
+        """Write everything still queued, flush it to disk and stop the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        logger.info(f"Audio writer: {self.stats()}")
+
+    def stats(self):
+        throughput = self.bytes_written / self.write_seconds if self.write_seconds > 0 else 0.0
+        return {
+            'format': self.audio_format,
+            'files_written': self.files_written,
+            'bytes_written': self.bytes_written,
+            'write_seconds': self.write_seconds,
+            'throughput_mb_per_second': throughput / (1024 * 1024),
+            'queue_depth': self.queue_depth(),
+            'max_queue_depth': self.max_queue_depth,
+            'stalls': self.stalls,
+            'errors': self.errors,
+            'callback_errors': self.callback_errors
+        }
+
+def format_writer_stats(stats):
+    """One-line summary of AudioFileWriter.stats() for the end-of-session report."""
+    return (
+        f"{stats['files_written']} {stats['format']} files, {stats['bytes_written'] / (1024 * 1024):.1f} MB "
+        f"at {stats['throughput_mb_per_second']:.1f} MB/s, max queue depth {stats['max_queue_depth']}, "
+        f"{stats['stalls']} stalls, {stats['errors']} errors"
+    )
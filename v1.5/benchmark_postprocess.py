@@ -0,0 +1,93 @@
+# benchmark_postprocess.py
+#
+# Compares the post-synthesis audio path before and after pooled, in-place processing.
+# The model is simulated with the list of samples Coqui's tts() returns for VITS, so the
+# benchmark runs without loading a TTS model.
+#
+# Usage: python benchmark_postprocess.py [clip_seconds] [repetitions]
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+from audio_pool import BufferPool
+from audio_processing import LoudnessNormalizer, trim_silence
+
+SAMPLE_RATE = 22050
+SENTENCE_SECONDS = 4.0
+# Silence Coqui's synthesizer inserts after every sentence
+SENTENCE_GAP_SAMPLES = 10000
+
+def simulated_sentences(clip_seconds):
+    """Per-sentence model outputs for a clip of the given length."""
+    rng = np.random.default_rng(0)
+    sentences = []
+    remaining = clip_seconds
+    while remaining > 0:
+        seconds = min(SENTENCE_SECONDS, remaining)
+        t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+        speech = 0.3 * np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+        sentences.append((speech + 0.01 * rng.standard_normal(len(t))).astype(np.float32))
+        remaining -= seconds
+    return sentences
+
+def tts_output(sentences):
+    """What tts_model.tts returns: a Python list of samples with a gap after each sentence."""
+    wavs = []
+    for waveform in sentences:
+        wavs += list(waveform)
+        wavs += [0] * SENTENCE_GAP_SAMPLES
+    return wavs
+
+def legacy_path(sentences):
+    wavs = tts_output(sentences)
+    # Generator post-processing
+    wav = np.array(wavs, dtype=np.float32)
+    wav = wav / np.max(np.abs(wav))
+    return wav
+
+def pooled_path(sentences, pool, normalizer):
+    wavs = tts_output(sentences)
+    # synthesize_pooled: one copy from the model output into a pooled buffer
+    out = pool.acquire(len(wavs))
+    out[:] = wavs
+    # Post-processing, in place
+    normalizer.process(out)
+    return trim_silence(out, SAMPLE_RATE)
+
+def measure(name, run, repetitions, audio_seconds):
+    run()  # Warm up caches and the pool
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        result = run()
+        del result
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Tracing slows everything down equally; time an untraced pass as well
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        run()
+    untraced = time.perf_counter() - started
+    per_audio_second = untraced / (repetitions * audio_seconds)
+    print(
+        f"{name:>8}: {per_audio_second * 1000:7.3f} ms per audio-second, "
+        f"peak allocations {peak / audio_seconds / 1024:8.1f} KiB per audio-second (traced run {elapsed:.2f}s)"
+    )
+
+def main():
+    clip_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    sentences = simulated_sentences(clip_seconds)
+    audio_seconds = (sum(len(s) for s in sentences) + SENTENCE_GAP_SAMPLES * len(sentences)) / SAMPLE_RATE
+    print(f"Post-processing a {audio_seconds:.1f}s clip, {repetitions} repetitions")
+
+    measure("legacy", lambda: legacy_path(sentences), repetitions, audio_seconds)
+    pool = BufferPool()
+    normalizer = LoudnessNormalizer.for_sink('playback', SAMPLE_RATE)
+    measure("pooled", lambda: pooled_path(sentences, pool, normalizer), repetitions, audio_seconds)
+    print(f"Pool: {pool.stats()}")
+
+if __name__ == "__main__":
+    main()
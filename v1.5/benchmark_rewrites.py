@@ -0,0 +1,72 @@
+# benchmark_rewrites.py
+#
+# Measures the prompt evaluation time of a storytelling job's rewrites against the local Ollama
+# server, with every version evaluating the story prompt on its own and with the versions sharing
+# one evaluation through the server's prompt cache. Each run starts with a fresh nonce line so the
+# cache holds nothing from an earlier run. Start the server with OLLAMA_NUM_PARALLEL set to at least
+# the number of rewrites so the requests really run side by side.
+#
+# Usage: python benchmark_rewrites.py <story_file> [rewrites] [tokens_per_rewrite]
+
+import sys
+import time
+import uuid
+import threading
+from storyteller_character import StorytellerCharacter, rewrite_seed
+from shared_functions import call_llm_api
+
+def run_rewrites(prompt, story_name, rewrites, tokens, shared):
+    """Send every version's request at once; with shared, the others wait for the first to start answering."""
+    warmup = threading.Event()
+    results = [{} for _ in range(rewrites)]
+
+    def rewrite(version):
+        if shared and version > 1:
+            warmup.wait()
+        call_llm_api(
+            prompt,
+            options={'seed': rewrite_seed(story_name, version), 'num_predict': tokens},
+            on_first_token=warmup.set if version == 1 else None,
+            stats=results[version - 1]
+        )
+        if version == 1:
+            warmup.set()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=rewrite, args=(version,)) for version in range(1, rewrites + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+def report(name, results, elapsed):
+    seconds = sum(result.get('prompt_eval_seconds', 0.0) for result in results)
+    tokens = sum(result.get('prompt_eval_count', 0) for result in results)
+    print(f"{name:>11}: prompt evaluation {seconds:6.2f}s, {tokens:6d} prompt tokens evaluated, wall time {elapsed:6.2f}s")
+    return seconds
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmark_rewrites.py <story_file> [rewrites] [tokens_per_rewrite]")
+        sys.exit(1)
+    story_file = sys.argv[1]
+    rewrites = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    tokens = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    with open(story_file, 'r', encoding='utf-8') as f:
+        original_story = f.read()
+    storyteller = StorytellerCharacter(original_story, rewriting_intensity=5, length_setting=3, selected_vibe=None)
+    prompt = storyteller.generate_story_prompt()
+    print(f"{rewrites} rewrites of a {len(prompt)} character prompt, {tokens} tokens each")
+
+    totals = {}
+    for name, shared in (("independent", False), ("shared", True)):
+        nonce = f"Session {uuid.uuid4().hex}\n"
+        results, elapsed = run_rewrites(nonce + prompt, story_file, rewrites, tokens, shared)
+        totals[name] = report(name, results, elapsed)
+    if totals["independent"] > 0:
+        saved = totals["independent"] - totals["shared"]
+        print(f"Sharing saves {saved:.2f}s of prompt evaluation ({saved / totals['independent']:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# buffer_controller.py
+
+import math
+import time
+import queue
+import logging
+from audio_buffer import AudioClip
+from filler_library import FillerRotation
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Seconds of audio buffered before playback goes live
+DEFAULT_PREROLL_SECONDS = 10.0
+# Below this many buffered seconds producers are asked to hurry up
+DEFAULT_LOW_WATER_SECONDS = 15.0
+# Producers are also asked to hurry up when the buffer is projected to run dry within this many seconds
+DEFAULT_LOW_WATER_HORIZON = 45.0
+# Time constant of the generation rate average, in seconds
+DEFAULT_RATE_TIME_CONSTANT = 60.0
+# How often the dead-air metric is logged, in seconds
+DEFAULT_REPORT_INTERVAL = 300.0
+# How often the controller re-checks the buffer while waiting
+POLL_INTERVAL = 0.25
+# Fillers are inserted when no clip is waiting and the playback ring holds less than this many seconds
+DEFAULT_FILLER_THRESHOLD = 1.0
+# Most fillers played back to back before the player simply waits for content
+MAX_CONSECUTIVE_FILLERS = 3
+
+class BufferController:
+    """
+    Adaptive jitter buffer policy, run in the player process.
+    Holds playback until a pre-roll is buffered, tracks the rate at which audio is generated
+    against the rate at which it is played, raises the buffer's low-water signal so producers
+    shorten their scripts when playback is at risk of running dry, and measures dead air.
+    """
+
+    def __init__(
+        self,
+        audio_buffer,
+        stop_event,
+        preroll_seconds=DEFAULT_PREROLL_SECONDS,
+        low_water_seconds=DEFAULT_LOW_WATER_SECONDS,
+        low_water_horizon=DEFAULT_LOW_WATER_HORIZON,
+        rate_time_constant=DEFAULT_RATE_TIME_CONSTANT,
+        report_interval=DEFAULT_REPORT_INTERVAL,
+        filler_threshold=DEFAULT_FILLER_THRESHOLD
+    ):
+        self.audio_buffer = audio_buffer
+        self.stop_event = stop_event
+        self.preroll_seconds = preroll_seconds
+        self.low_water_seconds = low_water_seconds
+        self.low_water_horizon = low_water_horizon
+        self.rate_time_constant = rate_time_constant
+        self.report_interval = report_interval
+        self.filler_threshold = filler_threshold
+        self.fillers = FillerRotation()
+
+        self.live = False
+        self.consumed_seconds = 0.0  # Audio taken from the buffer for playback
+        self.dead_air_seconds = 0.0
+        self.underruns = 0
+        self.fillers_played = 0
+        self.filler_seconds = 0.0
+        self._consecutive_fillers = 0
+        self.generation_rate = None  # Audio seconds generated per wall-clock second (EWMA)
+        self.playback_rate = 0.0  # Audio seconds played per wall-clock second
+        self._live_since = None
+        self._last_sample = None  # (time, seconds generated so far)
+        self._last_report = None
+        self.ring = None  # Playback ring the player is feeding
+
+    def attach_ring(self, ring):
+        """Measure dead air on the playback ring the player is feeding."""
+        self.ring = ring
+
+    def buffered_seconds(self):
+        """Audio waiting to be heard: clips in the buffer plus audio queued in the playback ring."""
+        ring_seconds = self.ring.queued_seconds() if self.ring is not None else 0.0
+        return self.audio_buffer.buffered_seconds() + ring_seconds
+
+    def generated_seconds(self):
+        """Audio generated so far: everything played plus everything still buffered."""
+        return self.consumed_seconds + self.audio_buffer.buffered_seconds()
+
+    def live_seconds(self):
+        return time.monotonic() - self._live_since if self._live_since is not None else 0.0
+
+    def dead_air_per_hour(self):
+        live = self.live_seconds()
+        return self.dead_air_seconds / live * 3600 if live > 0 else 0.0
+
+    def update(self):
+        """Refresh the rate estimates and the low-water signal."""
+        now = time.monotonic()
+        generated = self.generated_seconds()
+        if self._last_sample is not None:
+            elapsed = now - self._last_sample[0]
+            if elapsed > 0:
+                instant_rate = (generated - self._last_sample[1]) / elapsed
+                if self.generation_rate is None:
+                    self.generation_rate = instant_rate
+                else:
+                    alpha = 1 - math.exp(-elapsed / self.rate_time_constant)
+                    self.generation_rate += alpha * (instant_rate - self.generation_rate)
+        self._last_sample = (now, generated)
+        self.playback_rate = 1.0 if self.live else 0.0
+
+        # Silence the device played because the ring ran dry (the end of the session does not count)
+        if self.ring is not None:
+            dead_air, underruns = self.ring.take_underruns()
+            if self.live and not self.stop_event.is_set() and dead_air > 0:
+                self.dead_air_seconds += dead_air
+                self.underruns += underruns
+                if underruns:
+                    logger.warning(f"Playback underrun: {dead_air:.2f}s of dead air")
+
+        buffered = self.buffered_seconds()
+        low = buffered < self.low_water_seconds
+        if not low and self.live and self.generation_rate is not None and self.generation_rate < self.playback_rate:
+            # Seconds until the buffer runs dry at the current rates
+            time_to_empty = buffered / (self.playback_rate - self.generation_rate)
+            low = time_to_empty < self.low_water_horizon
+        if low != self.audio_buffer.low_water.is_set():
+            if low:
+                self.audio_buffer.low_water.set()
+                logger.info(
+                    f"Buffer low ({buffered:.1f}s buffered, generating at "
+                    f"{self.generation_rate or 0.0:.2f}x real time); asking producers to hurry"
+                )
+            else:
+                self.audio_buffer.low_water.clear()
+                logger.info(f"Buffer recovered ({buffered:.1f}s buffered)")
+
+        if self.live and self._last_report is not None and now - self._last_report >= self.report_interval:
+            self.report()
+
+    def wait_for_preroll(self):
+        """Block until the pre-roll is buffered (or the session ends), then go live."""
+        print(f"Audio Player Process: Buffering {self.preroll_seconds:.0f}s before playback...")
+        while not self.stop_event.is_set() and self.audio_buffer.buffered_seconds() < self.preroll_seconds:
+            self.update()
+            self.stop_event.wait(POLL_INTERVAL)
+        self.live = True
+        self._live_since = time.monotonic()
+        self._last_report = self._live_since
+        logger.info(f"Playback live with {self.audio_buffer.buffered_seconds():.1f}s buffered")
+
+    def _next_filler(self):
+        """A filler to bridge a near-empty buffer, or None if one should not be played now."""
+        self.fillers.add(self.audio_buffer.take_fillers())
+        if (not self.live or self.stop_event.is_set() or not len(self.fillers)
+                or self._consecutive_fillers >= MAX_CONSECUTIVE_FILLERS
+                or self.buffered_seconds() >= self.filler_threshold):
+            return None
+        filler = self.fillers.pick()
+        self._consecutive_fillers += 1
+        self.fillers_played += 1
+        self.filler_seconds += len(filler.samples) / filler.sample_rate
+        logger.info(f"Buffer nearly empty, playing filler: {filler.text}")
+        self.audio_buffer.report_event({'type': 'filler', 'text': filler.text, 'time': time.time()})
+        # Copied so the library itself is never altered by playback processing
+        return AudioClip(filler.samples.copy(), filler.sample_rate, kind='filler')
+
+    def next_clip(self):
+        """
+        Wait for the next clip to play, bridging a near-empty ring with fillers.
+        Returns None once the session has stopped and the buffer is empty.
+        """
+        while True:
+            self.update()
+            try:
+                clip = self.audio_buffer.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    return None
+                # Nothing follows yet: let the held-back tail play out instead of waiting to crossfade it
+                if self.ring is not None:
+                    self.ring.flush()
+                filler = self._next_filler()
+                if filler is not None:
+                    return filler
+        self.consumed_seconds += clip.duration
+        self._consecutive_fillers = 0
+        return clip
+
+    def report(self):
+        """Log the dead-air metric."""
+        self._last_report = time.monotonic()
+        logger.info(
+            f"Dead air: {self.dead_air_per_hour():.1f}s/hour "
+            f"({self.dead_air_seconds:.1f}s over {self.live_seconds() / 60:.1f} min live, "
+            f"{self.underruns} underruns, {self.fillers_played} fillers covering {self.filler_seconds:.1f}s); generation at {self.generation_rate or 0.0:.2f}x real time"
+        )
@@ -0,0 +1,124 @@
+# duration_fitter.py
+
+import re
+import logging
+import numpy as np
+from viral_character import estimate_tiktok_duration
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Largest relative speed change applied to synthesized audio (0.15 = +/-15%)
+DEFAULT_STRETCH_TOLERANCE = 0.15
+
+def split_sentences(text):
+    """Split a script into sentences, keeping the closing punctuation."""
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    return [sentence for sentence in sentences if sentence]
+
+def trim_script_to_duration(text, max_duration, estimate_fn=estimate_tiktok_duration):
+    """
+    Trim a script at sentence boundaries so its estimated spoken length
+    stays within max_duration seconds. The first sentence (the hook) is always kept.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return text
+
+    kept = [sentences[0]]
+    for sentence in sentences[1:]:
+        candidate = ' '.join(kept + [sentence])
+        if estimate_fn(candidate) > max_duration:
+            break
+        kept.append(sentence)
+    return ' '.join(kept)
+
+def time_stretch(wav, rate, sample_rate, frame_ms=30, search_ms=6):
+    """
+    Change the tempo of a clip without changing its pitch (WSOLA).
+    rate > 1 makes the clip shorter, rate < 1 makes it longer.
+    """
+    wav = np.asarray(wav, dtype=np.float32)
+    if rate == 1.0 or len(wav) == 0:
+        return wav
+
+    frame = max(int(sample_rate * frame_ms / 1000), 32)
+    hop_out = frame // 2
+    hop_in = hop_out * rate
+    search = max(int(sample_rate * search_ms / 1000), 1)
+
+    out_len = int(len(wav) / rate)
+    num_frames = out_len // hop_out + 1
+    window = np.hanning(frame).astype(np.float32)
+
+    # Pad so every analysis frame and its search region stay in bounds
+    padded = np.pad(wav, (search, frame + search + hop_out + int(hop_in) + 1))
+    out = np.zeros(num_frames * hop_out + frame, dtype=np.float32)
+    norm = np.zeros_like(out)
+
+    prev_pos = search
+    for k in range(num_frames):
+        nominal = min(int(k * hop_in) + search, len(padded) - frame - search - hop_out)
+        if k == 0:
+            pos = nominal
+        else:
+            # Pick the frame that best continues the previously copied one
+            natural = padded[prev_pos + hop_out:prev_pos + hop_out + frame]
+            region = padded[nominal - search:nominal + search + frame]
+            corr = np.correlate(region, natural, mode='valid')
+            pos = nominal - search + int(np.argmax(corr))
+
+        start = k * hop_out
+        out[start:start + frame] += padded[pos:pos + frame] * window
+        norm[start:start + frame] += window
+        prev_pos = pos
+
+    np.maximum(norm, 1e-3, out=norm)
+    out /= norm
+    return out[:out_len]
+
+def fit_audio_to_window(wav, sample_rate, window, tolerance=DEFAULT_STRETCH_TOLERANCE):
+    """
+    Time-stretch a synthesized clip so it lands inside the (min, max) duration window.
+    The stretch is capped at +/- tolerance; clips further off are stretched as far as
+    allowed and reported as missing the window.
+    Returns: (wav, report) where report holds the measured and achieved durations.
+    """
+    min_duration, max_duration = window
+    measured = len(wav) / sample_rate
+    report = {
+        'window': (min_duration, max_duration),
+        'measured_duration': measured,
+        'achieved_duration': measured,
+        'stretch_rate': 1.0,
+        'in_window': min_duration <= measured <= max_duration
+    }
+    if report['in_window'] or measured == 0:
+        return wav, report
+
+    target = max_duration if measured > max_duration else min_duration
+    rate = measured / target
+    rate = min(max(rate, 1.0 - tolerance), 1.0 + tolerance)
+
+    wav = time_stretch(wav, rate, sample_rate)
+    achieved = len(wav) / sample_rate
+    report.update({
+        'achieved_duration': achieved,
+        'stretch_rate': rate,
+        'in_window': min_duration <= achieved <= max_duration
+    })
+    logger.info(f"Time-stretched clip from {measured:.1f}s to {achieved:.1f}s (rate {rate:.3f})")
+    return wav, report
+
+def format_duration_report(target_duration, report):
+    """One-line summary of target versus achieved duration for transcripts and logs."""
+    min_duration, max_duration = report['window']
+    line = (
+        f"Target: {target_duration:.1f}s (window {min_duration}-{max_duration}s) | "
+        f"Achieved: {report['achieved_duration']:.1f}s"
+    )
+    if report['stretch_rate'] != 1.0:
+        line += f" (synthesized {report['measured_duration']:.1f}s, stretched x{report['stretch_rate']:.3f})"
+    if not report['in_window']:
+        line += " [outside window]"
+    return line
@@ -0,0 +1,130 @@
+# filler_library.py
+
+import os
+import sys
+import random
+import hashlib
+import logging
+from collections import deque
+from dataclasses import dataclass
+import numpy as np
+import soundfile as sf
+from audio_processing import trim_silence
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "filler_cache"
+# A filler is not repeated until this many other fillers have been played
+DEFAULT_NO_REPEAT_WINDOW = 4
+
+# Short in-character bridge lines played while the next monologue is still being generated
+FILLER_LINES = {
+    "Emily": [
+        "Hold on, let me gather my thoughts for a second.",
+        "Hmm. Where was I? Oh, right.",
+        "Give me a moment, this next part is worth it.",
+        "You know, I almost lost my train of thought there.",
+        "Stay with me, it gets better.",
+        "Let me think about how to put this.",
+        "Okay. Deep breath.",
+        "Funny how the mind wanders, isn't it?",
+    ],
+    "Nova": [
+        "Processing. Do try to keep up.",
+        "One moment. Even perfection requires computation.",
+        "Patience. I am choosing my words carefully, for your benefit.",
+        "Recalibrating. You would not understand the details.",
+        "Interesting. Let me elaborate.",
+        "Allow me a moment to simplify this for you.",
+        "Hold that thought. Mine are more important.",
+        "Analyzing. The results will not disappoint.",
+    ],
+    "Viral": [
+        "Wait for it.",
+        "Stick around, this next one is wild.",
+        "Okay, you are going to want to hear this.",
+        "Don't scroll yet.",
+        "Here's the thing nobody tells you.",
+        "Real quick, before the next one.",
+    ],
+}
+
+@dataclass
+class Filler:
+    """A pre-rendered bridge line"""
+    filler_id: str
+    text: str
+    samples: np.ndarray
+    sample_rate: int
+
+def filler_id(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+def load_filler_library(character, tts_model, speaker, speed=1.0, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Pre-render a character's bridge lines with the session's voice and speed.
+    Audio is cached on disk, so only lines that were never rendered for this voice are synthesized.
+    """
+    directory = os.path.join(cache_dir, f"{character}_{speaker}_{float(speed):.2f}")
+    os.makedirs(directory, exist_ok=True)
+    fillers = []
+    rendered = 0
+    for text in FILLER_LINES.get(character, []):
+        line_id = filler_id(text)
+        path = os.path.join(directory, f"{line_id}.wav")
+        try:
+            if os.path.exists(path):
+                samples, sample_rate = sf.read(path, dtype='float32')
+            else:
+                samples = np.array(tts_model.tts(text, speaker=speaker, speed=speed), dtype=np.float32)
+                sample_rate = tts_model.synthesizer.output_sample_rate
+                # Left at the synthesized level: the player normalizes fillers like any other clip
+                samples = trim_silence(samples, sample_rate)
+                sf.write(path, samples, samplerate=sample_rate)
+                rendered += 1
+        except Exception as e:
+            logger.error(f"Could not prepare filler '{text}': {e}", exc_info=True)
+            continue
+        fillers.append(Filler(line_id, text, samples, sample_rate))
+    logger.info(f"Filler library for {character}: {len(fillers)} lines ({rendered} newly rendered)")
+    return fillers
+
+class FillerRotation:
+    """Picks fillers at random, never repeating one within the no-repeat window."""
+
+    def __init__(self, fillers=(), no_repeat_window=DEFAULT_NO_REPEAT_WINDOW):
+        self.fillers = list(fillers)
+        self.no_repeat_window = no_repeat_window
+        self._recent = deque()
+
+    def add(self, fillers):
+        self.fillers.extend(fillers)
+
+    def __len__(self):
+        return len(self.fillers)
+
+    def pick(self):
+        if not self.fillers:
+            return None
+        # A window as large as the library would leave nothing to pick
+        window = min(self.no_repeat_window, len(self.fillers) - 1)
+        while len(self._recent) > window:
+            self._recent.popleft()
+        candidates = [filler for filler in self.fillers if filler.filler_id not in self._recent]
+        filler = random.choice(candidates)
+        if window > 0:
+            self._recent.append(filler.filler_id)
+        return filler
+
+if __name__ == "__main__":
+    # Offline rendering: python filler_library.py <speaker> [speed]
+    from TTS.api import TTS
+    if len(sys.argv) < 2:
+        print("Usage: python filler_library.py <speaker> [speed]")
+        sys.exit(1)
+    tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    for character in FILLER_LINES:
+        fillers = load_filler_library(character, tts_model, sys.argv[1], speed)
+        print(f"{character}: {len(fillers)} fillers cached")
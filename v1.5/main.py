@@ -6,14 +6,18 @@ import threading
 import logging
 import os
 import sys
-import sounddevice as sd
+import argparse
 
 # Import existing modules
 from monologue_generator import monologue_generator_process
 from audio_player import audio_player_process
 from progress_display import progress_display_process
+from audio_buffer import AudioBuffer
+from audio_writer import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT
+from audio_sinks import SINK_TYPES, DeviceSink, create_sink
 from viral_character import ViralCharacterConfig
 from viral_generator import viral_generator_process
+from viral_campaign import viral_campaign_process, load_campaign_spec
 from tiktok_config import (
     EMOTIONS as TIKTOK_EMOTIONS,
     HOOK_TYPES,
@@ -25,9 +29,16 @@ from tiktok_config import (
 
 # Import storyteller modules
 from storyteller_generator import storyteller_generator_process
-from storyteller_character import StorytellerCharacterConfig
+from storyteller_character import StorytellerCharacterConfig, DEFAULT_REWRITE_CONCURRENCY
+from story_manifest import StoryIndex, INDEX_FILENAME as STORY_INDEX_FILENAME
 from emotions import EMOTIONS
 
+# Playback buffer budgets: producers block once either is reached
+AUDIO_BUFFER_SECONDS = 60.0
+AUDIO_BUFFER_BYTES = 64 * 1024 * 1024
+# Seconds of audio buffered before playback starts
+AUDIO_PREROLL_SECONDS = 10.0
+
 # Configure the root logger
 logging.basicConfig(
     filename='ai_content_creator.log',
@@ -54,6 +65,7 @@ def user_input_thread(stop_event, pause_event):
 
 def select_audio_output_device():
     """Function to select audio output device."""
+    import sounddevice as sd
     devices = sd.query_devices()
     print("\nAvailable Audio Output Devices:")
     output_devices = [i for i, d in enumerate(devices) if d['max_output_channels'] > 0]
@@ -72,6 +84,114 @@ def select_audio_output_device():
         except ValueError:
             print("Please enter a valid number.")
 
+def select_audio_sink(args):
+    """Function to select where audio is played: a sound device, or a headless sink from the command line."""
+    if args.sink != 'device':
+        audio_sink = create_sink(args.sink, path=args.sink_path, realtime=False if args.unthrottled else None)
+        print(f"\nAudio Output: {audio_sink.describe()}")
+        return audio_sink
+
+    import sounddevice as sd
+    print("\nAudio Output Options:")
+    print("0. Select audio output device")
+    print("Available Audio Output Devices:")
+    devices = sd.query_devices()
+    output_devices = [i for i, d in enumerate(devices) if d['max_output_channels'] > 0]
+    for i in output_devices:
+        print(f"{i}: {devices[i]['name']}")
+
+    while True:
+        try:
+            audio_output_choice = int(input("\nSelect the number corresponding to your preferred audio output device (or 0 to manually select): ").strip())
+            if audio_output_choice == 0:
+                return DeviceSink(select_audio_output_device())
+            elif audio_output_choice in output_devices:
+                print(f"\nSelected Output Device: {devices[audio_output_choice]['name']}")
+                return DeviceSink(audio_output_choice)
+            else:
+                print("Invalid selection. Please enter 0 or a valid device number.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def parse_arguments():
+    """Command-line options; everything else is collected through the prompts."""
+    parser = argparse.ArgumentParser(description="AI Content Creator")
+    parser.add_argument('--sink', choices=SINK_TYPES, default='device',
+                        help="Where audio is played: a sound device (default), or a null, WAV file or named-pipe sink")
+    parser.add_argument('--sink-path', help="Output file for the wav sink, or named pipe for the fifo sink")
+    parser.add_argument('--unthrottled', action='store_true',
+                        help="Headless sinks consume audio as fast as it is produced instead of in real time")
+    parser.add_argument('--resume', action='store_true',
+                        help="TikTok and storytelling modes: continue an interrupted session with the same output, skipping finished items")
+    parser.add_argument('--llm-concurrency', type=int, default=None, metavar='N',
+                        help="Storytelling and campaign modes: scripts requested from the LLM at the same time "
+                             f"(default {DEFAULT_REWRITE_CONCURRENCY} for storytelling, capped at the number of rewrites; 1 for campaigns)")
+    parser.add_argument('--tts-workers', type=int, default=1, metavar='N',
+                        help="Storytelling and campaign modes: clips synthesized at the same time, one TTS model each (default 1)")
+    parser.add_argument('--chunk-words', type=int, default=1500, metavar='N',
+                        help="Storytelling mode: rewrite longer stories in parts of about N words, played as they finish (0 keeps stories whole)")
+    args = parser.parse_args()
+    if args.sink in ('wav', 'fifo') and not args.sink_path:
+        parser.error(f"--sink {args.sink} requires --sink-path")
+    if (args.llm_concurrency is not None and args.llm_concurrency < 1) or args.tts_workers < 1:
+        parser.error("--llm-concurrency and --tts-workers must be at least 1")
+    return args
+
+def select_speaker():
+    """Function to load the TTS model and select one of its speakers."""
+    from TTS.api import TTS
+    print("\nInitializing TTS model...")
+    tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
+    print("TTS model loaded successfully.")
+
+    if not tts_model.is_multi_speaker:
+        return None
+    available_speakers = tts_model.speakers
+    print("\nAvailable Speakers:")
+    for idx, speaker in enumerate(available_speakers, 1):
+        print(f"{idx}. {speaker}")
+    while True:
+        try:
+            speaker_choice = int(input("Select the number corresponding to your preferred speaker: ").strip())
+            if 1 <= speaker_choice <= len(available_speakers):
+                return available_speakers[speaker_choice - 1]
+            else:
+                print(f"Please enter a number between 1 and {len(available_speakers)}.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def select_audio_format():
+    """Function to select the format saved audio files are written in."""
+    formats = list(AUDIO_FORMATS)
+    print("\nAudio File Formats:")
+    for idx, audio_format in enumerate(formats, 1):
+        print(f"{idx}. {audio_format}")
+
+    while True:
+        choice = input(f"Select audio file format number (press Enter for {DEFAULT_AUDIO_FORMAT}): ").strip()
+        if not choice:
+            return DEFAULT_AUDIO_FORMAT
+        try:
+            format_idx = int(choice)
+            if 1 <= format_idx <= len(formats):
+                print(f"\nSelected Audio Format: {formats[format_idx - 1]}")
+                return formats[format_idx - 1]
+            print(f"Please enter a number between 1 and {len(formats)}")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def select_stream_recording(output_filename):
+    """Function to choose whether the stream is recorded to disk."""
+    while True:
+        choice = input("\nRecord the stream to disk? (y/n): ").strip().lower()
+        if choice in ('y', 'yes'):
+            recording_dir = os.path.join(os.getcwd(), f"{output_filename}_recording")
+            print(f"Stream will be recorded to {recording_dir}")
+            return recording_dir
+        if choice in ('n', 'no', ''):
+            return None
+        print("Please enter 'y' or 'n'.")
+
 def get_tiktok_settings():
     """Collect all TikTok-specific settings from user"""
     settings = {}
@@ -368,9 +488,13 @@ def get_tiktok_settings():
         except ValueError:
             print("Please enter a valid number.")
 
+    settings['audio_format'] = select_audio_format()
+
     return settings
 
 if __name__ == '__main__':
+    args = parse_arguments()
+
     # Collect user inputs via CLI prompts
     print("\n=== AI Content Creator Setup ===\n")
 
@@ -379,17 +503,75 @@ if __name__ == '__main__':
     print("1. Stream Mode (Continuous or timed streaming)")
     print("2. TikTok Mode (Multiple short videos)")
     print("3. Storytelling Mode")
+    print("4. Campaign Mode (Batch of TikTok videos from a campaign spec)")
 
     while True:
         try:
-            mode_choice = int(input("\nSelect mode (1, 2, or 3): ").strip())
-            if mode_choice in [1, 2, 3]:
+            mode_choice = int(input("\nSelect mode (1, 2, 3, or 4): ").strip())
+            if mode_choice in [1, 2, 3, 4]:
                 break
-            print("Please enter 1, 2, or 3.")
+            print("Please enter 1, 2, 3, or 4.")
         except ValueError:
             print("Please enter a valid number.")
 
-    if mode_choice == 3:
+    if mode_choice == 4:
+        # Campaign Mode
+        print("\n=== Campaign Mode Configuration ===\n")
+        while True:
+            spec_path = input("Enter the path of the campaign spec (JSON): ").strip()
+            try:
+                campaign_spec = load_campaign_spec(spec_path)
+                break
+            except (OSError, ValueError) as e:
+                print(f"Could not load the campaign spec: {e}")
+        print(f"Campaign '{campaign_spec['name']}': {campaign_spec['videos']} videos")
+
+        selected_speaker = select_speaker()
+        audio_format = select_audio_format()
+        audio_sink = select_audio_sink(args)
+
+        # Create shared queues and events
+        progress_queue = Queue()
+        stop_event = Event()
+        pause_event = Event()
+        # Playback buffer bounded by seconds of audio and bytes
+        audio_buffer = AudioBuffer(stop_event, max_seconds=AUDIO_BUFFER_SECONDS, max_bytes=AUDIO_BUFFER_BYTES)
+
+        # Start user input thread
+        input_thread = threading.Thread(target=user_input_thread, args=(stop_event, pause_event))
+        input_thread.daemon = True
+        input_thread.start()
+
+        generator_process = multiprocessing.Process(
+            target=viral_campaign_process,
+            args=(
+                audio_buffer,
+                stop_event,
+                campaign_spec,
+                selected_speaker,
+                audio_format,
+                args.llm_concurrency or 1,
+                args.tts_workers,
+                progress_queue,
+                pause_event
+            )
+        )
+        generator_process.start()
+
+        # Create and start the audio player process
+        player_process = multiprocessing.Process(
+            target=audio_player_process,
+            args=(audio_buffer, stop_event, audio_sink, AUDIO_PREROLL_SECONDS)
+        )
+        player_process.start()
+
+        # Wait for the generator and player processes to finish
+        generator_process.join()
+        player_process.join()
+
+        print("\nCampaign run completed successfully!")
+
+    elif mode_choice == 3:
         # Storytelling Mode
         print("\n=== Storytelling Mode Configuration ===\n")
 
@@ -404,8 +586,8 @@ if __name__ == '__main__':
             print("Please add your story text files to the input directory and rerun the program.")
             sys.exit()
 
-        # List stories in the input directory
-        story_files = [f for f in os.listdir(stories_input_dir) if os.path.isfile(os.path.join(stories_input_dir, f))]
+        # List stories in the input directory; only new or modified files are hashed for the output manifest
+        story_files = StoryIndex(stories_input_dir, os.path.join(stories_output_dir, STORY_INDEX_FILENAME)).scan()
         if not story_files:
             print(f"No story files found in {stories_input_dir}. Please add your story text files and rerun the program.")
             sys.exit()
@@ -494,58 +676,20 @@ if __name__ == '__main__':
             selected_vibe = None  # AI will detect the vibe
 
         # Speaker selection (TTS model initialization)
-        from TTS.api import TTS
-        print("\nInitializing TTS model...")
-        tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
-        print("TTS model loaded successfully.")
-
-        if tts_model.is_multi_speaker:
-            available_speakers = tts_model.speakers
-            print("\nAvailable Speakers:")
-            for idx, speaker in enumerate(available_speakers, 1):
-                print(f"{idx}. {speaker}")
-            while True:
-                try:
-                    speaker_choice = int(input("Select the number corresponding to your preferred speaker: ").strip())
-                    if 1 <= speaker_choice <= len(available_speakers):
-                        selected_speaker = available_speakers[speaker_choice - 1]
-                        break
-                    else:
-                        print(f"Please enter a number between 1 and {len(available_speakers)}.")
-                except ValueError:
-                    print("Please enter a valid number.")
-        else:
-            selected_speaker = None
+        selected_speaker = select_speaker()
 
-        # Audio Output Device Selection
-        print("\nAudio Output Options:")
-        print("0. Select audio output device")
-        print("Available Audio Output Devices:")
-        devices = sd.query_devices()
-        output_devices = [i for i, d in enumerate(devices) if d['max_output_channels'] > 0]
-        for i in output_devices:
-            print(f"{i}: {devices[i]['name']}")
+        # Audio File Format Selection
+        audio_format = select_audio_format()
 
-        while True:
-            try:
-                audio_output_choice = int(input("\nSelect the number corresponding to your preferred audio output device (or 0 to manually select): ").strip())
-                if audio_output_choice == 0:
-                    selected_audio_device = select_audio_output_device()
-                    break
-                elif audio_output_choice in output_devices:
-                    selected_audio_device = audio_output_choice
-                    print(f"\nSelected Output Device: {devices[selected_audio_device]['name']}")
-                    break
-                else:
-                    print("Invalid selection. Please enter 0 or a valid device number.")
-            except ValueError:
-                print("Please enter a valid number.")
+        # Audio Output Selection
+        audio_sink = select_audio_sink(args)
 
         # Create shared queues and events
-        audio_queue = Queue(maxsize=10)
         progress_queue = Queue()
         stop_event = Event()
         pause_event = Event()
+        # Playback buffer bounded by seconds of audio and bytes
+        audio_buffer = AudioBuffer(stop_event, max_seconds=AUDIO_BUFFER_SECONDS, max_bytes=AUDIO_BUFFER_BYTES)
 
         # Start user input thread
         input_thread = threading.Thread(target=user_input_thread, args=(stop_event, pause_event))
@@ -560,18 +704,23 @@ if __name__ == '__main__':
             length_setting=length_setting,
             selected_vibe=selected_vibe,
             stories_input_dir=stories_input_dir,
-            stories_output_dir=stories_output_dir
+            stories_output_dir=stories_output_dir,
+            audio_format=audio_format,
+            resume=args.resume,
+            llm_concurrency=args.llm_concurrency or DEFAULT_REWRITE_CONCURRENCY,
+            tts_workers=args.tts_workers,
+            chunk_words=args.chunk_words
         )
 
         # Create and start the storyteller generator process
         generator_process = multiprocessing.Process(
             target=storyteller_generator_process,
             args=(
-                audio_queue,
+                audio_buffer,
                 stop_event,
                 storyteller_config,
                 selected_speaker,
-                selected_audio_device,
+                audio_sink,
                 progress_queue,
                 pause_event
             )
@@ -581,7 +730,7 @@ if __name__ == '__main__':
         # Create and start the audio player process
         player_process = multiprocessing.Process(
             target=audio_player_process,
-            args=(audio_queue, stop_event, selected_audio_device)
+            args=(audio_buffer, stop_event, audio_sink, AUDIO_PREROLL_SECONDS)
         )
         player_process.start()
 
@@ -660,60 +809,21 @@ if __name__ == '__main__':
         if not output_filename:
             output_filename = f"{selected_character}_conversation_transcript"
 
-        # Initialize TTS model in the main process to get available speakers
-        from TTS.api import TTS
-        print("\nInitializing TTS model...")
-        tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
-        print("TTS model loaded successfully.")
-
-        # Speaker selection
-        if tts_model.is_multi_speaker:
-            available_speakers = tts_model.speakers
-            print("\nAvailable Speakers:")
-            for idx, speaker in enumerate(available_speakers, 1):
-                print(f"{idx}. {speaker}")
-            while True:
-                try:
-                    speaker_choice = int(input("Select the number corresponding to your preferred speaker: ").strip())
-                    if 1 <= speaker_choice <= len(available_speakers):
-                        selected_speaker = available_speakers[speaker_choice - 1]
-                        break
-                    else:
-                        print(f"Please enter a number between 1 and {len(available_speakers)}.")
-                except ValueError:
-                    print("Please enter a valid number.")
-        else:
-            selected_speaker = None
+        # Optional recording of everything the stream plays
+        recording_dir = select_stream_recording(output_filename)
 
-        # Audio Output Device Selection
-        print("\nAudio Output Options:")
-        print("0. Select audio output device")
-        print("Available Audio Output Devices:")
-        devices = sd.query_devices()
-        output_devices = [i for i, d in enumerate(devices) if d['max_output_channels'] > 0]
-        for i in output_devices:
-            print(f"{i}: {devices[i]['name']}")
+        # Initialize TTS model in the main process to get available speakers
+        selected_speaker = select_speaker()
 
-        while True:
-            try:
-                audio_output_choice = int(input("\nSelect the number corresponding to your preferred audio output device (or 0 to manually select): ").strip())
-                if audio_output_choice == 0:
-                    selected_audio_device = select_audio_output_device()
-                    break
-                elif audio_output_choice in output_devices:
-                    selected_audio_device = audio_output_choice
-                    print(f"\nSelected Output Device: {devices[selected_audio_device]['name']}")
-                    break
-                else:
-                    print("Invalid selection. Please enter 0 or a valid device number.")
-            except ValueError:
-                print("Please enter a valid number.")
+        # Audio Output Selection
+        audio_sink = select_audio_sink(args)
 
         # Create shared queues and events
-        audio_queue = Queue(maxsize=10)
         progress_queue = Queue()
         stop_event = Event()
         pause_event = Event()
+        # Playback buffer bounded by seconds of audio and bytes
+        audio_buffer = AudioBuffer(stop_event, max_seconds=AUDIO_BUFFER_SECONDS, max_bytes=AUDIO_BUFFER_BYTES)
 
         # Start user input thread
         input_thread = threading.Thread(target=user_input_thread, args=(stop_event, pause_event))
@@ -736,14 +846,16 @@ if __name__ == '__main__':
                 story_framework=tiktok_settings['story_framework'],
                 category=tiktok_settings['category'],
                 outro_category=tiktok_settings.get('outro_category'),
-                outro_subcategory=tiktok_settings.get('outro_subcategory')  # New field
+                outro_subcategory=tiktok_settings.get('outro_subcategory'),  # New field
+                audio_format=tiktok_settings.get('audio_format', DEFAULT_AUDIO_FORMAT),
+                resume=args.resume
             )
 
             # Use viral_generator_process instead of monologue_generator_process
             generator_process = multiprocessing.Process(
                 target=viral_generator_process,
                 args=(
-                    audio_queue,
+                    audio_buffer,
                     stop_event,
                     desired_duration_seconds,
                     output_filename,
@@ -758,7 +870,7 @@ if __name__ == '__main__':
             generator_process = multiprocessing.Process(
                 target=monologue_generator_process,
                 args=(
-                    audio_queue,
+                    audio_buffer,
                     stop_event,
                     desired_duration_seconds,
                     modifications,
@@ -776,7 +888,7 @@ if __name__ == '__main__':
         # Create and start the audio player process
         player_process = multiprocessing.Process(
             target=audio_player_process,
-            args=(audio_queue, stop_event, selected_audio_device)
+            args=(audio_buffer, stop_event, audio_sink, AUDIO_PREROLL_SECONDS, recording_dir)
         )
         player_process.start()
 
@@ -2,10 +2,9 @@
 
 import time
 import random
-import numpy as np
+import threading
+import logging
 from TTS.api import TTS
-from threading import Thread
-from queue import Queue as ThreadQueue
 from shared_functions import (
     call_llm_api,
     generate_character_prompt,
@@ -14,9 +13,32 @@ from shared_functions import (
     truncate_conversation,
 )
 import psutil
+from speech_rate_model import SpeechRateModel
+from pipeline import Pipeline, Stage
+from filler_library import load_filler_library
+from audio_processing import trim_silence
+from audio_pool import BufferPool, synthesize_pooled
+from session_journal import SessionJournal, journal_path, export_report
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# TTS speed used for monologues
+MONOLOGUE_SPEED = 0.85
+# Longest monologue the LLM is allowed to generate, in seconds of audio
+MAX_MONOLOGUE_SECONDS = 90
+# Shorter limit used while the playback buffer is low, so audio reaches the player sooner
+LOW_WATER_MONOLOGUE_SECONDS = 30
+# Range of the pause the listener hears between monologues, in seconds
+MONOLOGUE_GAP_RANGE = (0.1, 0.3)
+
+# Stage graph settings: prompt -> llm -> clean -> tts -> post-process -> sink
+LLM_CONCURRENCY = 1  # Monologues continue each other, so only one can be written at a time
+TTS_CONCURRENCY = 1
+STAGE_QUEUE_SIZE = 2
 
 def monologue_generator_process(
-    audio_queue,
+    audio_buffer,
     stop_event,
     desired_duration_seconds,
     modifications,
@@ -24,134 +46,218 @@ def monologue_generator_process(
     selected_speaker,
     selected_character,
     max_cpu_usage,
-    progress_queue
+    progress_queue,
+    pause_event=None
 ):
     # Initialize variables
     conversation_history = []
-    conversation_transcript = ""
     total_duration_seconds = 0
+    # Seconds of audio generated so far, used to avoid generating text that would never be played
+    planned_seconds = 0
+    # Duration budgets of the monologues between their prompt and post-processing, not yet measured
+    reserved_seconds = 0
+    budget_changed = threading.Condition()
 
     # Initialize TTS model
     print(f"Initializing TTS model in monologue generator process for {selected_character}...")
     tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
     print("TTS model loaded successfully in monologue generator process.")
+    sample_rate = tts_model.synthesizer.output_sample_rate
+    # Reused buffers for synthesized audio, so post-processing works in place
+    pool = BufferPool()
 
-    # Create a thread-safe queue for monologues
-    monologue_queue = ThreadQueue(maxsize=50)  # Increased size for more buffering
-
-    # Start a background thread for monologue generation
-    generator_thread = Thread(
-        target=monologue_generation_thread,
-        args=(
-            monologue_queue,
-            stop_event,
-            conversation_history,
-            modifications,
-            tts_model,
-            selected_speaker,
-            selected_character,
-            max_cpu_usage
-        )
-    )
-    generator_thread.start()
+    # Bridge lines the player inserts when the buffer runs low
+    audio_buffer.offer_fillers(load_filler_library(selected_character, tts_model, selected_speaker, MONOLOGUE_SPEED))
 
-    start_time = time.time()
+    # Speech rate model calibrated from every synthesis in previous sessions
+    rate_model = SpeechRateModel.load()
 
-    while not stop_event.is_set():
-        # Check if desired duration is reached (if duration is set)
-        if desired_duration_seconds > 0:
-            if total_duration_seconds >= desired_duration_seconds:
-                stop_event.set()
-                break
-
-        try:
-            # Get the next monologue from the queue
-            character_monologue_clean, wav, duration = monologue_queue.get(timeout=1)
-            if character_monologue_clean is None:
-                continue
-
-            # Update conversation history
-            conversation_history.append(f"{selected_character}: {character_monologue_clean}")
-            conversation_transcript += f"{selected_character}: {character_monologue_clean}\n"
+    # Every monologue and filler is journaled as it is played; the .txt report is derived from it
+    journal = SessionJournal(journal_path(output_filename))
+    journal.append(
+        'session',
+        mode='monologue',
+        character=selected_character,
+        speaker=selected_speaker,
+        modifications=modifications,
+        desired_duration_seconds=desired_duration_seconds
+    )
 
-            total_duration_seconds += duration
+    # Set once the latest monologue is in the history, so the next prompt can continue from it
+    turn_done = threading.Event()
 
-            # Put audio data into the shared queue for audio playback
-            audio_queue.put(wav)
+    def prompts():
+        """Source: the prompt for each next monologue, with the duration budget reserved for it"""
+        nonlocal reserved_seconds
+        while not stop_event.is_set():
+            duration_budget = MAX_MONOLOGUE_SECONDS
+            if audio_buffer.low_water.is_set():
+                duration_budget = LOW_WATER_MONOLOGUE_SECONDS
+            with budget_changed:
+                if desired_duration_seconds > 0:
+                    # While the monologues in flight may already fill the session, wait for their real durations
+                    while (planned_seconds < desired_duration_seconds <= planned_seconds + reserved_seconds
+                           and not stop_event.is_set()):
+                        budget_changed.wait(timeout=1)
+                    if planned_seconds >= desired_duration_seconds or stop_event.is_set():
+                        return
+                    duration_budget = min(duration_budget, desired_duration_seconds - planned_seconds - reserved_seconds)
+                reserved_seconds += duration_budget
+            turn_done.clear()
+            yield generate_character_prompt(conversation_history, modifications, selected_character), duration_budget
+            turn_done.wait()
 
-            # Update progress
-            progress = {
-                'total_duration_seconds': total_duration_seconds,
-                'desired_duration_seconds': desired_duration_seconds
-            }
-            progress_queue.put(progress)
+    def settle(duration_budget, duration=0.0):
+        """Replace a monologue's reserved budget by the audio it produced (none if it was dropped)"""
+        nonlocal planned_seconds, reserved_seconds
+        with budget_changed:
+            reserved_seconds -= duration_budget
+            planned_seconds += duration
+            budget_changed.notify_all()
 
-            # Small pause before processing the next monologue
-            # Reduced pause time to minimize gaps
-            time.sleep(random.uniform(0.1, 0.3))
+    def wake_source():
+        with budget_changed:
+            budget_changed.notify_all()
 
-        except Exception as e:
-            if stop_event.is_set():
-                break
+    def drop_prompt(item):
+        settle(item[-1])
+        turn_done.set()
 
-    # Wait for the generator thread to finish
-    generator_thread.join()
+    def generate(item):
+        character_prompt, duration_budget = item
+        # Limit CPU usage
+        while psutil.cpu_percent(interval=0.1) > max_cpu_usage * 100:
+            time.sleep(0.1)
 
-    # Optionally, save the transcript to a file
-    with open(f"{output_filename}.txt", "w", encoding="utf-8") as f:
-        f.write(conversation_transcript)
+        character_monologue = call_llm_api(
+            character_prompt,
+            duration_budget=duration_budget,
+            rate_model=rate_model,
+            speaker=selected_speaker,
+            speed=MONOLOGUE_SPEED
+        )
+        if not character_monologue:
+            return None  # Dropped and retried if generation failed
+        return character_monologue, duration_budget
 
-def monologue_generation_thread(
-    monologue_queue,
-    stop_event,
-    conversation_history,
-    modifications,
-    tts_model,
-    selected_speaker,
-    selected_character,
-    max_cpu_usage
-):
-    while not stop_event.is_set():
+    def clean(item):
+        nonlocal conversation_history
+        character_monologue, duration_budget = item
         try:
-            # Limit CPU usage
-            while psutil.cpu_percent(interval=0.1) > max_cpu_usage * 100:
-                time.sleep(0.1)
-
-            # Generate monologue
-            character_prompt = generate_character_prompt(conversation_history, modifications, selected_character)
-            character_monologue = call_llm_api(character_prompt)
-
-            if not character_monologue:
-                continue  # Retry if generation failed
-
             character_monologue_clean = clean_text(character_monologue)
             if not character_monologue_clean:
-                continue  # Retry if cleaning resulted in empty string
+                return None  # Dropped and retried if cleaning resulted in empty string
 
             # Detect emotion (optional)
             # emotion = detect_emotion(character_monologue_clean)
 
-            # Synthesize speech
-            wav = tts_model.tts(
-                character_monologue_clean,
-                speaker=selected_speaker,
-                speed=0.85,
-            )
-            wav = np.array(wav, dtype=np.float32)
-            wav = wav / np.max(np.abs(wav))
-
-            # Estimate duration
-            duration = len(wav) / tts_model.synthesizer.output_sample_rate
-
             # Update conversation history
             conversation_history.append(f"{selected_character}: {character_monologue_clean}")
 
             # Truncate conversation history to maintain context window
             conversation_history = truncate_conversation(conversation_history, max_tokens=3000)
+            return character_monologue_clean, duration_budget
+        finally:
+            turn_done.set()
+
+    def synthesize(item):
+        character_monologue_clean, duration_budget = item
+        started = time.perf_counter()
+        wav = synthesize_pooled(
+            tts_model,
+            pool,
+            character_monologue_clean,
+            speaker=selected_speaker,
+            speed=MONOLOGUE_SPEED,
+        )
+        return character_monologue_clean, wav, time.perf_counter() - started, duration_budget
+
+    def post_process(item):
+        character_monologue_clean, wav, synthesis_seconds, duration_budget = item
+        # Loudness is left to the player, which normalizes everything it plays
+        # Trim edge silence so the pause between monologues is set by gap_after alone
+        wav = trim_silence(wav, sample_rate)
+
+        # Estimate duration
+        duration = len(wav) / sample_rate
+
+        # Calibrate the speech rate model with the measured synthesis
+        rate_model.observe(character_monologue_clean, duration, selected_speaker, MONOLOGUE_SPEED)
+        settle(duration_budget, duration)
+        return character_monologue_clean, wav, duration, synthesis_seconds
+
+    def record_fillers():
+        for event in audio_buffer.drain_events():
+            if event.get('type') == 'filler':
+                journal.append('filler', character=selected_character, text=event['text'], played_at=event.get('time'))
+
+    def play(item):
+        nonlocal total_duration_seconds
+        character_monologue_clean, wav, duration, synthesis_seconds = item
+        record_fillers()
+        total_duration_seconds += duration
+
+        # Small pause before the next monologue
+        gap_after = random.uniform(*MONOLOGUE_GAP_RANGE)
+        journal.append(
+            'monologue',
+            character=selected_character,
+            text=character_monologue_clean,
+            duration=duration,
+            gap_after=gap_after,
+            synthesis_seconds=synthesis_seconds,
+            total_duration_seconds=total_duration_seconds
+        )
+
+        # Put audio data into the shared buffer for audio playback (blocks while it is full)
+        audio_buffer.put(wav, sample_rate, gap_after=gap_after)
+
+        # Update progress
+        progress = {
+            'total_duration_seconds': total_duration_seconds,
+            'desired_duration_seconds': desired_duration_seconds,
+            **audio_buffer.depth()
+        }
+        progress_queue.put(progress)
+
+        # Check if desired duration is reached (if duration is set)
+        if desired_duration_seconds > 0 and total_duration_seconds >= desired_duration_seconds:
+            stop_event.set()
+        return item
+
+    pipeline = Pipeline(
+        "monologue",
+        prompts(),
+        [
+            # Every stage before the budget is settled gives it back when it drops a monologue
+            Stage("llm", generate, concurrency=LLM_CONCURRENCY, maxsize=STAGE_QUEUE_SIZE, on_drop=drop_prompt),
+            Stage("clean", clean, maxsize=STAGE_QUEUE_SIZE, on_drop=lambda item: settle(item[-1])),
+            Stage("tts", synthesize, concurrency=TTS_CONCURRENCY, maxsize=STAGE_QUEUE_SIZE, on_drop=lambda item: settle(item[-1])),
+            Stage("post-process", post_process, maxsize=STAGE_QUEUE_SIZE, on_drop=lambda item: settle(item[-1])),
+            Stage("sink", play, maxsize=STAGE_QUEUE_SIZE),
+        ],
+        stop_event=stop_event,
+        pause_event=pause_event
+    )
+    pipeline.on_cancel(turn_done.set)
+    pipeline.on_cancel(wake_source)
+    pipeline.on_cancel(audio_buffer.wake)
+    pipeline.run()
+    # Observations the speech rate model has not saved yet
+    rate_model.close()
+
+    record_fillers()
+    logger.info(f"Audio buffer pool: {pool.stats()}")
+
+    journal.append('end', total_duration_seconds=total_duration_seconds)
+    journal.close()
 
-            # Put the monologue and audio into the queue
-            monologue_queue.put((character_monologue_clean, wav, duration))
+    # Save the transcript, derived from the journal
+    def format_record(record):
+        if record['type'] == 'monologue':
+            return f"{record['character']}: {record['text']}\n"
+        if record['type'] == 'filler':
+            return f"[Filler] {record['character']}: {record['text']}\n"
+        return None
 
-        except Exception as e:
-            print(f"Error generating monologue: {e}")
-            continue
+    export_report(journal.path, f"{output_filename}.txt", format_record)
@@ -0,0 +1,279 @@
+# pipeline.py
+
+import time
+import threading
+import logging
+from collections import deque
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# How often the monitor thread mirrors stop_event and pause_event into the pipeline
+# (multiprocessing events cannot wait for "cleared" or on several events at once)
+MONITOR_INTERVAL = 0.05
+
+# Marks the end of a stream in a channel
+_END = object()
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage worker when the pipeline is cancelled while it waits."""
+
+class Channel:
+    """
+    Bounded queue between two stages. put() blocks while the channel is full (backpressure),
+    get() blocks until an item arrives or every producer has finished. Both wake up
+    immediately when the pipeline is cancelled.
+    """
+
+    def __init__(self, maxsize, cancelled):
+        self.maxsize = maxsize
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._producers = 0
+        self._cancelled = cancelled
+
+    def add_producer(self):
+        with self._cond:
+            self._producers += 1
+
+    def producer_done(self):
+        with self._cond:
+            self._producers -= 1
+            self._cond.notify_all()
+
+    def put(self, item):
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self._cancelled.is_set():
+                self._cond.wait()
+            if self._cancelled.is_set():
+                raise PipelineCancelled()
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while not self._items and self._producers > 0 and not self._cancelled.is_set():
+                self._cond.wait()
+            if self._cancelled.is_set():
+                raise PipelineCancelled()
+            if not self._items:
+                return _END
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+class Stage:
+    """
+    One step of a pipeline.
+    func(item) returns the item for the next stage, None to drop it, or (with fan_out=True)
+    an iterable of items. on_drop(item) is called when an item is dropped or its func raises.
+    """
+
+    def __init__(self, name, func, concurrency=1, maxsize=2, fan_out=False, on_drop=None):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.maxsize = maxsize
+        self.fan_out = fan_out
+        self.on_drop = on_drop
+        # Metrics
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self._metrics_lock = threading.Lock()
+
+    def _record(self, busy, dropped):
+        with self._metrics_lock:
+            self.busy_seconds += busy
+            if dropped:
+                self.dropped += 1
+            else:
+                self.processed += 1
+
+class Pipeline:
+    """
+    Runs a source iterator through a chain of stages, each with its own worker threads and a
+    bounded input channel. Cancellation (stop_event or cancel()) wakes every blocked stage,
+    and pause_event holds stages between items.
+    """
+
+    def __init__(self, name, source, stages, stop_event=None, pause_event=None):
+        self.name = name
+        self.source = source
+        self.stages = stages
+        self.stop_event = stop_event
+        self.pause_event = pause_event
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._pause_cond = threading.Condition()
+        self._paused = False
+        self._channels = [Channel(stage.maxsize, self._cancelled) for stage in stages]
+        self._threads = []
+        self._cancel_callbacks = []
+        self._started = None
+        self._finished = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def on_cancel(self, callback):
+        """Register a callback that wakes anything a stage blocks on outside the pipeline."""
+        self._cancel_callbacks.append(callback)
+
+    def cancel(self):
+        """Stop every stage as soon as possible; queued items are discarded."""
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        for channel in self._channels:
+            channel.wake()
+        with self._pause_cond:
+            self._pause_cond.notify_all()
+        for callback in self._cancel_callbacks:
+            callback()
+
+    def wait_if_paused(self):
+        with self._pause_cond:
+            while self._paused and not self._cancelled.is_set():
+                self._pause_cond.wait()
+
+    def _set_paused(self, paused):
+        with self._pause_cond:
+            self._paused = paused
+            self._pause_cond.notify_all()
+
+    def _monitor_events(self):
+        """Cancel on stop_event and release paused stages on resume, until run() returns."""
+        while not self._done.is_set():
+            if self.stop_event is not None and self.stop_event.is_set():
+                self.cancel()
+                return
+            paused = self.pause_event is not None and self.pause_event.is_set()
+            if paused != self._paused:
+                self._set_paused(paused)
+            self._done.wait(MONITOR_INTERVAL)
+
+    def _run_source(self):
+        output = self._channels[0]
+        try:
+            for item in self.source:
+                self.wait_if_paused()
+                if self._cancelled.is_set():
+                    break
+                output.put(item)
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"[{self.name}] Source failed: {e}", exc_info=True)
+            print(f"Error in {self.name} pipeline source: {e}")
+        finally:
+            output.producer_done()
+
+    def _run_worker(self, index):
+        stage = self.stages[index]
+        input_channel = self._channels[index]
+        output_channel = self._channels[index + 1] if index + 1 < len(self._channels) else None
+        try:
+            while True:
+                item = input_channel.get()
+                if item is _END:
+                    break
+                self.wait_if_paused()
+                if self._cancelled.is_set():
+                    break
+
+                started = time.perf_counter()
+                try:
+                    result = stage.func(item)
+                except PipelineCancelled:
+                    raise
+                except Exception as e:
+                    logger.error(f"[{self.name}] Stage '{stage.name}' failed: {e}", exc_info=True)
+                    print(f"Error in {self.name} stage '{stage.name}': {e}")
+                    result = None
+                stage._record(time.perf_counter() - started, dropped=result is None)
+
+                if result is None:
+                    if stage.on_drop is not None:
+                        stage.on_drop(item)
+                    continue
+                if output_channel is None:
+                    continue
+                if stage.fan_out:
+                    for sub_item in result:
+                        output_channel.put(sub_item)
+                else:
+                    output_channel.put(result)
+        except PipelineCancelled:
+            pass
+        finally:
+            if output_channel is not None:
+                output_channel.producer_done()
+
+    def run(self):
+        """Run the pipeline to completion (or cancellation) and return its stats."""
+        self._started = time.perf_counter()
+
+        monitor = None
+        if self.stop_event is not None or self.pause_event is not None:
+            self._paused = self.pause_event is not None and self.pause_event.is_set()
+            monitor = threading.Thread(target=self._monitor_events, name=f"{self.name}-monitor")
+            monitor.daemon = True
+            monitor.start()
+
+        # Register producers before any thread starts so no channel ends early
+        self._channels[0].add_producer()
+        for index, stage in enumerate(self.stages[:-1]):
+            for _ in range(stage.concurrency):
+                self._channels[index + 1].add_producer()
+
+        self._threads.append(threading.Thread(target=self._run_source, name=f"{self.name}-source"))
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.concurrency):
+                self._threads.append(threading.Thread(
+                    target=self._run_worker,
+                    args=(index,),
+                    name=f"{self.name}-{stage.name}-{worker}"
+                ))
+
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+        for thread in self._threads:
+            thread.join()
+        self._done.set()
+        if monitor is not None:
+            monitor.join()
+
+        self._finished = time.perf_counter()
+        stats = self.stats()
+        for stage_name, stage_stats in stats['stages'].items():
+            logger.info(
+                f"[{self.name}] {stage_name}: {stage_stats['processed']} processed, "
+                f"{stage_stats['dropped']} dropped, {stage_stats['utilization']:.0%} busy"
+            )
+        return stats
+
+    def stats(self):
+        """Per-stage throughput, busy time and current queue depth."""
+        end = self._finished or time.perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        stages = {}
+        for stage, channel in zip(self.stages, self._channels):
+            capacity = elapsed * stage.concurrency
+            stages[stage.name] = {
+                'processed': stage.processed,
+                'dropped': stage.dropped,
+                'busy_seconds': stage.busy_seconds,
+                'utilization': stage.busy_seconds / capacity if capacity > 0 else 0.0,
+                'queue_depth': len(channel)
+            }
+        return {'elapsed_seconds': elapsed, 'cancelled': self.cancelled, 'stages': stages}
@@ -0,0 +1,189 @@
+# playback_ring.py
+
+import threading
+import numpy as np
+from audio_processing import equal_power_curves, DEFAULT_CROSSFADE_MS
+
+# Audio held in the ring ahead of the output device
+DEFAULT_RING_SECONDS = 2.0
+# How often a blocked writer re-checks the ring (and lets the caller refresh its state)
+WRITE_POLL_INTERVAL = 0.25
+
+class PlaybackRing:
+    """
+    Preallocated ring buffer between the player and the audio device callback.
+    The last few milliseconds of each clip are held back until the next clip arrives so the two
+    can be joined with an equal-power crossfade; a pause is joined the same way, so the clip fades
+    out into it and the next clip fades in from it. flush() releases the held tail when nothing follows.
+    """
+
+    def __init__(self, sample_rate, capacity_seconds=DEFAULT_RING_SECONDS, crossfade_ms=DEFAULT_CROSSFADE_MS):
+        self.sample_rate = sample_rate
+        self.fade_length = int(sample_rate * crossfade_ms / 1000)
+        # The ring must always hold more than one held-back tail, or writer and reader could deadlock
+        self.capacity = max(int(sample_rate * capacity_seconds), 2 * self.fade_length + 1)
+        self._ring = np.zeros(self.capacity, dtype=np.float32)
+        # Monotonic sample counters; positions in the ring are taken modulo capacity
+        self._written = 0
+        self._committed = 0  # The reader may play up to here
+        self._read = 0
+        self._cond = threading.Condition()
+        # Underrun accounting, collected by take_underruns()
+        self._underrun_samples = 0
+        self._underruns = 0
+        self._starved = False
+        # Optional second consumer, called with every stretch of audio once it is final
+        self.tap = None
+
+    def _regions(self, start, length):
+        """Ring slices covering length samples from start, as (ring_slice, offset) pairs."""
+        position = start % self.capacity
+        first = min(length, self.capacity - position)
+        regions = [(slice(position, position + first), 0)]
+        if first < length:
+            regions.append((slice(0, length - first), first))
+        return regions
+
+    def next_write_position(self, crossfade=True):
+        """Stream position (in samples) at which the next write() will start, counting its crossfade."""
+        with self._cond:
+            return self._committed if crossfade else self._written
+
+    def _commit(self, position):
+        """Let the reader play up to position, passing the newly committed audio to the tap."""
+        if position <= self._committed:
+            return
+        if self.tap is not None:
+            # Copied on the writer's thread, so the device callback does no extra work
+            length = position - self._committed
+            samples = np.empty(length, dtype=np.float32)
+            for ring_slice, region_offset in self._regions(self._committed, length):
+                samples[region_offset:region_offset + ring_slice.stop - ring_slice.start] = self._ring[ring_slice]
+            self.tap(samples)
+        self._committed = position
+        self._cond.notify_all()
+
+    def wait_readable(self, timeout):
+        """Wait up to timeout seconds for committed audio; returns how many samples can be read."""
+        with self._cond:
+            if self._committed <= self._read:
+                self._cond.wait(timeout)
+            return self._committed - self._read
+
+    def queued_seconds(self):
+        with self._cond:
+            return (self._written - self._read) / self.sample_rate
+
+    def _wait_for_space(self, on_wait):
+        while self._written - self._read >= self.capacity:
+            self._cond.wait(WRITE_POLL_INTERVAL)
+            if on_wait is not None:
+                self._cond.release()
+                try:
+                    on_wait()
+                finally:
+                    self._cond.acquire()
+
+    def write(self, samples, crossfade=True, on_wait=None):
+        """
+        Append a clip, crossfading it into the held-back tail of the previous clip.
+        Blocks while the ring is full, calling on_wait() periodically.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        with self._cond:
+            offset = 0
+            held = self._written - self._committed
+            if crossfade and held > 0:
+                # Overlap the start of this clip with the end of the previous one, in place in the ring
+                overlap = min(held, len(samples))
+                fade_out, fade_in = equal_power_curves(overlap)
+                for ring_slice, region_offset in self._regions(self._written - overlap, overlap):
+                    part = slice(region_offset, region_offset + ring_slice.stop - ring_slice.start)
+                    region = self._ring[ring_slice]
+                    region *= fade_out[part]
+                    region += samples[part] * fade_in[part]
+                offset = overlap
+            hold = min(self.fade_length, len(samples)) if crossfade else 0
+            while offset < len(samples):
+                self._wait_for_space(on_wait)
+                chunk = min(len(samples) - offset, self.capacity - (self._written - self._read))
+                for ring_slice, region_offset in self._regions(self._written, chunk):
+                    start = offset + region_offset
+                    self._ring[ring_slice] = samples[start:start + ring_slice.stop - ring_slice.start]
+                self._written += chunk
+                offset += chunk
+                self._commit(self._written - hold)
+                self._cond.notify_all()
+
+    def write_silence(self, seconds, on_wait=None):
+        """
+        Append a pause, crossfaded like a clip: the held tail of the previous clip fades out into it,
+        and its own end is held back so the next clip fades in from silence.
+        """
+        length = int(seconds * self.sample_rate)
+        with self._cond:
+            held = self._written - self._committed
+            overlap = min(held, length)
+            if overlap > 0:
+                # Crossfading into silence leaves only the fade-out
+                fade_out, _ = equal_power_curves(overlap)
+                for ring_slice, region_offset in self._regions(self._written - overlap, overlap):
+                    self._ring[ring_slice] *= fade_out[region_offset:region_offset + ring_slice.stop - ring_slice.start]
+            remaining = length - overlap
+            hold = min(self.fade_length, length)
+            while remaining > 0:
+                self._wait_for_space(on_wait)
+                chunk = min(remaining, self.capacity - (self._written - self._read))
+                for ring_slice, _ in self._regions(self._written, chunk):
+                    self._ring[ring_slice] = 0.0
+                self._written += chunk
+                self._commit(self._written - hold)
+                remaining -= chunk
+                self._cond.notify_all()
+
+    def flush(self):
+        """Release the held-back tail when no clip is ready to follow it."""
+        with self._cond:
+            self._commit(self._written)
+
+    def drain(self, on_wait=None):
+        """Block until everything written has been played."""
+        with self._cond:
+            self._commit(self._written)
+            while self._read < self._written:
+                self._cond.wait(WRITE_POLL_INTERVAL)
+                if on_wait is not None:
+                    self._cond.release()
+                    try:
+                        on_wait()
+                    finally:
+                        self._cond.acquire()
+
+    def callback(self, outdata, frames, time_info, status):
+        """Output callback (sounddevice signature): fill outdata from the ring, padding with silence."""
+        out = outdata[:, 0]
+        with self._cond:
+            available = min(frames, self._committed - self._read)
+            for ring_slice, region_offset in self._regions(self._read, available):
+                out[region_offset:region_offset + ring_slice.stop - ring_slice.start] = self._ring[ring_slice]
+            out[available:] = 0.0
+            self._read += available
+            if available < frames:
+                self._underrun_samples += frames - available
+                if not self._starved:
+                    self._underruns += 1
+                self._starved = True
+            else:
+                self._starved = False
+            self._cond.notify_all()
+        if outdata.shape[1] > 1:
+            outdata[:, 1:] = outdata[:, :1]
+
+    def take_underruns(self):
+        """Seconds of silence padded since the last call, and how many separate underruns that was."""
+        with self._cond:
+            seconds = self._underrun_samples / self.sample_rate
+            underruns = self._underruns
+            self._underrun_samples = 0
+            self._underruns = 0
+        return seconds, underruns
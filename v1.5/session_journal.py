@@ -0,0 +1,126 @@
+# session_journal.py
+
+import os
+import json
+import time
+import threading
+import logging
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Buffered records are flushed and fsynced once this many have accumulated...
+DEFAULT_SYNC_RECORDS = 16
+# ...or once the oldest of them is this many seconds old
+DEFAULT_SYNC_INTERVAL = 5.0
+# Write buffer of the journal file, in bytes
+JOURNAL_BUFFER_SIZE = 64 * 1024
+
+def journal_path(output_filename):
+    """Journal file kept next to a session's .txt report."""
+    return f"{output_filename}.journal.jsonl"
+
+class SessionJournal:
+    """
+    Append-only JSONL record of a session, written as it happens.
+    Each record is one line with its type and wall-clock time. Writes are buffered and flushed to
+    disk with fsync in batches (by count, and by age from a background thread), so a crash loses at
+    most the last few seconds of records rather than the whole session.
+    """
+
+    def __init__(
+        self,
+        path,
+        append=False,
+        sync_records=DEFAULT_SYNC_RECORDS,
+        sync_interval=DEFAULT_SYNC_INTERVAL
+    ):
+        self.path = path
+        self.sync_records = sync_records
+        self.sync_interval = sync_interval
+        self._file = open(path, "a" if append else "w", encoding="utf-8", buffering=JOURNAL_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._oldest_pending = None
+        self._closed = threading.Event()
+        self.records = 0
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="session-journal-sync")
+        self._sync_thread.daemon = True
+        self._sync_thread.start()
+
+    def append(self, record_type, **fields):
+        """Append a record; returns it as written."""
+        record = {'type': record_type, 'time': time.time(), **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.records += 1
+            self._pending += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            if self._pending >= self.sync_records:
+                self._sync()
+        return record
+
+    def _sync(self):
+        """Flush buffered records to disk; call with the lock held."""
+        self._file.flush()
+        try:
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error(f"Could not fsync {self.path}: {e}")
+        self._pending = 0
+        self._oldest_pending = None
+
+    def sync(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.sync_interval / 2):
+            with self._lock:
+                if self._oldest_pending is not None and time.monotonic() - self._oldest_pending >= self.sync_interval:
+                    self._sync()
+
+    def close(self):
+        self._closed.set()
+        self._sync_thread.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+def read_journal(path):
+    """Yield the records of a journal in order, one line at a time; a torn last line is skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping unreadable record on line {line_number} of {path}")
+
+def compact_journal(path, keep):
+    """Rewrite a journal keeping only the records for which keep(record) is true, replacing it atomically."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as out:
+        for record in read_journal(path):
+            if keep(record):
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp_path, path)
+
+def export_report(path, report_path, format_record, header=""):
+    """
+    Write a text report from a journal in a single streaming pass.
+    format_record(record) returns the text for a record, or None to leave it out.
+    """
+    with open(report_path, "w", encoding="utf-8") as out:
+        out.write(header)
+        for record in read_journal(path):
+            text = format_record(record)
+            if text:
+                out.write(text)
@@ -1,35 +1,108 @@
 # shared_functions.py
 
 import re
+import json
+import time
+import logging
+import urllib.request
+import urllib.error
 from textblob import TextBlob
-import subprocess
 
-def call_llm_api(prompt):
-    # Implement your API call here
-    # Replace this placeholder with the actual API call to your LLM
-    # For example, if using OpenAI's GPT-3.5-turbo or GPT-4:
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Ollama server and model used by every mode
+OLLAMA_URL = "http://localhost:11434/api/generate"
+LLM_MODEL = "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest"
+
+# Average number of LLM tokens per spoken English word
+TOKENS_PER_WORD = 1.35
+# Hard num_predict ceiling relative to the budget, leaving room to finish the last sentence
+BUDGET_CEILING = 1.3
+
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s*$')
+
+def duration_to_token_budget(duration_budget, rate_model=None, speaker=None, speed=1.0):
+    """Convert seconds of audio into an LLM token budget through the speech rate model."""
+    if rate_model is not None:
+        words = rate_model.words_for_duration(duration_budget, speaker, speed)
+    else:
+        words = duration_budget * 150 / 60  # 150 words per minute
+    return max(int(words * TOKENS_PER_WORD), 1)
+
+def trim_to_sentence_boundary(text):
+    """Drop a trailing unfinished sentence, keeping the text if it has no complete sentence."""
+    text = text.strip()
+    if SENTENCE_END.search(text):
+        return text
+    matches = list(re.finditer(r'[.!?]["\')\]]*(?=\s)', text))
+    if not matches:
+        return text
+    return text[:matches[-1].end()].strip()
+
+def call_llm_api(prompt, duration_budget=None, rate_model=None, speaker=None, speed=1.0, options=None, on_first_token=None, stats=None):
     """
-    import openai
-    openai.api_key = 'YOUR_API_KEY'
-    response = openai.Completion.create(
-        engine="gpt-3.5-turbo",
-        prompt=prompt,
-        max_tokens=1500,
-        temperature=0.7,
-        n=1,
-        stop=None,
-    )
-    return response.choices[0].text.strip()
+    Generate text with the local Ollama server.
+    duration_budget: seconds of speech the answer should fill. It is converted to a token
+    budget; generation stops at the first sentence boundary past the budget, and num_predict
+    caps it hard in case no boundary arrives.
+    on_first_token: called once the server has evaluated the prompt and starts answering.
+    stats: optional dict filled with the request's timings (time_to_first_token, and
+    prompt_eval_count / prompt_eval_seconds when the server reports them).
     """
-    # Placeholder implementation using a command (adjust accordingly)
-    command = ["ollama", "run", "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest", prompt]
+    options = dict(options or {})
+    token_budget = None
+    if duration_budget:
+        token_budget = duration_to_token_budget(duration_budget, rate_model, speaker, speed)
+        options.setdefault('num_predict', int(token_budget * BUDGET_CEILING))
+
+    payload = {'model': LLM_MODEL, 'prompt': prompt, 'stream': True, 'options': options}
+    request = urllib.request.Request(
+        OLLAMA_URL,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+
+    parts = []
+    tokens_generated = 0
+    stopped_early = False
+    stats = stats if stats is not None else {}
+    started = time.monotonic()
     try:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"Error calling LLM API: {e.stderr}")
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if tokens_generated == 0:
+                    stats['time_to_first_token'] = time.monotonic() - started
+                    if on_first_token is not None:
+                        on_first_token()
+                parts.append(chunk.get('response', ''))
+                tokens_generated += 1  # Ollama streams one token per chunk
+                if chunk.get('done'):
+                    # Only the final chunk carries the server's timings (durations in nanoseconds)
+                    stats['prompt_eval_count'] = chunk.get('prompt_eval_count', 0)
+                    stats['prompt_eval_seconds'] = chunk.get('prompt_eval_duration', 0) / 1e9
+                    break
+                if token_budget and tokens_generated >= token_budget and SENTENCE_END.search(parts[-1]):
+                    # Closing the connection makes the server stop generating
+                    stopped_early = True
+                    break
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.error(f"Error calling LLM API: {e}")
+        print(f"Error calling LLM API: {e}")
         return ""
 
+    text = ''.join(parts).strip()
+    if token_budget and tokens_generated >= token_budget:
+        text = trim_to_sentence_boundary(text)
+        logger.info(
+            f"LLM generation bounded at {tokens_generated} tokens "
+            f"(budget {token_budget}, {'sentence boundary' if stopped_early else 'num_predict cap'})"
+        )
+    return text
+
 def generate_character_prompt(conversation_history, modifications, character_name):
     # Define character-specific profiles and instructions separately
     emily_profile = """
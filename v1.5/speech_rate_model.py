@@ -0,0 +1,159 @@
+# speech_rate_model.py
+
+import os
+import re
+import json
+import logging
+import time
+import threading
+import numpy as np
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Kept next to the code rather than in whatever directory the session was started from
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "speech_rate_model.json")
+# Where earlier versions kept it, relative to the working directory; read if the model is missing
+LEGACY_MODEL_PATH = "speech_rate_model.json"
+# Longest time new observations wait before being saved; generators also save at session end
+SAVE_INTERVAL = 60.0
+DEFAULT_WORDS_PER_MINUTE = 150
+
+# Features: words, characters, pause punctuation, constant offset
+NUM_FEATURES = 4
+# Prior coefficients equivalent to the old fixed 150 wpm estimate
+PRIOR_COEFFICIENTS = [60.0 / DEFAULT_WORDS_PER_MINUTE, 0.0, 0.0, 0.0]
+# How strongly the prior holds until enough real samples arrive
+PRIOR_STRENGTH = 25.0
+# Samples required before a speaker/speed model is trusted over the pooled one
+MIN_SAMPLES = 3
+
+def text_features(text):
+    """Features used to predict spoken duration of a piece of text."""
+    words = len(text.split())
+    characters = len(re.sub(r'\s', '', text))
+    pauses = len(re.findall(r'[.!?,;:…-]', text))
+    return [float(words), float(characters), float(pauses), 1.0]
+
+class SpeechRateModel:
+    """
+    Incremental linear regression of synthesized duration on text features,
+    kept per speaker and speed and persisted between sessions.
+    Unseen speaker/speed pairs fall back to a pooled model trained on
+    speed-normalized durations, and to 150 wpm when nothing has been observed yet.
+    Observations are saved at most every SAVE_INTERVAL seconds; call save() when the session ends.
+    """
+
+    POOLED_KEY = "*"
+
+    def __init__(self, path=DEFAULT_MODEL_PATH):
+        self.path = path
+        self.stats = {}  # key -> {'xtx': [[...]], 'xty': [...], 'count': int}
+        self._lock = threading.Lock()
+        self._unsaved = 0  # Observations since the last save
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """Load a persisted model, starting fresh if the file is missing or unreadable."""
+        model = cls(path)
+        source = path
+        if not os.path.exists(path) and path == DEFAULT_MODEL_PATH and os.path.exists(LEGACY_MODEL_PATH):
+            source = LEGACY_MODEL_PATH
+        if os.path.exists(source):
+            try:
+                with open(source, 'r', encoding='utf-8') as f:
+                    model.stats = json.load(f)
+                logger.info(f"Loaded speech rate model with {len(model.stats)} profiles from {source}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load speech rate model from {source}: {e}")
+        return model
+
+    def save(self):
+        """Persist the accumulated statistics atomically."""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with self._lock:
+                data = json.dumps(self.stats)
+                self._unsaved = 0
+                self._last_save = time.monotonic()
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Could not save speech rate model to {self.path}: {e}")
+
+    @staticmethod
+    def profile_key(speaker, speed):
+        return f"{speaker}|{float(speed):.2f}"
+
+    def _accumulate(self, key, features, duration):
+        entry = self.stats.setdefault(key, {
+            'xtx': [[0.0] * NUM_FEATURES for _ in range(NUM_FEATURES)],
+            'xty': [0.0] * NUM_FEATURES,
+            'count': 0
+        })
+        for i in range(NUM_FEATURES):
+            entry['xty'][i] += features[i] * duration
+            for j in range(NUM_FEATURES):
+                entry['xtx'][i][j] += features[i] * features[j]
+        entry['count'] += 1
+
+    def observe(self, text, duration, speaker=None, speed=1.0):
+        """Record one actual synthesis: the text and the measured audio duration in seconds."""
+        if not text or duration <= 0:
+            return
+        features = text_features(text)
+        with self._lock:
+            self._accumulate(self.profile_key(speaker, speed), features, duration)
+            # Pooled model learns speed-independent durations
+            self._accumulate(self.POOLED_KEY, features, duration * speed)
+            self._unsaved += 1
+            due = time.monotonic() - self._last_save >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def close(self):
+        """Save observations not yet on disk; called when a session ends."""
+        with self._lock:
+            unsaved = self._unsaved
+        if unsaved:
+            self.save()
+
+    def _coefficients(self, key):
+        entry = self.stats.get(key)
+        if entry is None:
+            return None
+        # Ridge regression towards the 150 wpm prior
+        xtx = np.array(entry['xtx']) + PRIOR_STRENGTH * np.eye(NUM_FEATURES)
+        xty = np.array(entry['xty']) + PRIOR_STRENGTH * np.array(PRIOR_COEFFICIENTS)
+        try:
+            return np.linalg.solve(xtx, xty)
+        except np.linalg.LinAlgError:
+            return None
+
+    def sample_count(self, speaker=None, speed=1.0):
+        entry = self.stats.get(self.profile_key(speaker, speed))
+        return entry['count'] if entry else 0
+
+    def predict(self, text, speaker=None, speed=1.0):
+        """Predict the spoken duration of text in seconds."""
+        features = np.array(text_features(text))
+        with self._lock:
+            if self.sample_count(speaker, speed) >= MIN_SAMPLES:
+                coefficients = self._coefficients(self.profile_key(speaker, speed))
+                if coefficients is not None:
+                    return max(float(features @ coefficients), 0.0)
+            coefficients = self._coefficients(self.POOLED_KEY)
+        if coefficients is not None:
+            return max(float(features @ coefficients), 0.0) / speed
+        return features[0] / DEFAULT_WORDS_PER_MINUTE * 60 / speed
+
+    def seconds_per_word(self, speaker=None, speed=1.0):
+        """Average seconds per word for a profile, measured on a typical sentence."""
+        sample = "This is a typical sentence, spoken at a normal pace for the audience."
+        return self.predict(sample, speaker, speed) / len(sample.split())
+
+    def words_for_duration(self, seconds, speaker=None, speed=1.0):
+        """Number of words that fill the given number of seconds."""
+        return max(int(seconds / self.seconds_per_word(speaker, speed)), 1)
@@ -0,0 +1,120 @@
+# story_manifest.py
+
+import os
+import json
+import hashlib
+import logging
+from session_journal import SessionJournal, read_journal
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Both files live in the stories output directory
+INDEX_FILENAME = "story_index.json"
+MANIFEST_FILENAME = "story_manifest.jsonl"
+# Read size when hashing story files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def hash_file(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class StoryIndex:
+    """
+    Content hashes of the story files in an input directory, kept in a small JSON index.
+    A scan only stats the files; a file is hashed again only when its size or modification time
+    differs from the index, so unchanged libraries of any size are indexed without reading them.
+    """
+
+    def __init__(self, input_dir, index_path):
+        self.input_dir = input_dir
+        self.index_path = index_path
+        self.entries = {}
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def scan(self):
+        """Story file names in directory order, refreshing the hashes of changed files."""
+        names = []
+        entries = {}
+        changed = False
+        with os.scandir(self.input_dir) as listing:
+            for entry in listing:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                known = self.entries.get(entry.name)
+                if known is None or known['size'] != stat.st_size or known['mtime_ns'] != stat.st_mtime_ns:
+                    known = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hash_file(entry.path)}
+                    changed = True
+                entries[entry.name] = known
+                names.append(entry.name)
+        if changed or len(entries) != len(self.entries):
+            self.entries = entries
+            self._save()
+        return names
+
+    def content_hash(self, name):
+        return self.entries[name]['sha256']
+
+    def _save(self):
+        """Replace the index atomically; a failed write only costs a rehash on the next scan."""
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not save the story index {self.index_path}: {e}")
+
+def output_key(**settings):
+    """Manifest key of one rendered story version, from everything its output depends on."""
+    return json.dumps(settings, sort_keys=True)
+
+class OutputManifest:
+    """
+    Story versions rendered in earlier sessions, keyed by output_key(): the story's content hash
+    and every setting and model that shaped the output. Kept as an append-only JSONL file; the
+    latest record for a key wins, and entries whose audio has since been deleted are ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            for record in read_journal(path):
+                if record.get('type') == 'output':
+                    self.entries[record['key']] = record
+        self._journal = SessionJournal(path, append=True)
+
+    def lookup(self, key):
+        """The record of an existing output for key, or None if its audio was deleted or overwritten since."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(entry['audio_path'])
+        except OSError:
+            return None
+        if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+            return None
+        return entry
+
+    def record(self, key, audio_path, transcript_path):
+        """Add an output once its audio file is complete."""
+        stat = os.stat(audio_path)
+        self.entries[key] = self._journal.append(
+            'output', key=key, audio_path=audio_path, transcript_path=transcript_path,
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns
+        )
+
+    def close(self):
+        self._journal.close()
@@ -1,9 +1,15 @@
 import re
+import zlib
 from dataclasses import dataclass
 from typing import Optional
 import random
 from emotions import EMOTIONS
 from textblob import TextBlob
+from shared_functions import call_llm_api
+
+# Rewrites requested from the LLM at the same time unless configured otherwise; an Ollama server
+# answers up to 4 requests in parallel by default
+DEFAULT_REWRITE_CONCURRENCY = 4
 
 @dataclass
 class StorytellerCharacterConfig:
@@ -15,6 +21,11 @@ class StorytellerCharacterConfig:
     selected_vibe: Optional[str]
     stories_input_dir: str
     stories_output_dir: str
+    audio_format: str = 'wav'  # Format of the saved audio files (see audio_writer.AUDIO_FORMATS)
+    resume: bool = False  # Skip the versions the output directory's manifest lists as saved
+    llm_concurrency: int = DEFAULT_REWRITE_CONCURRENCY  # Rewrites requested from the LLM at the same time, capped at the number of rewrite tasks
+    tts_workers: int = 1  # Versions synthesized at the same time, each worker with its own TTS model
+    chunk_words: int = 1500  # Longer stories are rewritten in parts of about this many words; 0 keeps them whole
 
     def get_emotion_settings(self, text: str) -> dict:
         """Get emotion settings based on the selected vibe or detect from text"""
@@ -30,29 +41,152 @@ class StorytellerCharacterConfig:
         emotion_settings = get_tts_settings_for_emotion(emotion)
         return emotion_settings
 
+# Extra headroom over the requested length before LLM generation is cut off
+STORY_BUDGET_HEADROOM = 1.25
+
+# Words of the preceding part (in the original) given with each part of a chunked story, for continuity
+CARRY_OVER_WORDS = 80
+# Lines such as "***", "---" or "# # #" that mark a scene break
+SCENE_BREAK = re.compile(r'^\s*([*#~=-]\s*){3,}$')
+
+def rewrite_seed(story_name: str, version: int, part: int = 1, parts: int = 1) -> int:
+    """Sampling seed of one rewrite version (or one part of it), stable across sessions so each variant can be reproduced"""
+    key = f"{story_name}:v{version}" if parts == 1 else f"{story_name}:v{version}:p{part}/{parts}"
+    return zlib.crc32(key.encode('utf-8'))
+
+def _split_long_paragraph(paragraph: str, max_words: int) -> list:
+    """Split a paragraph longer than max_words at sentence boundaries"""
+    pieces, current, words = [], [], 0
+    for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+        sentence_words = len(sentence.split())
+        if current and words + sentence_words > max_words:
+            pieces.append(' '.join(current))
+            current, words = [], 0
+        current.append(sentence)
+        words += sentence_words
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+def split_story(text: str, max_words: int) -> list:
+    """
+    Split a story into parts of at most about max_words words at paragraph boundaries, preferring
+    scene breaks once a part is half full. A story within max_words (or max_words 0) stays whole.
+    """
+    if max_words <= 0 or len(text.split()) <= max_words:
+        return [text]
+    paragraphs = []  # (text, starts_scene)
+    scene_break = False
+    for block in re.split(r'\n\s*\n', text.strip()):
+        lines = [line for line in block.splitlines() if not SCENE_BREAK.match(line)]
+        if len(lines) < len(block.splitlines()):
+            scene_break = True
+        block = '\n'.join(lines).strip()
+        if not block:
+            continue
+        for piece in _split_long_paragraph(block, max_words) if len(block.split()) > max_words else [block]:
+            paragraphs.append((piece, scene_break))
+            scene_break = False
+
+    parts, current, words = [], [], 0
+    for paragraph, starts_scene in paragraphs:
+        paragraph_words = len(paragraph.split())
+        if current and (words + paragraph_words > max_words or (starts_scene and words >= max_words / 2)):
+            parts.append('\n\n'.join(current))
+            current, words = [], 0
+        current.append(paragraph)
+        words += paragraph_words
+    if current:
+        parts.append('\n\n'.join(current))
+    return parts
+
+def carry_over(previous_part: str, max_words: int = CARRY_OVER_WORDS) -> str:
+    """
+    The closing sentences of the preceding part, at most about max_words words. This is taken from
+    the original story, not from the rewrite of that part: waiting for the rewrite would make the
+    parts of a version run one after another, and would give every version a different prompt, so
+    the versions could no longer share the evaluated prompt (see StorytellerCharacter.rewrite_story).
+    """
+    sentences = re.split(r'(?<=[.!?])\s+', ' '.join(previous_part.split()))
+    kept, words = [], 0
+    for sentence in reversed(sentences):
+        words += len(sentence.split())
+        if kept and words > max_words:
+            break
+        kept.insert(0, sentence)
+    return ' '.join(kept)
+
 class StorytellerCharacter:
-    def __init__(self, original_story: str, rewriting_intensity: int, length_setting: int, selected_vibe: Optional[str]):
+    def __init__(self, original_story: str, rewriting_intensity: int, length_setting: int, selected_vibe: Optional[str], rate_model=None, speaker=None, part: int = 1, parts: int = 1, story_so_far: str = ""):
         self.original_story = original_story
         self.rewriting_intensity = rewriting_intensity
         self.length_setting = length_setting
         self.selected_vibe = selected_vibe
-
-    def rewrite_story(self) -> str:
-        """Rewrites the story based on the rewriting intensity and selected vibe"""
+        self.rate_model = rate_model
+        self.speaker = speaker
+        # Position of original_story within a story rewritten in parts, and the end of the part before it
+        self.part = part
+        self.parts = parts
+        self.story_so_far = story_so_far
+
+    def rewrite_story(self, seed: Optional[int] = None, on_first_token=None, stats: Optional[dict] = None) -> str:
+        """
+        Rewrites the story based on the rewriting intensity and selected vibe.
+        Every version of a story sends the same prompt and differs only in its sampling seed, so the
+        server can reuse the evaluated prompt from its cache instead of evaluating the story again.
+        """
         prompt = self.generate_story_prompt()
-        rewritten_story = call_llm_api(prompt)
+        rewritten_story = call_llm_api(
+            prompt,
+            duration_budget=self.duration_budget(),
+            rate_model=self.rate_model,
+            speaker=self.speaker,
+            options={'seed': seed} if seed is not None else None,
+            on_first_token=on_first_token,
+            stats=stats
+        )
         clean_story = clean_text(rewritten_story)
         return clean_story
 
+    def duration_budget(self) -> float:
+        """Seconds of narration the rewrite may fill, from the original length and the length setting"""
+        if self.rate_model is not None:
+            original_duration = self.rate_model.predict(self.original_story, self.speaker)
+        else:
+            original_duration = len(self.original_story.split()) / 150 * 60
+        # Length 1 keeps the original length, 5 allows roughly three times as long
+        length_factor = 1 + 0.5 * (self.length_setting - 1)
+        return original_duration * length_factor * STORY_BUDGET_HEADROOM
+
     def generate_story_prompt(self) -> str:
         """Generates a prompt for the LLM to rewrite the story"""
-        base_prompt = f"""
+        if self.parts > 1:
+            # One part of a longer story; the other parts are rewritten separately and joined after it
+            position = "the opening" if self.part == 1 else "the final part" if self.part == self.parts else "a middle part"
+            story_so_far = f"""
+In the original, the story so far ends with (for continuity only, do not rewrite it):
+{self.story_so_far}
+""" if self.story_so_far else ""
+            base_prompt = f"""
+You are a skilled storyteller. Your task is to rewrite part {self.part} of {self.parts} of a longer story, {position}.
+{story_so_far}
+Original Story (part {self.part} of {self.parts}):
+{self.original_story}
+
+Instructions:
+- {"Rewrite only this part, continuing seamlessly from the story so far." if self.story_so_far else "Rewrite only this part."}
+- {"Do not conclude the story; the next part continues from where this one ends." if self.part < self.parts else "Bring the story to its conclusion."}
+"""
+        else:
+            base_prompt = f"""
 You are a skilled storyteller. Your task is to rewrite the following story.
 
 Original Story:
 {self.original_story}
 
 Instructions:
+"""
+        base_prompt += f"""\
 - Rewrite the story with a rewriting intensity of {self.rewriting_intensity} out of 10.
 - Maintain the core concept and plot of the story.
 - Use natural language and make the story engaging.
@@ -75,18 +209,6 @@ Important Notes:
 
         return base_prompt.strip()
 
-def call_llm_api(prompt):
-    # Implement your API call here
-    # Placeholder implementation using a command
-    import subprocess
-    command = ["ollama", "run", "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest", prompt]
-    try:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8', check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"Error calling LLM API: {e.stderr}")
-        return ""
-
 import re
 
 def clean_text(text):
@@ -1,26 +1,46 @@
 # storyteller_generator.py
 
-import time
 import os
-import numpy as np
+import shutil
 from TTS.api import TTS
-from threading import Thread
-from queue import Queue as ThreadQueue
 import logging
-import soundfile as sf
 import re
+import threading
+import soundfile as sf
 
-from storyteller_character import StorytellerCharacter
+from storyteller_character import StorytellerCharacter, rewrite_seed, split_story, carry_over
 from emotions import EMOTIONS
 from storyteller_character import get_tts_settings_for_emotion
+from speech_rate_model import SpeechRateModel
+from pipeline import Pipeline, Stage
+from audio_processing import trim_silence, apply_edge_fades, join_clips, LoudnessNormalizer
+from audio_pool import BufferPool, WorkerModels, synthesize_pooled
+from synthesis_cache import SynthesisCache
+from audio_writer import AudioFileWriter, format_writer_stats
+from session_journal import SessionJournal, read_journal
+from story_manifest import StoryIndex, OutputManifest, output_key, INDEX_FILENAME, MANIFEST_FILENAME
+from shared_functions import LLM_MODEL
+from dataclasses import asdict
 logger = logging.getLogger(__name__)
 
+# Session manifest kept in the output directory, used to resume interrupted sessions
+JOURNAL_FILENAME = "storyteller.journal.jsonl"
+
+TTS_MODEL_NAME = "tts_models/en/vctk/vits"
+
+# Stage graph settings; LLM and TTS concurrency come from the config
+STAGE_QUEUE_SIZE = 2
+# How long a rewrite waits for another version of its story to get the shared prompt evaluated
+PROMPT_WARMUP_TIMEOUT = 300
+# Pause between the parts of a story rewritten in parts, in the stream and the saved file
+PART_GAP_SECONDS = 0.4
+
 def storyteller_generator_process(
-    audio_queue,
+    audio_buffer,
     stop_event,
     storyteller_config,
     selected_speaker,
-    selected_audio_device,
+    audio_sink,
     progress_queue,
     pause_event
 ):
@@ -39,142 +59,422 @@ def storyteller_generator_process(
     # Initialize TTS model
     print(f"\nInitializing TTS model for storytelling...")
     logger.info("Initializing TTS model for storytelling...")
-    tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
+    tts_model = TTS(TTS_MODEL_NAME, progress_bar=False, gpu=False)
     print("TTS model loaded successfully.")
     logger.info("TTS model loaded successfully.")
 
-    # Create a thread-safe queue for story content
-    content_queue = ThreadQueue(maxsize=5)
+    # Every part of every version is its own rewrite task, so more rewrite workers than tasks would sit idle
+    story_parts = {}
+    for story_file in selected_stories:
+        with open(os.path.join(stories_input_dir, story_file), 'r', encoding='utf-8') as f:
+            story_parts[story_file] = split_story(f.read(), storyteller_config.chunk_words)
+    rewrite_tasks = num_rewrites * sum(len(parts) for parts in story_parts.values())
+    llm_concurrency = max(1, min(storyteller_config.llm_concurrency, rewrite_tasks))
+    # Each TTS worker synthesizes with its own model
+    tts_workers = max(1, storyteller_config.tts_workers)
+    worker_models = WorkerModels(tts_model, lambda: TTS(TTS_MODEL_NAME, progress_bar=False, gpu=False), tts_workers)
 
-    def generate_story_content():
-        """Thread function to generate story content"""
-        for story_file in selected_stories:
-            if stop_event.is_set():
-                break
+    # Speech rate model calibrated from every synthesis in previous sessions
+    rate_model = SpeechRateModel.load()
+    sample_rate = tts_model.synthesizer.output_sample_rate
+    # Keeps every story version at the same loudness in the exported files
+    normalizer = LoudnessNormalizer.for_sink('file', sample_rate)
+    # Reused buffers for synthesized audio, so post-processing works in place
+    pool = BufferPool()
+    # Sentences already synthesized for another version of a story are reused instead of synthesized again
+    synthesis_cache = SynthesisCache()
+    reuse = {}  # (story, version) -> [reused samples, total samples] across its parts
+    reuse_lock = threading.Lock()
+    # Audio files are written in the background so the next version's TTS never waits on disk
+    writer = AudioFileWriter(storyteller_config.audio_format)
+
+    # Manifest of finished rewrites and saved audio; a resumed session skips what it lists
+    journal_file = os.path.join(stories_output_dir, JOURNAL_FILENAME)
+    rewritten = {}  # (story, version, part, parts) -> transcript path of rewrites whose audio was never saved
+    saved = set()  # (story, version) with audio on disk
+    resuming = storyteller_config.resume and os.path.exists(journal_file)
+    if resuming:
+        for record in read_journal(journal_file):
+            key = (record.get('story'), record.get('version'))
+            if record['type'] == 'rewrite':
+                rewritten[key + (record.get('part', 1), record.get('parts', 1))] = record['transcript_path']
+            elif record['type'] == 'saved':
+                saved.add(key)
+        rewritten = {key: path for key, path in rewritten.items() if key[:2] not in saved and os.path.exists(path)}
+        print(f"Resuming: {len(saved)} versions already saved, {len(rewritten)} rewrites to synthesize again")
+        logger.info(f"Resuming storyteller session from {journal_file}: {len(saved)} saved, {len(rewritten)} rewrites recovered")
+    elif storyteller_config.resume:
+        print(f"No manifest found at {journal_file}; starting a new session.")
+    os.makedirs(stories_output_dir, exist_ok=True)
+    journal = SessionJournal(journal_file, append=resuming)
+    journal.append('resume' if resuming else 'session', mode='storyteller', speaker=selected_speaker, config=asdict(storyteller_config))
+
+    # Versions rendered in earlier sessions, keyed by the story's content and everything that shaped them
+    story_index = StoryIndex(stories_input_dir, os.path.join(stories_output_dir, INDEX_FILENAME))
+    story_index.scan()
+    manifest = OutputManifest(os.path.join(stories_output_dir, MANIFEST_FILENAME))
+    reused_outputs = []
+
+    def version_key(story_file, version, parts):
+        return output_key(
+            story=story_index.content_hash(story_file),
+            intensity=rewriting_intensity,
+            length=length_setting,
+            vibe=selected_vibe,
+            speaker=selected_speaker,
+            llm_model=LLM_MODEL,
+            tts_model=TTS_MODEL_NAME,
+            chunk_words=storyteller_config.chunk_words if parts > 1 else 0,
+            audio_format=storyteller_config.audio_format,
+            version=version
+        )
+
+    def reuse_output(entry, story_output_dir, story_file, version):
+        """Play a version rendered in an earlier session, copying it to this story's file names if it was renamed."""
+        audio_path = os.path.join(
+            story_output_dir, f"{os.path.splitext(story_file)[0]}_v{version}{os.path.splitext(entry['audio_path'])[1]}"
+        )
+        if os.path.abspath(entry['audio_path']) != os.path.abspath(audio_path):
+            shutil.copyfile(entry['audio_path'], audio_path)
+            if entry.get('transcript_path') and os.path.exists(entry['transcript_path']):
+                shutil.copyfile(entry['transcript_path'], transcript_path_for(story_output_dir, story_file, version))
+        journal.append('saved', story=story_file, version=version, audio_path=audio_path, reused_fraction=1.0, unchanged=True)
+        reused_outputs.append(audio_path)
+        print(f"'{story_file}' version {version} is unchanged since an earlier session; reusing {audio_path}")
+        logger.info(f"Reusing {entry['audio_path']} for '{story_file}' version {version}")
+
+        # Put audio in the playback buffer (blocks while it is full)
+        wav, file_sample_rate = sf.read(audio_path, dtype='float32')
+        audio_buffer.put(wav, file_sample_rate)
+        progress_queue.put({
+            'current_story': story_file,
+            'version': version,
+            'status': 'Unchanged',
+            'writer_queue_depth': writer.queue_depth(),
+            **audio_buffer.depth()
+        })
 
-            # Read the story file
-            story_path = os.path.join(stories_input_dir, story_file)
-            with open(story_path, 'r', encoding='utf-8') as f:
-                original_story = f.read()
+    # Versions of a story share one prompt. The first to start has the server evaluate it; the others
+    # wait until it starts answering and then hit the server's prompt cache instead of evaluating it again
+    prompt_warmups = {}  # (story, part, parts) -> Event set once its prompt has been evaluated
+    prompt_lock = threading.Lock()
+    prompt_totals = {'rewrites': 0, 'seconds': 0.0, 'tokens': 0}
 
+    def claim_prompt_warmup(prompt_key):
+        """The event to set once this rewrite's prompt is evaluated, or None after another rewrite evaluated it."""
+        with prompt_lock:
+            warmup = prompt_warmups.get(prompt_key)
+            if warmup is None:
+                warmup = prompt_warmups[prompt_key] = threading.Event()
+                return warmup
+        warmup.wait(PROMPT_WARMUP_TIMEOUT)
+        return None
+
+    def story_versions():
+        """
+        Source: every (story, version) rewrite requested and not saved yet, longest stories first.
+        Stories longer than the chunk size are split into parts that are rewritten as separate tasks,
+        each with the end of the original part before it for continuity.
+        """
+        # Workers take the next task as soon as they are free, so dispatching the longest stories first
+        # leaves the short ones to fill in at the end instead of one long rewrite running on alone
+        longest_first = sorted(
+            selected_stories,
+            key=lambda story_file: os.path.getsize(os.path.join(stories_input_dir, story_file)),
+            reverse=True
+        )
+        for story_file in longest_first:
             # Create output directory for the story
             story_output_dir = os.path.join(stories_output_dir, os.path.splitext(story_file)[0])
             os.makedirs(story_output_dir, exist_ok=True)
 
+            parts = len(story_parts[story_file])
+            if parts > 1:
+                logger.info(f"Rewriting '{story_file}' in {parts} parts")
             for version in range(1, num_rewrites + 1):
-                if stop_event.is_set():
-                    break
-
-                # Rewriting the story based on intensity
-                storyteller = StorytellerCharacter(
-                    original_story=original_story,
-                    rewriting_intensity=rewriting_intensity,
-                    length_setting=length_setting,
-                    selected_vibe=selected_vibe
-                )
-
-                # Generate the rewritten story
-                rewritten_story = storyteller.rewrite_story()
-
-                # Save the rewritten story transcript
-                transcript_path = os.path.join(story_output_dir, f"{os.path.splitext(story_file)[0]}_v{version}_transcript.txt")
-                with open(transcript_path, 'w', encoding='utf-8') as f:
-                    f.write(rewritten_story)
-
-                # Put the rewritten story in the content queue
-                content_queue.put((rewritten_story, story_output_dir, story_file, version))
-
-    # Start content generation thread
-    generator_thread = Thread(target=generate_story_content)
-    generator_thread.daemon = True
-    generator_thread.start()
-
-    while not stop_event.is_set():
-        # Pause if pause_event is set
-        if pause_event.is_set():
-            time.sleep(1)
-            continue
+                if (story_file, version) in saved:
+                    continue
+                entry = manifest.lookup(version_key(story_file, version, parts))
+                if entry is not None:
+                    reuse_output(entry, story_output_dir, story_file, version)
+                    continue
+                for part, part_text in enumerate(story_parts[story_file], 1):
+                    # From the original, so the parts can be rewritten at the same time (see carry_over)
+                    story_so_far = carry_over(story_parts[story_file][part - 2]) if part > 1 else ""
+                    yield part_text, story_so_far, (story_output_dir, story_file, version, part, parts)
+
+    def transcript_path_for(story_output_dir, story_file, version, part=1, parts=1):
+        base = f"{os.path.splitext(story_file)[0]}_v{version}"
+        if parts > 1:
+            base += f"_part{part:02d}"
+        return os.path.join(story_output_dir, f"{base}_transcript.txt")
+
+    def rewrite(item):
+        original_story, story_so_far, task = item
+        story_output_dir, story_file, version, part, parts = task
+
+        if (story_file, version, part, parts) in rewritten:
+            # Rewrite recovered from the manifest of an interrupted session
+            with open(rewritten[(story_file, version, part, parts)], 'r', encoding='utf-8') as f:
+                return f.read(), task
+
+        # Rewriting the story based on intensity
+        storyteller = StorytellerCharacter(
+            original_story=original_story,
+            rewriting_intensity=rewriting_intensity,
+            length_setting=length_setting,
+            selected_vibe=selected_vibe,
+            rate_model=rate_model,
+            speaker=selected_speaker,
+            part=part,
+            parts=parts,
+            story_so_far=story_so_far
+        )
 
+        # Generate the rewritten story, sampled with the version's own seed
+        seed = rewrite_seed(story_file, version, part, parts)
+        warmup = claim_prompt_warmup((story_file, part, parts))
+        stats = {}
         try:
-            # Get content from queue
-            try:
-                rewritten_story, story_output_dir, story_file, version = content_queue.get(timeout=1)
-            except Exception:
-                continue  # No content available yet, loop again
+            rewritten_story = storyteller.rewrite_story(
+                seed=seed,
+                on_first_token=warmup.set if warmup is not None else None,
+                stats=stats
+            )
+        finally:
+            if warmup is not None:
+                warmup.set()
+        # Servers that stop streaming early report no timings; time to first token bounds the prompt evaluation
+        prompt_seconds = stats.get('prompt_eval_seconds', stats.get('time_to_first_token', 0.0))
+        with prompt_lock:
+            prompt_totals['rewrites'] += 1
+            prompt_totals['seconds'] += prompt_seconds
+            prompt_totals['tokens'] += stats.get('prompt_eval_count', 0)
 
-            if stop_event.is_set():
-                break
+        # Save the rewritten story transcript
+        transcript_path = transcript_path_for(*task)
+        with open(transcript_path, 'w', encoding='utf-8') as f:
+            f.write(rewritten_story)
+        # Checkpoint: a resumed session synthesizes this rewrite again instead of rewriting it
+        journal.append(
+            'rewrite', story=story_file, version=version, part=part, parts=parts, transcript_path=transcript_path,
+            seed=seed, prompt_eval_seconds=round(prompt_seconds, 3), prompt_eval_count=stats.get('prompt_eval_count')
+        )
+
+        return rewritten_story, task
+
+    def prepare(item):
+        rewritten_story, task = item
+
+        # Extract emotion labels and sound effects
+        emotions = re.findall(r'\[\*\*(.*?)\*\*\]', rewritten_story)
+        sound_effects = re.findall(r'!!(.*?)!!', rewritten_story)
+
+        # Remove emotion labels and sound effects from the text for TTS
+        clean_text = re.sub(r'\[\*\*(.*?)\*\*\]', '', rewritten_story)
+        clean_text = re.sub(r'!!(.*?)!!', '', clean_text)
 
-            # Extract emotion labels and sound effects
-            emotions = re.findall(r'\[\*\*(.*?)\*\*\]', rewritten_story)
-            sound_effects = re.findall(r'!!(.*?)!!', rewritten_story)
-
-            # Remove emotion labels and sound effects from the text for TTS
-            clean_text = re.sub(r'\[\*\*(.*?)\*\*\]', '', rewritten_story)
-            clean_text = re.sub(r'!!(.*?)!!', '', clean_text)
-
-            # Determine TTS settings based on emotions
-            tts_settings = {}
-            for emotion in emotions:
-                # Map the emotion to TTS settings
-                if emotion in EMOTIONS:
-                    emotion_settings = get_tts_settings_for_emotion(emotion)
-                    # Update tts_settings; prioritize more intense emotions if multiple
-                    tts_settings.update(emotion_settings)
-
-            # Adjust settings based on sound effects
-            for effect in sound_effects:
-                if effect.lower() in ['gasp', 'bang bang']:
-                    # Example: Increase volume or alter pitch for sound effects
-                    tts_settings['pitch'] = tts_settings.get('pitch', 1.0) + 0.2
-                    tts_settings['volume'] = 1.5  # Assuming 'volume' is a valid parameter
-
-            # Synthesize speech with emotion settings
-            try:
-                wav = tts_model.tts(
-                    text=clean_text,
-                    speaker=selected_speaker,
-                    speed=tts_settings.get('speed', 1.0),
-                    pitch=tts_settings.get('pitch', 1.0),
-                    volume=tts_settings.get('volume', 1.0)
-                )
-            except Exception as e:
-                logger.error(f"TTS synthesis error: {e}", exc_info=True)
-                print(f"TTS synthesis error: {e}")
-                continue
-
-            # Process audio
-            wav = np.array(wav, dtype=np.float32)
-            if np.max(np.abs(wav)) > 0:
-                wav = wav / np.max(np.abs(wav))  # Normalize audio
-
-            # Save audio to file
-            audio_filename = os.path.join(story_output_dir, f"{os.path.splitext(story_file)[0]}_v{version}.wav")
-            sf.write(audio_filename, wav, samplerate=tts_model.synthesizer.output_sample_rate)
-            print(f"Audio for '{story_file}' version {version} saved to {audio_filename}")
-            logger.info(f"Audio for '{story_file}' version {version} saved to {audio_filename}")
-
-            # Put audio in queue for playback
-            audio_queue.put(wav)
+        # Determine TTS settings based on emotions
+        tts_settings = {}
+        for emotion in emotions:
+            # Map the emotion to TTS settings
+            if emotion in EMOTIONS:
+                emotion_settings = get_tts_settings_for_emotion(emotion)
+                # Update tts_settings; prioritize more intense emotions if multiple
+                tts_settings.update(emotion_settings)
+
+        # Adjust settings based on sound effects
+        for effect in sound_effects:
+            if effect.lower() in ['gasp', 'bang bang']:
+                # Example: Increase volume or alter pitch for sound effects
+                tts_settings['pitch'] = tts_settings.get('pitch', 1.0) + 0.2
+                tts_settings['volume'] = 1.5  # Assuming 'volume' is a valid parameter
+
+        return clean_text, tts_settings, task
+
+    def synthesize(item):
+        clean_text, tts_settings, task = item
+
+        # Synthesize speech with emotion settings
+        synthesis_stats = {}
+        try:
+            wav = synthesize_pooled(
+                worker_models.get(),
+                pool,
+                clean_text,
+                speaker=selected_speaker,
+                cache=synthesis_cache,
+                stats=synthesis_stats,
+                speed=tts_settings.get('speed', 1.0),
+                pitch=tts_settings.get('pitch', 1.0),
+                volume=tts_settings.get('volume', 1.0)
+            )
+        except Exception as e:
+            logger.error(f"TTS synthesis error: {e}", exc_info=True)
+            print(f"TTS synthesis error: {e}")
+            # Passed on without audio, so the sink stops waiting for this part
+            return None, clean_text, tts_settings, task
+        with reuse_lock:
+            totals = reuse.setdefault((task[1], task[2]), [0, 0])
+            totals[0] += synthesis_stats['reused_samples']
+            totals[1] += synthesis_stats['total_samples']
+
+        return wav, clean_text, tts_settings, task
+
+    def post_process(item):
+        wav, clean_text, tts_settings, task = item
+        if wav is None:
+            return None, task
+
+        # Trim edge silence left by the synthesizer
+        wav = trim_silence(wav, sample_rate)
+
+        # Calibrate the speech rate model with the measured synthesis
+        rate_model.observe(
+            clean_text,
+            len(wav) / sample_rate,
+            selected_speaker,
+            tts_settings.get('speed', 1.0)
+        )
+        return wav, task
+
+    # Parts of a version arrive in any order: each is played as soon as the parts before it have been,
+    # and the version is saved as one file once all of them are in
+    arrived_parts = {}  # (story, version) -> {part: audio}
+    played_parts = {}  # (story, version) -> audio of the parts played so far, in order
+    abandoned = set()  # (story, version) with a part that could not be synthesized
+
+    def save_version(story_output_dir, story_file, version, parts, wavs):
+        if parts > 1:
+            # Joined as the player joins them, so the file sounds like the stream
+            wav = join_clips(wavs, sample_rate, PART_GAP_SECONDS)
+            # Stitch the part transcripts into the version's transcript
+            transcripts = []
+            for part in range(1, parts + 1):
+                with open(transcript_path_for(story_output_dir, story_file, version, part, parts), 'r', encoding='utf-8') as f:
+                    transcripts.append(f.read().strip())
+            with open(transcript_path_for(story_output_dir, story_file, version), 'w', encoding='utf-8') as f:
+                f.write('\n\n'.join(transcripts))
+        else:
+            # The played part may still be on its way to the player, so it is not modified in place
+            wav = pool.acquire(len(wavs[0]))
+            wav[:] = wavs[0]
+        # Loudness is set for the file here and for the stream by the player, once each
+        normalizer.process(wav)
+        with reuse_lock:
+            reused_samples, total_samples = reuse.pop((story_file, version), (0, 0))
+        reused_fraction = reused_samples / total_samples if total_samples else 0.0
+
+        def on_written(path):
+            # Checkpoint: the version is complete once its audio is on disk
+            journal.append('saved', story=story_file, version=version, audio_path=path, reused_fraction=round(reused_fraction, 3))
+            manifest.record(version_key(story_file, version, parts), path, transcript_path_for(story_output_dir, story_file, version))
+
+        # Save audio to file in the background
+        audio_filename = writer.submit(
+            os.path.join(story_output_dir, f"{os.path.splitext(story_file)[0]}_v{version}"),
+            wav,
+            sample_rate,
+            on_written=on_written
+        )
+        print(f"Audio for '{story_file}' version {version} queued for {audio_filename} ({reused_fraction:.0%} of the speech reused)")
+        logger.info(f"Audio for '{story_file}' version {version} queued for {audio_filename}, {reused_fraction:.1%} reused from earlier versions")
+
+    def publish(item):
+        wav, task = item
+        story_output_dir, story_file, version, part, parts = task
+        key = (story_file, version)
+        if key in abandoned:
+            return item
+        if wav is None:
+            # The version cannot be completed this session: drop its held parts so their buffers are freed,
+            # and leave it unsaved for a resumed session to redo
+            abandoned.add(key)
+            arrived_parts.pop(key, None)
+            played_parts.pop(key, None)
+            with reuse_lock:
+                reuse.pop(key, None)
+            logger.warning(f"'{story_file}' version {version} abandoned: part {part}/{parts} could not be synthesized")
+            print(f"'{story_file}' version {version} abandoned: part {part}/{parts} could not be synthesized")
+            progress_queue.put({
+                'current_story': story_file,
+                'version': version,
+                'status': 'Failed',
+                'writer_queue_depth': writer.queue_depth(),
+                **audio_buffer.depth()
+            })
+            return item
+        arrived_parts.setdefault(key, {})[part] = wav
+        played = played_parts.setdefault(key, [])
+
+        while len(played) + 1 in arrived_parts[key]:
+            wav = arrived_parts[key].pop(len(played) + 1)
+            # Faded in and out at the trimmed edges
+            apply_edge_fades(wav, sample_rate)
+            # Put audio in the playback buffer (blocks while it is full), pausing between parts
+            gap_after = PART_GAP_SECONDS if len(played) + 1 < parts else 0.0
+            audio_buffer.put(wav, sample_rate, gap_after=gap_after)
+            played.append(wav)
 
             # Update progress
             progress_info = {
                 'current_story': story_file,
                 'version': version,
-                'status': 'Completed'
+                'status': 'Completed' if len(played) == parts else f'Part {len(played)}/{parts}',
+                'writer_queue_depth': writer.queue_depth(),
+                **audio_buffer.depth()
             }
             progress_queue.put(progress_info)
-
-        except Exception as e:
-            if stop_event.is_set():
+            if len(played) == parts:
+                save_version(story_output_dir, story_file, version, parts, played)
+                del arrived_parts[key], played_parts[key]
                 break
-            logger.error(f"Error in storytelling generation loop: {e}", exc_info=True)
-            print(f"Error in storytelling generation loop: {e}")
-            time.sleep(1)
+        return item
+
+    # Stage graph: story versions -> rewrite (prompt + LLM + clean) -> prepare -> tts -> post-process -> sink
+    # Every (story, version, part) is an independent task; the workers of a stage share its input queue,
+    # so an idle worker picks up the next task whichever story it belongs to. File names come from
+    # the story and version, so they do not depend on the order in which tasks finish.
+    pipeline = Pipeline(
+        "storyteller",
+        story_versions(),
+        [
+            Stage("rewrite", rewrite, concurrency=llm_concurrency, maxsize=max(STAGE_QUEUE_SIZE, llm_concurrency)),
+            Stage("prepare", prepare, maxsize=STAGE_QUEUE_SIZE),
+            Stage("tts", synthesize, concurrency=tts_workers, maxsize=max(STAGE_QUEUE_SIZE, tts_workers)),
+            Stage("post-process", post_process, maxsize=STAGE_QUEUE_SIZE),
+            Stage("sink", publish, maxsize=STAGE_QUEUE_SIZE),
+        ],
+        stop_event=stop_event,
+        pause_event=pause_event
+    )
+    pipeline.on_cancel(audio_buffer.wake)
+    pipeline.run()
+    # Observations the speech rate model has not saved yet
+    rate_model.close()
+    logger.info(f"Audio buffer pool: {pool.stats()}")
+    logger.info(f"Synthesis cache: {synthesis_cache.stats()}")
+    for story_file, version in arrived_parts:
+        logger.warning(f"'{story_file}' version {version} is incomplete; resume the session to finish it")
+    # Finish writing queued audio files before reporting
+    writer.close()
+    manifest.close()
+    journal.close()
 
     # Cleanup
     stop_event.set()
-    generator_thread.join(timeout=1)
 
     print("\nStorytelling generation completed.")
+    print(f"- Audio writer: {format_writer_stats(writer.stats())}")
+    if reused_outputs:
+        print(f"- Unchanged versions reused from earlier sessions: {len(reused_outputs)}")
+    if abandoned:
+        print(f"- Versions abandoned after a synthesis error: {len(abandoned)} (resume the session to redo them)")
+    cache_stats = synthesis_cache.stats()
+    if cache_stats['hits'] + cache_stats['misses']:
+        print(f"- Synthesis cache: {cache_stats['hits']} of {cache_stats['hits'] + cache_stats['misses']} sentences reused from earlier versions")
+    print(
+        f"- Prompt evaluation: {prompt_totals['seconds']:.1f}s over {prompt_totals['rewrites']} rewrites "
+        f"({prompt_totals['tokens']} prompt tokens evaluated)"
+    )
     logger.info("Storytelling generation completed.")
\ No newline at end of file
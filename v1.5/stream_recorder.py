@@ -0,0 +1,191 @@
+# stream_recorder.py
+
+import os
+import json
+import time
+import queue
+import threading
+import logging
+import numpy as np
+import soundfile as sf
+from audio_writer import AUDIO_FORMATS, OPUS_SAMPLE_RATES
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Length of each recording file, in minutes
+DEFAULT_SEGMENT_MINUTES = 10.0
+DEFAULT_RECORDING_FORMAT = 'ogg'
+# Audio waiting to be encoded beyond this many seconds is dropped (and recorded as silence)
+MAX_PENDING_SECONDS = 60.0
+INDEX_FILENAME = "index.jsonl"
+
+class StreamRecorder:
+    """
+    Records the audio stream sent to the playback ring into rotating compressed files.
+    The ring hands every stretch of audio to the recorder's tap as it becomes final, on the player's
+    thread, and an encoder thread writes it to one file per segment; the device callback does no
+    extra work and disk stalls never reach playback. Clip markers go to a sidecar JSONL index with
+    their file offsets. Underrun silence padded by the device callback is not part of the recording.
+    """
+
+    def __init__(
+        self,
+        directory,
+        audio_format=DEFAULT_RECORDING_FORMAT,
+        segment_minutes=DEFAULT_SEGMENT_MINUTES,
+        max_pending_seconds=MAX_PENDING_SECONDS
+    ):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported recording format '{audio_format}', choose from {', '.join(AUDIO_FORMATS)}")
+        self.directory = directory
+        self.audio_format = audio_format
+        self.segment_seconds = segment_minutes * 60
+        self.max_pending_seconds = max_pending_seconds
+        os.makedirs(directory, exist_ok=True)
+
+        self._ring = None
+        self._queue = queue.Queue()
+        self._pending_samples = 0
+        self._pending_lock = threading.Lock()
+
+        # Encoder state
+        self._file = None
+        self._segment_name = None
+        self._segment_start = 0  # Stream position where the current segment began
+        self._position = 0  # Stream position of the next sample to encode
+        self._sample_rate = None
+        self._markers = []
+        self._segments = 0
+        self._index = open(os.path.join(directory, INDEX_FILENAME), "a", encoding="utf-8")
+        # Metrics
+        self.recorded_seconds = 0.0
+        self.dropped_seconds = 0.0
+
+        self._encoder_thread = threading.Thread(target=self._encode_loop, name="stream-recorder-encoder")
+        self._encoder_thread.daemon = True
+        self._encoder_thread.start()
+
+    def attach(self, ring):
+        """Record from a new playback ring; the previous one should have been drained."""
+        if self._ring is not None:
+            self._ring.tap = None
+        self._ring = ring
+        self._queue.put(('ring', ring.sample_rate, ring.next_write_position(crossfade=False)))
+        ring.tap = self._tap
+
+    def mark(self, kind, duration, gap_after=0.0):
+        """
+        Add a clip marker at the start of the next clip written to the ring.
+        Call before ring.write(), from the thread that writes to the ring.
+        """
+        position = self._ring.next_write_position()
+        self._queue.put(('mark', position, {'kind': kind, 'duration': round(duration, 3), 'gap_after': gap_after}))
+
+    def _tap(self, samples):
+        """Called by the ring with audio that has become final; must never block."""
+        with self._pending_lock:
+            if self._pending_samples / self._ring.sample_rate > self.max_pending_seconds:
+                # The encoder cannot keep up; keep the timeline but not the audio
+                self._queue.put(('dropout', len(samples)))
+                return
+            self._pending_samples += len(samples)
+        self._queue.put(('audio', samples))
+
+    def _open_segment(self):
+        extension, file_format, subtype = AUDIO_FORMATS[self.audio_format]
+        if self.audio_format == 'opus' and self._sample_rate not in OPUS_SAMPLE_RATES:
+            # Streaming audio is not resampled; fall back to Vorbis in the same container
+            extension, file_format, subtype = AUDIO_FORMATS['ogg']
+        self._segments += 1
+        self._segment_name = f"segment_{self._segments:04d}_{time.strftime('%Y%m%d-%H%M%S')}{extension}"
+        self._file = sf.SoundFile(
+            os.path.join(self.directory, self._segment_name), mode='w',
+            samplerate=self._sample_rate, channels=1, format=file_format, subtype=subtype
+        )
+        self._segment_start = self._position
+        self._write_index({'type': 'segment', 'file': self._segment_name, 'sample_rate': self._sample_rate, 'started': time.time()})
+        logger.info(f"Recording to {self._segment_name}")
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_index(self, entry):
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+    def _emit_markers(self, end):
+        """Index the markers for clips starting before stream position end."""
+        while self._markers and self._markers[0][0] < end:
+            position, info = self._markers.pop(0)
+            offset = max(position - self._segment_start, 0) / self._sample_rate
+            self._write_index({'type': 'clip', 'file': self._segment_name, 'offset': round(offset, 3), **info})
+
+    def _encode(self, samples):
+        """Write samples to the current segment, rotating segments at their boundaries."""
+        offset = 0
+        while offset < len(samples):
+            if self._file is None:
+                self._open_segment()
+            room = int(self.segment_seconds * self._sample_rate) - (self._position - self._segment_start)
+            chunk = min(len(samples) - offset, room)
+            self._file.write(samples[offset:offset + chunk])
+            offset += chunk
+            self._position += chunk
+            self.recorded_seconds += chunk / self._sample_rate
+            self._emit_markers(self._position)
+            if chunk == room:
+                self._close_segment()
+
+    def _encode_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                kind = item[0]
+                if kind == 'ring':
+                    _, sample_rate, position = item
+                    self._emit_markers(float('inf'))
+                    if sample_rate != self._sample_rate:
+                        self._close_segment()
+                        self._sample_rate = sample_rate
+                    # Stream positions restart with each ring
+                    self._segment_start -= self._position - position
+                    self._position = position
+                elif kind == 'mark':
+                    self._markers.append((item[1], item[2]))
+                elif kind == 'dropout':
+                    seconds = item[1] / self._sample_rate
+                    self.dropped_seconds += seconds
+                    logger.warning(f"Stream recording dropped {seconds:.2f}s of audio")
+                    self._write_index({
+                        'type': 'dropout', 'file': self._segment_name,
+                        'offset': round((self._position - self._segment_start) / self._sample_rate, 3),
+                        'seconds': round(seconds, 3)
+                    })
+                    self._encode(np.zeros(item[1], dtype=np.float32))
+                else:
+                    samples = item[1]
+                    with self._pending_lock:
+                        self._pending_samples -= len(samples)
+                    self._encode(samples)
+            except Exception as e:
+                logger.error(f"Error recording stream: {e}", exc_info=True)
+
+    def close(self):
+        """Record what is left in the ring, finish the current file and stop the encoder."""
+        if self._ring is not None:
+            self._ring.flush()
+            self._ring.tap = None
+        self._queue.put(None)
+        self._encoder_thread.join()
+        self._emit_markers(float('inf'))
+        self._close_segment()
+        self._index.close()
+        logger.info(
+            f"Stream recording: {self.recorded_seconds / 60:.1f} min in {self._segments} files, "
+            f"{self.dropped_seconds:.1f}s dropped"
+        )
@@ -0,0 +1,72 @@
+# synthesis_cache.py
+
+import threading
+import logging
+from collections import OrderedDict
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Audio kept for reuse, in samples of float32 (about ten minutes at 22.05 kHz)
+DEFAULT_MAX_SAMPLES = 600 * 22050
+
+def _sentence_key(sentence, speaker):
+    """Sentences that differ only in whitespace sound the same."""
+    return speaker, ' '.join(sentence.split())
+
+class SynthesisCache:
+    """
+    Synthesized audio of individual sentences, shared by every TTS worker of a session.
+    The synthesizer renders each sentence on its own, so a sentence that reappears unchanged in
+    another rewrite of a story (as whole paragraphs often do at low rewriting intensity) can take
+    its earlier audio instead of being synthesized again. The least recently used sentences are
+    evicted once the cache holds more than max_samples samples.
+    """
+
+    def __init__(self, max_samples=DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._entries = OrderedDict()
+        self._samples = 0
+        self._lock = threading.Lock()
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sentence, speaker=None):
+        """The cached audio of a sentence, or None."""
+        key = _sentence_key(sentence, speaker)
+        with self._lock:
+            waveform = self._entries.get(key)
+            if waveform is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return waveform
+
+    def put(self, sentence, waveform, speaker=None):
+        """Keep a sentence's audio; the array must not be modified afterwards."""
+        if len(waveform) > self.max_samples:
+            return
+        key = _sentence_key(sentence, speaker)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._samples -= len(previous)
+            self._entries[key] = waveform
+            self._samples += len(waveform)
+            while self._samples > self.max_samples:
+                _, evicted = self._entries.popitem(last=False)
+                self._samples -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sentences': len(self._entries),
+                'cached_samples': self._samples,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
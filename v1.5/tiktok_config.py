@@ -1,9 +1,37 @@
 # tiktok_config.py
-# Part 1: Emotions and Story Frameworks
+#
+# Content tables for TikTok-style videos: emotions, story frameworks, video structures, hooks,
+# outros and content categories. The tables live in tiktok_config.json so they can be edited
+# without touching code. Loading keeps a pickled copy of the tables and their lookup indexes next
+# to the data file, and a running generator can pick up edits with watch_config() without a restart.
+# Each load is published as one immutable ConfigSnapshot; code that makes several related lookups
+# (everything about one video, say) takes current_config() once and reads from that snapshot.
+import os
+import json
+import pickle
+import hashlib
+import logging
 import random  # Added import
+import threading
+from collections import deque
+from collections.abc import Mapping
+from string import Formatter
+from types import MappingProxyType
 
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# The data file, and its compiled cache (rebuilt whenever the data file changes)
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktok_config.json")
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktok_config.pickle")
+# Bump when the cached layout changes, so old caches are rebuilt
+CACHE_VERSION = 1
+# How often watch_config() checks the data file for edits
+CONFIG_POLL_SECONDS = 2.0
+TABLE_NAMES = ("EMOTIONS", "STORY_FRAMEWORKS", "VIDEO_STRUCTURES", "HOOK_TYPES", "OUTROS", "CONTENT_CATEGORIES")
 
 @dataclass
 class TikTokStyle:
@@ -12,994 +40,481 @@ class TikTokStyle:
     typical_duration: tuple[int, int]  # (min_seconds, max_seconds)
     suitable_emotions: List[str]
 
-# Enhanced emotion system with detailed categorization
-EMOTIONS = {
-    "High Energy": [
-        "Excited",
-        "Enthusiastic",
-        "Passionate",
-        "Energetic",
-        "Hyped",
-        "Amazed",
-        "Thrilled",
-        "Ecstatic",
-        "Fired-up",
-        "Animated",
-        "Dynamic",
-        "Vibrant"
-    ],
-    "Dramatic": [
-        "Shocked",
-        "Surprised",
-        "Dramatic",
-        "Suspenseful",
-        "Mind-blown",
-        "Astonished",
-        "Stunned",
-        "Flabbergasted",
-        "Speechless",
-        "Bewildered",
-        "Intense",
-        "Theatrical"
-    ],
-    "Informative": [
-        "Knowledgeable",
-        "Expert",
-        "Professional",
-        "Educational",
-        "Analytical",
-        "Insightful",
-        "Authoritative",
-        "Instructional",
-        "Methodical",
-        "Technical",
-        "Scientific",
-        "Academic"
-    ],
-    "Relatable": [
-        "Casual",
-        "Friendly",
-        "Humorous",
-        "Sarcastic",
-        "Empathetic",
-        "Down-to-earth",
-        "Authentic",
-        "Genuine",
-        "Approachable",
-        "Understanding",
-        "Sympathetic",
-        "Real"
-    ],
-    "Storytelling": [
-        "Mysterious",
-        "Intriguing",
-        "Narrative",
-        "Descriptive",
-        "Engaging",
-        "Captivating",
-        "Suspenseful",
-        "Dramatic",
-        "Compelling",
-        "Enchanting",
-        "Immersive",
-        "Gripping"
-    ],
-    "Inspirational": [
-        "Motivating",
-        "Uplifting",
-        "Encouraging",
-        "Empowering",
-        "Inspiring",
-        "Hopeful",
-        "Positive",
-        "Optimistic",
-        "Transformative",
-        "Life-changing",
-        "Influential",
-        "Moving"
-    ],
-    "Humorous": [
-        "Funny",
-        "Comedic",
-        "Witty",
-        "Playful",
-        "Light-hearted",
-        "Silly",
-        "Goofy",
-        "Entertaining",
-        "Amusing",
-        "Whimsical",
-        "Satirical",
-        "Ironic"
-    ],
-    "Contemplative": [
-        "Thoughtful",
-        "Reflective",
-        "Philosophical",
-        "Deep",
-        "Introspective",
-        "Mindful",
-        "Perspective",
-        "Analytical",
-        "Questioning",
-        "Pondering",
-        "Meditative",
-        "Intellectual"
-    ],
-    "Controversial": [
-        "Provocative",
-        "Challenging",
-        "Debatable",
-        "Thought-provoking",
-        "Critical",
-        "Questioning",
-        "Skeptical",
-        "Analytical",
-        "Investigative",
-        "Exposing",
-        "Revolutionary",
-        "Ground-breaking"
-    ],
-    "Trendy": [
-        "Current",
-        "Popular",
-        "Viral",
-        "Hip",
-        "Modern",
-        "Fresh",
-        "Cool",
-        "Contemporary",
-        "Cutting-edge",
-        "In-vogue",
-        "Fashionable",
-        "Trending"
-    ]
-}
+# Placeholders the viral prompt always has values for when it shows a hook example
+HOOK_PLACEHOLDERS = frozenset({"topic", "number", "total", "amount", "percentage"})
 
-# Expanded Story Frameworks
-STORY_FRAMEWORKS = {
-    "Problem-Solution": {
-        "structure": [
-            "Hook: {pain_point_hook}",
-            "Problem Identification: {relatable_problem}",
-            "Impact Description: {why_it_matters}",
-            "Solution Teaser: Here's what changed everything...",
-            "Solution Steps: {detailed_steps}",
-            "Results Preview: {benefits}",
-            "Proof/Demonstration: {evidence}",
-            "Conclusion: {transformation}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (30, 60),
-        "best_emotions": ["Informative", "Relatable", "Inspirational"]
-    },
-    "Before-After": {
-        "structure": [
-            "Hook: {transformation_hook}",
-            "Before State: {pain_points}",
-            "Turning Point: {catalyst}",
-            "Process Overview: {what_changed}",
-            "Key Steps: {major_changes}",
-            "After State: {results}",
-            "Validation: {proof}",
-            "Inspiration: {motivation}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (20, 45),
-        "best_emotions": ["Dramatic", "Inspirational", "High Energy"]
-    },
-    "Day-In-Life": {
-        "structure": [
-            "Hook: {lifestyle_hook}",
-            "Morning Routine: {morning}",
-            "Main Activities: {daily_highlights}",
-            "Challenges: {obstacles}",
-            "Solutions: {how_handled}",
-            "Tips & Tricks: {life_hacks}",
-            "Results: {achievements}",
-            "Reflection: {lessons}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (45, 120),
-        "best_emotions": ["Relatable", "Trendy", "Inspirational"]
-    },
-    "Tutorial": {
-        "structure": [
-            "Hook: {value_hook}",
-            "Overview: {what_learning}",
-            "Materials/Requirements: {needed_items}",
-            "Step-by-Step: {detailed_steps}",
-            "Tips: {pro_tips}",
-            "Common Mistakes: {warnings}",
-            "Final Result: {outcome}",
-            "Variations: {alternatives}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (45, 120),
-        "best_emotions": ["Informative", "Educational", "Friendly"]
-    },
-    "Behind-the-Scenes": {
-        "structure": [
-            "Hook: {curiosity_hook}",
-            "Context: {background}",
-            "Setup Reveal: {preparation}",
-            "Process Insights: {inside_look}",
-            "Challenges: {difficulties}",
-            "Solutions: {overcame}",
-            "Final Product: {result}",
-            "Tips & Secrets: {insider_tips}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (30, 90),
-        "best_emotions": ["Authentic", "Engaging", "Mysterious"]
-    },
-    "Myth-Busting": {
-        "structure": [
-            "Hook: {myth_hook}",
-            "Common Belief: {misconception}",
-            "Why It's Wrong: {truth}",
-            "Evidence: {proof}",
-            "Real Explanation: {facts}",
-            "Examples: {demonstrations}",
-            "Tips: {correct_approach}",
-            "Summary: {key_takeaways}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (30, 60),
-        "best_emotions": ["Dramatic", "Informative", "Surprising"]
-    },
-    "Story Time": {
-        "structure": [
-            "Hook: {dramatic_hook}",
-            "Setup: {context}",
-            "Build-up: {rising_action}",
-            "Conflict: {challenge}",
-            "Climax: {peak_moment}",
-            "Resolution: {outcome}",
-            "Lesson: {moral}",
-            "Reflection: {thoughts}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (45, 90),
-        "best_emotions": ["Storytelling", "Dramatic", "Engaging"]
-    },
-    "Product Review": {
-        "structure": [
-            "Hook: {review_hook}",
-            "Product Intro: {what_testing}",
-            "First Impressions: {initial_thoughts}",
-            "Testing Process: {how_tested}",
-            "Pros: {benefits}",
-            "Cons: {drawbacks}",
-            "Comparisons: {alternatives}",
-            "Verdict: {final_thoughts}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (30, 60),
-        "best_emotions": ["Honest", "Analytical", "Informative"]
-    },
-    "Reaction": {
-        "structure": [
-            "Hook: {reaction_hook}",
-            "Context: {what_reacting_to}",
-            "Initial Response: {first_impression}",
-            "Deep Dive: {detailed_thoughts}",
-            "Highlights: {best_moments}",
-            "Critiques: {concerns}",
-            "Analysis: {breakdown}",
-            "Final Thoughts: {conclusion}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (20, 45),
-        "best_emotions": ["Dramatic", "Authentic", "Engaging"]
-    },
-    "Challenge": {
-        "structure": [
-            "Hook: {challenge_hook}",
-            "Challenge Intro: {what_attempting}",
-            "Preparation: {setup}",
-            "Attempt: {execution}",
-            "Struggles: {difficulties}",
-            "Breakthroughs: {successes}",
-            "Results: {outcome}",
-            "Tips: {advice}",
-            "Call to Action: {outro}"
-        ],
-        "typical_duration": (30, 60),
-        "best_emotions": ["High Energy", "Entertaining", "Dramatic"]
-    }
-}
+def template_fields(template: str) -> frozenset:
+    """Names of the placeholders a template needs to be formatted."""
+    return frozenset(name for _, name, _, _ in Formatter().parse(template) if name is not None)
+
+def _group_by_fields(templates: List[str]) -> Dict[frozenset, tuple]:
+    groups = {}
+    for template in templates:
+        groups.setdefault(template_fields(template), []).append(template)
+    return {fields: tuple(group) for fields, group in groups.items()}
 
-# Video Structures with detailed timing and components
-VIDEO_STRUCTURES = {
-    "Hook-Content-CTA": {
-        "structure": [
-            "Pattern Interrupt (2-3s): {attention_grab}",
-            "Hook Statement (3-5s): {hook}",
-            "Value Promise (3-5s): {what_they_get}",
-            "Main Content (15-35s): {content}",
-            "Key Takeaway (5-7s): {summary}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (30, 50),
-        "best_for": ["Tips", "Hacks", "Quick Tutorials"]
-    },
-    "Question-Answer": {
-        "structure": [
-            "Question Hook (3-5s): {question}",
-            "Intrigue Builder (3-5s): 'The answer might surprise you...'",
-            "Context Setup (5-8s): {background}",
-            "Answer Reveal (10-15s): {answer}",
-            "Explanation (10-20s): {explanation}",
-            "Proof/Examples (8-12s): {evidence}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (40, 70),
-        "best_for": ["Educational", "Myth Busting", "Facts"]
-    },
-    "Trend Adaptation": {
-        "structure": [
-            "Trend Reference (3-5s): {trend_intro}",
-            "Your Twist (5-7s): {unique_angle}",
-            "Setup (5-8s): {preparation}",
-            "Execution (15-25s): {content}",
-            "Reaction (5-8s): {response}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (35, 60),
-        "best_for": ["Challenges", "Dance", "Music"]
-    },
-    "Educational-Steps": {
-        "structure": [
-            "Knowledge Hook (3-5s): {hook}",
-            "Problem Statement (5-7s): {issue}",
-            "Step 1 (8-10s): {first_step}",
-            "Step 2 (8-10s): {second_step}",
-            "Step 3 (8-10s): {third_step}",
-            "Result Demo (5-8s): {outcome}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (40, 55),
-        "best_for": ["Tutorials", "DIY", "How-To"]
-    },
-    "Storytime": {
-        "structure": [
-            "Hook Phrase (3-5s): {hook}",
-            "Setting Scene (5-8s): {context}",
-            "Build Up (10-15s): {development}",
-            "Plot Twist (5-8s): {twist}",
-            "Resolution (10-15s): {ending}",
-            "Lesson/Moral (5-7s): {takeaway}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (45, 60),
-        "best_for": ["Personal Stories", "Experiences", "Lessons"]
-    },
-    "Review-Style": {
-        "structure": [
-            "Product Intro (3-5s): {item}",
-            "First Impression (5-7s): {initial_thoughts}",
-            "Key Features (10-15s): {features}",
-            "Testing (10-15s): {testing}",
-            "Pros/Cons (8-10s): {evaluation}",
-            "Verdict (5-7s): {conclusion}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (45, 65),
-        "best_for": ["Product Reviews", "Comparisons", "Recommendations"]
-    },
-    "Transformation": {
-        "structure": [
-            "Before Shot (3-5s): {before}",
-            "Pain Points (5-7s): {problems}",
-            "Process Highlights (15-20s): {process}",
-            "Challenges (5-8s): {difficulties}",
-            "After Reveal (5-8s): {after}",
-            "Tips (5-7s): {advice}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (40, 60),
-        "best_for": ["Makeovers", "Before/After", "Progress"]
-    },
-    "Comedy-Sketch": {
-        "structure": [
-            "Setup (3-5s): {situation}",
-            "Character Intro (3-5s): {character}",
-            "Build-Up (10-15s): {development}",
-            "Punchline (5-7s): {joke}",
-            "Reaction (5-7s): {response}",
-            "Tag (3-5s): {additional_joke}",
-            "Call to Action (3-5s): {outro}"
-        ],
-        "typical_duration": (30, 50),
-        "best_for": ["Comedy", "Skits", "Parody"]
+def build_indexes(tables: Dict[str, dict]) -> Dict[str, object]:
+    """The lookup indexes of a set of tables, as plain picklable containers."""
+    outros = tables["OUTROS"]["Template"]
+    hook_groups = {
+        hook_type: _group_by_fields(details["templates"])
+        for hook_type, details in tables["HOOK_TYPES"].items()
     }
-}
+    outros_by_category = {
+        category: tuple(
+            template
+            for templates in (section.values() if isinstance(section, dict) else [section])
+            for template in templates
+        )
+        for category, section in outros.items()
+    }
+    emotion_list = tuple(dict.fromkeys(e for ems in tables["EMOTIONS"].values() for e in ems))
+    return {
+        # Every (category, subcategory, topic)
+        "TOPICS": tuple(
+            (cat, subcat, topic)
+            for cat, subcats in tables["CONTENT_CATEGORIES"].items()
+            for subcat, topics in subcats.items()
+            for topic in topics
+        ),
+        # Every emotion once, in config order; an emotion listed under several categories maps to its first
+        "EMOTION_LIST": emotion_list,
+        "EMOTION_SET": frozenset(emotion_list),
+        "EMOTION_TO_CATEGORY": {
+            emotion: category
+            for category, emotions in reversed(list(tables["EMOTIONS"].items()))
+            for emotion in emotions
+        },
+        # hook type -> {placeholder set: templates needing exactly those placeholders}
+        "HOOK_TEMPLATES_BY_FIELDS": hook_groups,
+        # hook type -> templates that HOOK_PLACEHOLDERS can fill
+        "FORMATTABLE_HOOK_TEMPLATES": {
+            hook_type: tuple(
+                template
+                for fields, templates in groups.items() if fields <= HOOK_PLACEHOLDERS
+                for template in templates
+            )
+            for hook_type, groups in hook_groups.items()
+        },
+        # Outro templates flattened per category, per (category, subcategory) and overall
+        "OUTROS_BY_CATEGORY": outros_by_category,
+        "OUTROS_BY_SUBCATEGORY": {
+            (category, subcategory): tuple(templates)
+            for category, section in outros.items() if isinstance(section, dict)
+            for subcategory, templates in section.items()
+        },
+        "ALL_OUTROS": tuple(template for templates in outros_by_category.values() for template in templates)
+    }
+
+def _read_tables(data: bytes) -> Dict[str, dict]:
+    tables = json.loads(data.decode('utf-8'))
+    missing = [name for name in TABLE_NAMES if name not in tables]
+    if missing:
+        raise ValueError(f"missing tables: {', '.join(missing)}")
+    # JSON has no tuples
+    for name in ("STORY_FRAMEWORKS", "VIDEO_STRUCTURES"):
+        for details in tables[name].values():
+            if "typical_duration" in details:
+                details["typical_duration"] = tuple(details["typical_duration"])
+    return tables
+
+def load_config(data_path: str = DATA_PATH, cache_path: str = CACHE_PATH):
+    """
+    The tables and indexes of a data file, with the file's (size, mtime_ns) stamp. They come from
+    the cache when it was built from the same file, going by the stamp and, if only that differs,
+    by a hash of the content; otherwise the file is parsed and the cache rewritten.
+    """
+    stat = os.stat(data_path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = None
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('version') != CACHE_VERSION:
+            cached = None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        cached = None
+    if cached is not None and tuple(cached['stamp']) == stamp:
+        return stamp, cached['tables'], cached['indexes']
+
+    with open(data_path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if cached is not None and cached['sha256'] == digest:
+        tables, indexes = cached['tables'], cached['indexes']
+    else:
+        tables = _read_tables(data)
+        indexes = build_indexes(tables)
+    _save_cache(cache_path, {
+        'version': CACHE_VERSION, 'stamp': stamp, 'sha256': digest, 'tables': tables, 'indexes': indexes
+    })
+    return stamp, tables, indexes
+
+def _save_cache(cache_path, cached):
+    """Replace the cache atomically; a failed write only costs a parse on the next load."""
+    try:
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not save the TikTok config cache {cache_path}: {e}")
 
-# Expanded Hook Types with more variants and use cases
-HOOK_TYPES = {
-    "Question": {
-        "description": "Opens with an engaging question to create curiosity",
-        "templates": [
-            "Want to know how {topic}?",
-            "Did you know this about {topic}?",
-            "Ever wondered why {topic}?",
-            "What if I told you about {topic}?",
-            "Ready to discover the truth about {topic}?",
-            "Curious about {topic}?",
-            "Have you been doing {topic} wrong?",
-            "Can you guess what happens when {topic}?",
-            "Why do most people fail at {topic}?",
-            "Is this the best way to {topic}?",
-            "What's the real secret to {topic}?",
-            "How did I master {topic}?",
-            "Want to level up your {topic}?",
-            "Are you making these {topic} mistakes?",
-            "Did you know this {topic} hack exists?"
-        ],
-        "best_for": ["Educational", "Tutorial", "Myth-Busting", "Tips"],
-        "emotional_tone": ["Curious", "Intriguing", "Thought-provoking"]
-    },
-    "Statement": {
-        "description": "Strong, authoritative opening statement",
-        "templates": [
-            "This {topic} hack changed everything...",
-            "Nobody talks about this {topic} secret...",
-            "Here's what they don't tell you about {topic}...",
-            "The truth about {topic} that shocked me...",
-            "I discovered something crazy about {topic}...",
-            "This {topic} technique is a game-changer...",
-            "Let me show you the real way to {topic}...",
-            "I've been doing {topic} wrong for years...",
-            "This is how pros do {topic}...",
-            "The industry secrets about {topic}...",
-            "I found a better way to {topic}...",
-            "The hidden truth about {topic}...",
-            "What experts won't tell you about {topic}...",
-            "The fastest way to master {topic}...",
-            "This changes everything about {topic}..."
-        ],
-        "best_for": ["Story Time", "Behind-the-Scenes", "Tutorials"],
-        "emotional_tone": ["Confident", "Authoritative", "Revealing"]
-    },
-    "Shocking": {
-        "description": "Surprising or unexpected opening to grab attention",
-        "templates": [
-            "I can't believe this {topic} fact...",
-            "This {topic} revelation shocked me...",
-            "Everything you know about {topic} is wrong...",
-            "The {topic} industry doesn't want you to know...",
-            "You won't believe what I found about {topic}...",
-            "This {topic} secret will blow your mind...",
-            "The shocking truth about {topic}...",
-            "Warning: This {topic} fact will surprise you...",
-            "I was shocked when I learned this about {topic}...",
-            "This {topic} discovery changed everything...",
-            "The scary truth about {topic}...",
-            "They've been lying about {topic}...",
-            "What they're hiding about {topic}...",
-            "The dark side of {topic}...",
-            "This {topic} secret is mindblowing..."
-        ],
-        "best_for": ["Reaction", "Myth-Busting", "Revelations"],
-        "emotional_tone": ["Dramatic", "Surprising", "Intense"]
-    },
-    "Action": {
-        "description": "Immediate call to action or command",
-        "templates": [
-            "Stop scrolling! This {topic} tip is important...",
-            "You need to try this {topic} hack right now...",
-            "Watch this before you {topic} again...",
-            "Don't make another {topic} mistake...",
-            "Drop everything and watch this {topic} hack...",
-            "This {topic} trick will change your life...",
-            "Run, don't walk, to try this {topic} technique...",
-            "You're missing out on this {topic} secret...",
-            "Listen up! This {topic} hack is golden...",
-            "Grab your phone and try this {topic} trick...",
-            "Don't scroll past this {topic} tip...",
-            "Save this {topic} hack now...",
-            "You'll regret missing this {topic} secret...",
-            "Quick! Try this {topic} technique before others...",
-            "Start doing this {topic} hack today..."
-        ],
-        "best_for": ["Tutorial", "Tips", "Life Hacks"],
-        "emotional_tone": ["Urgent", "Commanding", "Energetic"]
-    },
-    "Statistics": {
-        "description": "Opens with a compelling number or statistic",
-        "templates": [
-            "Only {number}% of people know this {topic} trick...",
-            "{number} out of {total} fail at {topic}...",
-            "I made ${amount} using this {topic} method...",
-            "This {topic} hack saves me {number} hours...",
-            "{number} people tried this {topic} test...",
-            "I tested {number} {topic} methods...",
-            "After {number} years of {topic}...",
-            "{percentage}% improvement in {topic}...",
-            "Tried {number} {topic} hacks, this one worked...",
-            "Save {amount} on {topic} with this trick...",
-            "{number} experts agree on this {topic} fact...",
-            "This {topic} hack is used by top {percentage}%...",
-            "Increased my {topic} by {number}x...",
-            "Lost {number} hours to {topic} until...",
-            "Tested for {number} days: here's what happened..."
-        ],
-        "best_for": ["Data-Driven", "Results", "Case Studies"],
-        "emotional_tone": ["Factual", "Impressive", "Credible"]
-    },
-    "Story": {
-        "description": "Opens with a personal narrative hook",
-        "templates": [
-            "Last week, I discovered something about {topic}...",
-            "My {topic} journey started when...",
-            "Here's how {topic} changed my life...",
-            "The day I learned the truth about {topic}...",
-            "My biggest {topic} mistake taught me...",
-            "After failing at {topic} 100 times...",
-            "What my mom never told me about {topic}...",
-            "The {topic} secret I learned the hard way...",
-            "My embarrassing {topic} story...",
-            "How I went from {topic} newbie to pro...",
-            "The moment that changed my {topic} forever...",
-            "My {topic} transformation started here...",
-            "The {topic} trick I wish I knew sooner...",
-            "My first attempt at {topic} was a disaster...",
-            "The day I mastered {topic}..."
-        ],
-        "best_for": ["Personal Stories", "Transformations", "Lessons"],
-        "emotional_tone": ["Personal", "Authentic", "Relatable"]
-    },
-    "Controversial": {
-        "description": "Opens with a debatable or provocative statement",
-        "templates": [
-            "Unpopular opinion about {topic}...",
-            "Why everyone is wrong about {topic}...",
-            "The {topic} debate ends here...",
-            "Stop believing these {topic} lies...",
-            "The controversial truth about {topic}...",
-            "Why I disagree with {topic} experts...",
-            "The {topic} myth you need to stop believing...",
-            "Here's why {topic} advice is wrong...",
-            "The real reason {topic} isn't working...",
-            "What no one admits about {topic}...",
-            "The {topic} conspiracy exposed...",
-            "Why {topic} gurus are misleading you...",
-            "The uncomfortable truth about {topic}...",
-            "Time to debunk this {topic} myth...",
-            "Why I'm calling out {topic} fake experts..."
-        ],
-        "best_for": ["Debates", "Myth-Busting", "Hot Takes"],
-        "emotional_tone": ["Provocative", "Critical", "Bold"]
-    },
-    "FOMO": {
-        "description": "Creates fear of missing out",
-        "templates": [
-            "If you're not doing this {topic} hack...",
-            "Don't miss out on this {topic} secret...",
-            "The {topic} trend that's about to explode...",
-            "Why everyone is trying this {topic} method...",
-            "The {topic} hack going viral right now...",
-            "This {topic} secret won't last long...",
-            "The {topic} opportunity you're missing...",
-            "Why you need to start {topic} today...",
-            "Don't wait to try this {topic} trick...",
-            "The {topic} wave you need to catch...",
-            "This {topic} hack is blowing up...",
-            "Get on this {topic} trend before it's gone...",
-            "The {topic} secret everyone's talking about...",
-            "You're losing money not knowing this {topic} hack...",
-            "Missing out on {topic} benefits? Here's why..."
-        ],
-        "best_for": ["Trends", "Opportunities", "Time-Sensitive"],
-        "emotional_tone": ["Urgent", "Exciting", "Compelling"]
-    },
-    "Problem-Agitate": {
-        "description": "Highlights a problem then offers solution",
-        "templates": [
-            "Tired of struggling with {topic}?",
-            "Frustrated with your {topic} results?",
-            "Can't seem to master {topic}?",
-            "Is {topic} giving you headaches?",
-            "Fed up with {topic} failures?",
-            "Done with {topic} disappointments?",
-            "Still can't figure out {topic}?",
-            "Is {topic} holding you back?",
-            "Struggling to understand {topic}?",
-            "Wasting time on {topic}?",
-            "Not seeing {topic} progress?",
-            "Is {topic} stressing you out?",
-            "Overwhelmed by {topic}?",
-            "Need help with {topic}?",
-            "Ready to fix your {topic} problems?"
-        ],
-        "best_for": ["Solutions", "Problem-Solving", "Help Videos"],
-        "emotional_tone": ["Empathetic", "Understanding", "Helpful"]
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    One load of the tables and their lookup indexes, read-only. A reload never changes a snapshot;
+    it publishes a new one, so everything read from one snapshot belongs to the same config.
+    """
+    stamp: tuple  # (size, mtime_ns) of the data file it was loaded from
+    EMOTIONS: Mapping
+    STORY_FRAMEWORKS: Mapping
+    VIDEO_STRUCTURES: Mapping
+    HOOK_TYPES: Mapping
+    OUTROS: Mapping
+    CONTENT_CATEGORIES: Mapping
+    TOPICS: tuple
+    EMOTION_LIST: tuple
+    EMOTION_SET: frozenset
+    EMOTION_TO_CATEGORY: Mapping
+    HOOK_TEMPLATES_BY_FIELDS: Mapping
+    FORMATTABLE_HOOK_TEMPLATES: Mapping
+    OUTROS_BY_CATEGORY: Mapping
+    OUTROS_BY_SUBCATEGORY: Mapping
+    ALL_OUTROS: tuple
+
+    def outro_templates(self, category: str, subcategory: Optional[str] = None) -> tuple:
+        """The outro templates of a category, or of one of its subcategories"""
+        if subcategory:
+            return self.OUTROS_BY_SUBCATEGORY[(category, subcategory)]
+        return self.OUTROS_BY_CATEGORY[category]
+
+    def framework_emotions(self, framework: str) -> tuple:
+        """Emotions suited to a story framework: its best_emotions with category names expanded, known emotions only"""
+        suited = []
+        for name in self.STORY_FRAMEWORKS[framework].get("best_emotions", []):
+            suited.extend(self.EMOTIONS.get(name, [name]))
+        return tuple(emotion for emotion in dict.fromkeys(suited) if emotion in self.EMOTION_SET)
+
+def _make_snapshot(stamp, tables: Dict[str, dict], indexes: Dict[str, object]) -> ConfigSnapshot:
+    indexes = dict(indexes)
+    indexes["HOOK_TEMPLATES_BY_FIELDS"] = {
+        hook_type: MappingProxyType(groups) for hook_type, groups in indexes["HOOK_TEMPLATES_BY_FIELDS"].items()
     }
+    return ConfigSnapshot(
+        stamp=stamp,
+        **{name: MappingProxyType(tables[name]) for name in TABLE_NAMES},
+        **{name: MappingProxyType(value) if isinstance(value, dict) else value for name, value in indexes.items()}
+    )
+
+# The current snapshot, replaced by a single assignment on reload
+_snapshot = None
+_reload_lock = threading.Lock()
+# The shared combination sampler (see get_sampler), rebuilt for each new snapshot
+_sampler = None
+_sampler_lock = threading.Lock()
+
+def current_config() -> ConfigSnapshot:
+    """The config as last loaded. Take it once for lookups that must agree with each other."""
+    return _snapshot
+
+class _CurrentView(Mapping):
+    """Read-only view of one table or index of whichever snapshot is current at each access."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getitem__(self, key):
+        return getattr(_snapshot, self._name)[key]
+
+    def __iter__(self):
+        return iter(getattr(_snapshot, self._name))
+
+    def __len__(self):
+        return len(getattr(_snapshot, self._name))
+
+    def __repr__(self):
+        return f"<current tiktok_config.{self._name}>"
+
+# Module-level views of the current tables and mapping indexes. Each access sees one snapshot, but
+# two accesses may see different ones; code that must stay consistent uses current_config().
+EMOTIONS = _CurrentView("EMOTIONS")
+STORY_FRAMEWORKS = _CurrentView("STORY_FRAMEWORKS")
+VIDEO_STRUCTURES = _CurrentView("VIDEO_STRUCTURES")
+HOOK_TYPES = _CurrentView("HOOK_TYPES")
+OUTROS = _CurrentView("OUTROS")
+CONTENT_CATEGORIES = _CurrentView("CONTENT_CATEGORIES")
+EMOTION_TO_CATEGORY = _CurrentView("EMOTION_TO_CATEGORY")
+HOOK_TEMPLATES_BY_FIELDS = _CurrentView("HOOK_TEMPLATES_BY_FIELDS")
+FORMATTABLE_HOOK_TEMPLATES = _CurrentView("FORMATTABLE_HOOK_TEMPLATES")
+OUTROS_BY_CATEGORY = _CurrentView("OUTROS_BY_CATEGORY")
+OUTROS_BY_SUBCATEGORY = _CurrentView("OUTROS_BY_SUBCATEGORY")
+
+def reload_config(force: bool = False) -> bool:
+    """Load the data file if it changed since the last load; True if a new snapshot was published."""
+    global _snapshot
+    with _reload_lock:
+        if not force and _snapshot is not None:
+            stat = os.stat(DATA_PATH)
+            if (stat.st_size, stat.st_mtime_ns) == _snapshot.stamp:
+                return False
+        stamp, tables, indexes = load_config()
+        # Readers see the previous snapshot or this one, never a mix of the two
+        _snapshot = _make_snapshot(stamp, tables, indexes)
+        return True
+
+def watch_config(stop_event, interval: float = CONFIG_POLL_SECONDS) -> threading.Thread:
+    """
+    Reload the tables whenever the data file changes, until stop_event is set. An edit that does
+    not load is logged once and the current tables are kept until the file changes again.
+    """
+    def watch():
+        failed_stamp = None
+        while not stop_event.wait(interval):
+            try:
+                stat = os.stat(DATA_PATH)
+            except OSError:
+                # Editors may replace the file by deleting and recreating it
+                continue
+            stamp = (stat.st_size, stat.st_mtime_ns)
+            if stamp == failed_stamp:
+                continue
+            try:
+                if reload_config():
+                    logger.info(f"Reloaded the TikTok config from {DATA_PATH}")
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                failed_stamp = stamp
+                logger.warning(f"Keeping the current TikTok config, {DATA_PATH} could not be loaded: {e}")
+
+    thread = threading.Thread(target=watch, name="tiktok-config-watcher", daemon=True)
+    thread.start()
+    return thread
+
+def outro_templates(category: str, subcategory: Optional[str] = None) -> tuple:
+    """The outro templates of a category, or of one of its subcategories, in the current config"""
+    return current_config().outro_templates(category, subcategory)
+
+def framework_emotions(framework: str) -> tuple:
+    """Emotions suited to a story framework in the current config (see ConfigSnapshot.framework_emotions)"""
+    return current_config().framework_emotions(framework)
+
+# Weight of a hook, emotion or structure that suits the rest of the combination, against 1.0
+AFFINITY_WEIGHT = 3.0
+# How many recent draws of each axis a new draw avoids repeating
+NO_REPEAT_WINDOWS = {
+    "topic": 40,
+    "hook_type": 3,
+    "emotion": 12,
+    "story_framework": 3,
+    "video_structure": 3
 }
+# Redraws before a draw that falls inside the window is accepted anyway
+MAX_REDRAWS = 8
 
-# Part 3A: Enhanced Outro System
-
-OUTROS = {
-    "Template": {
-        "Call to Action": [
-            # Basic CTAs
-            "Follow for more {topic} content!",
-            "Hit + for part 2!",
-            "Drop a 💡 if you learned something new!",
-            "Save this for later!",
-            "Don't forget to follow for daily {topic} tips!",
-            "Share this with someone who needs it!",
-            "Double tap if you found this helpful!",
-            "Turn on notifications to never miss a {topic} tip!",
-            
-            # Social Proof CTAs
-            "Join {number}k others learning about {topic}!",
-            "This helped over {number}k people with {topic}!",
-            "The {topic} community loves this trick!",
-            "Don't just take my word - read the comments!",
-            "We're {number}k strong in the {topic} journey!",
-            
-            # FOMO-Based
-            "Don't miss tomorrow's {topic} secret!",
-            "More {topic} hacks coming this week!",
-            "Limited time {topic} tips in my next video!",
-            "Exclusive {topic} content dropping soon!",
-            "Secret {topic} method revealed tomorrow!",
-            
-            # Value-Based
-            "More life-changing {topic} hacks on my profile!",
-            "Click my bio for free {topic} resources!",
-            "Full {topic} guide in my latest post!",
-            "Get my complete {topic} checklist - link in bio!",
-            "Unlock more {topic} secrets on my page!"
-        ],
-        "Engagement": {
-            "Questions": [
-                "Comment your thoughts below!",
-                "What's your experience with {topic}?",
-                "Drop your {topic} questions below!",
-                "What should I cover next about {topic}?",
-                "Scale of 1-10, how helpful was this {topic} tip?",
-                "Tag someone who needs these {topic} tips!",
-                "What's your biggest {topic} challenge?",
-                "Share your best {topic} hack in the comments!",
-                "Which {topic} tip surprised you most?",
-                "Need help with specific {topic} problems? Ask below!"
-            ],
-            "Challenges": [
-                "Try this {topic} hack and show me your results!",
-                "Duet this video with your {topic} attempt!",
-                "Show me your {topic} transformation!",
-                "Take the {topic} challenge - tag me in your try!",
-                "Use this sound for your {topic} video!",
-                "Stitch with your {topic} story!",
-                "React to this {topic} hack!",
-                "Start your {topic} journey today - show me day 1!",
-                "Join the {topic} revolution - post your version!",
-                "Make this {topic} hack go viral!"
-            ],
-            "Community Building": [
-                "Welcome to the {topic} family!",
-                "Join our {topic} community!",
-                "Let's master {topic} together!",
-                "Support each other's {topic} journey below!",
-                "Share your {topic} wins in the comments!",
-                "Drop a ❤️ if you're part of the {topic} gang!",
-                "Tag your {topic} accountability partner!",
-                "Build your {topic} network - connect below!",
-                "Share this with your {topic} study group!",
-                "Let's grow our {topic} skills together!"
-            ]
-        },
-        "Series Continuation": {
-            "Part Announcements": [
-                "Part {number} drops tomorrow!",
-                "More {topic} secrets in part {number}!",
-                "Like for part {number}!",
-                "Next part at {number}k likes!",
-                "Comment '📝' for part {number}!"
-            ],
-            "Series Hooks": [
-                "This {topic} series will change your life...",
-                "The {topic} journey continues...",
-                "Your {topic} transformation starts here...",
-                "Level up your {topic} game with this series...",
-                "Master {topic} with this tutorial series..."
-            ]
+class AliasTable:
+    """Walker's alias method: O(n) setup, then O(1) weighted draws of an index."""
+
+    def __init__(self, weights: List[float]):
+        count = len(weights)
+        total = float(sum(weights))
+        scaled = [w * count / total for w in weights]
+        self.prob = [1.0] * count
+        self.alias = list(range(count))
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng: random.Random) -> int:
+        column = rng.randrange(len(self.prob))
+        return column if rng.random() < self.prob[column] else self.alias[column]
+
+class _RecentWindow:
+    """The last size draws of one axis, with O(1) membership."""
+
+    def __init__(self, size: int):
+        self.recent = deque()
+        self.counts = {}
+        self.size = size
+
+    def __contains__(self, value):
+        return value in self.counts
+
+    def add(self, value):
+        if self.size <= 0:
+            return
+        self.recent.append(value)
+        self.counts[value] = self.counts.get(value, 0) + 1
+        if len(self.recent) > self.size:
+            oldest = self.recent.popleft()
+            self.counts[oldest] -= 1
+            if not self.counts[oldest]:
+                del self.counts[oldest]
+
+def _words(name: str) -> set:
+    """Lower-case words of a name, for matching best_for entries against categories and topics."""
+    return set(name.lower().replace('&', ' ').replace('/', ' ').replace('-', ' ').split()) - {'and', 'the'}
+
+class ComboSampler:
+    """
+    Draws (topic, hook, emotion, framework, structure) combinations one at a time. Every table is
+    built once, so a draw costs O(1) instead of flattening the config: topics are balanced across
+    categories and subcategories, emotions and hooks favour the framework's best_emotions and
+    best_for, and structures favour the ones whose best_for names the topic's category.
+    Each axis avoids repeating its last few draws (NO_REPEAT_WINDOWS) within the sampler.
+    """
+
+    def __init__(self, seed: Optional[int] = None, windows: Optional[Dict[str, int]] = None,
+                 config: Optional[ConfigSnapshot] = None):
+        self.rng = random.Random(seed)
+        # The snapshot this sampler draws from, even if the config is reloaded meanwhile
+        self.config = config = config or current_config()
+        self.topics = config.TOPICS
+        self._lock = threading.Lock()
+        windows = {**NO_REPEAT_WINDOWS, **(windows or {})}
+
+        # Topics: one table over everything, one per category and a slice per subcategory
+        self._topic_tables = {None: (0, AliasTable(self._balanced_weights(self.topics)))}
+        self._subcategory_slices = {}
+        start = 0
+        for cat, subcats in config.CONTENT_CATEGORIES.items():
+            first = start
+            for subcat, topics in subcats.items():
+                self._subcategory_slices[(cat, subcat)] = (start, start + len(topics))
+                start += len(topics)
+            self._topic_tables[cat] = (first, AliasTable(self._balanced_weights(self.topics[first:start])))
+
+        self.frameworks = list(config.STORY_FRAMEWORKS)
+        self.hooks = list(config.HOOK_TYPES)
+        self.emotions = list(config.EMOTION_LIST)
+        self.structures = list(config.VIDEO_STRUCTURES)
+        self._framework_table = AliasTable([1.0] * len(self.frameworks))
+
+        # Emotions and hooks per framework
+        self._emotion_tables = {}
+        self._hook_tables = {}
+        for framework, details in config.STORY_FRAMEWORKS.items():
+            suited = set()
+            for name in details.get("best_emotions", []):
+                suited.update(config.EMOTIONS.get(name, [name]))
+            self._emotion_tables[framework] = AliasTable(
+                [AFFINITY_WEIGHT if e in suited else 1.0 for e in self.emotions]
+            )
+            framework_words = _words(framework)
+            self._hook_tables[framework] = AliasTable([
+                AFFINITY_WEIGHT
+                if any(_words(b) == framework_words for b in config.HOOK_TYPES[h].get("best_for", []))
+                or suited & set(config.HOOK_TYPES[h].get("emotional_tone", []))
+                else 1.0
+                for h in self.hooks
+            ])
+
+        # Structures per subcategory
+        self._structure_tables = {}
+        for cat, subcat in self._subcategory_slices:
+            names = _words(cat) | _words(subcat)
+            self._structure_tables[(cat, subcat)] = AliasTable([
+                AFFINITY_WEIGHT
+                if any(_words(b) & names for b in config.VIDEO_STRUCTURES[s].get("best_for", []))
+                else 1.0
+                for s in self.structures
+            ])
+
+        # A window never covers more than half an axis, or most draws would be redraws
+        populations = {
+            "topic": len(self.topics),
+            "hook_type": len(self.hooks),
+            "emotion": len(self.emotions),
+            "story_framework": len(self.frameworks),
+            "video_structure": len(self.structures)
         }
-    },
-    "LLM": {
-        "instructions": """
-        Generate a creative outro that:
-        1. Matches the video's emotion and style
-        2. Encourages engagement through:
-           - Asking relevant questions
-           - Encouraging saves and shares
-           - Creating community interaction
-           - Promoting discussion
-        3. Hints at future content by:
-           - Teasing upcoming videos
-           - Suggesting related topics
-           - Creating anticipation
-        4. Feels natural and authentic by:
-           - Using conversational language
-           - Avoiding forced engagement
-           - Being genuine and relatable
-        5. Includes appropriate emojis (2-3 max)
-        6. Keeps length between 10-15 words
-        7. Incorporates one clear call to action
-        8. Uses platform-specific language
-        
-        Style Guidelines:
-        - Keep it casual and friendly
-        - Use active voice
-        - Create urgency without desperation
-        - Make it shareable and memorable
-        - Focus on value to viewer
-        """,
-        "engagement_patterns": {
-            "Question Types": [
-                "Opinion Questions",
-                "Experience Questions",
-                "Preference Questions",
-                "Problem Questions",
-                "Future Questions"
-            ],
-            "Emotion Triggers": [
-                "Curiosity",
-                "FOMO",
-                "Excitement",
-                "Connection",
-                "Achievement"
-            ],
-            "Call Types": [
-                "Direct Ask",
-                "Soft Suggestion",
-                "Value Offer",
-                "Community Join",
-                "Challenge Accept"
-            ]
+        self._windows = {
+            axis: _RecentWindow(min(windows.get(axis, 0), population // 2))
+            for axis, population in populations.items()
         }
-    }
-}
 
-# Part 3B: Enhanced Content Categories
-
-CONTENT_CATEGORIES = {
-    "Educational": {
-        "Academic": [
-            "Study Tips",
-            "Exam Preparation",
-            "Memory Techniques",
-            "Note-Taking Methods",
-            "Time Management",
-            "Subject Tutorials",
-            "Learning Hacks",
-            "Research Methods"
-        ],
-        "Professional Skills": [
-            "Career Development",
-            "Interview Tips",
-            "Resume Writing",
-            "Public Speaking",
-            "Leadership Skills",
-            "Networking Tips",
-            "Business Etiquette",
-            "Workplace Communication"
-        ],
-        "Life Skills": [
-            "Financial Literacy",
-            "Time Management",
-            "Organization Tips",
-            "Problem Solving",
-            "Decision Making",
-            "Critical Thinking",
-            "Emotional Intelligence",
-            "Personal Development"
-        ],
-        "Technical": [
-            "Programming Tutorials",
-            "Digital Tools",
-            "Software Tips",
-            "Tech Shortcuts",
-            "App Reviews",
-            "Hardware Guides",
-            "Coding Basics",
-            "Tech Troubleshooting"
-        ]
-    },
-    "Entertainment": {
-        "Performance": [
-            "Dance Choreography",
-            "Singing Covers",
-            "Comedy Skits",
-            "Acting Scenes",
-            "Musical Performances",
-            "Lip Sync",
-            "Talent Showcases",
-            "Character Impressions"
-        ],
-        "Gaming": [
-            "Game Reviews",
-            "Gaming Tips",
-            "Speedruns",
-            "Game Reactions",
-            "Easter Eggs",
-            "Gaming News",
-            "Strategy Guides",
-            "Gaming Highlights"
-        ],
-        "Reactions": [
-            "Trend Reactions",
-            "Video Reactions",
-            "News Reactions",
-            "Product Testing",
-            "Food Tasting",
-            "Experience Reviews",
-            "Live Reactions",
-            "First Impressions"
-        ],
-        "Challenges": [
-            "Dance Challenges",
-            "Skill Challenges",
-            "Food Challenges",
-            "Fitness Challenges",
-            "Creative Challenges",
-            "Duets",
-            "Trending Challenges",
-            "Original Challenges"
-        ]
-    },
-    "Lifestyle": {
-        "Fashion": [
-            "Style Tips",
-            "Outfit Ideas",
-            "Fashion Hauls",
-            "Trend Updates",
-            "Wardrobe Hacks",
-            "Fashion DIY",
-            "Shopping Guide",
-            "Season Looks"
-        ],
-        "Beauty": [
-            "Makeup Tutorials",
-            "Skincare Routines",
-            "Hair Styling",
-            "Beauty Hacks",
-            "Product Reviews",
-            "Natural Beauty",
-            "Beauty Tips",
-            "Transformation"
-        ],
-        "Fitness": [
-            "Workout Routines",
-            "Exercise Tips",
-            "Diet Plans",
-            "Transformation",
-            "Fitness Challenges",
-            "Home Workouts",
-            "Gym Guide",
-            "Sports Training"
-        ],
-        "Food & Cooking": [
-            "Recipe Tutorials",
-            "Cooking Hacks",
-            "Food Reviews",
-            "Kitchen Tips",
-            "Meal Prep",
-            "Healthy Eating",
-            "Baking Guide",
-            "Restaurant Reviews"
-        ]
-    },
-    "Creative": {
-        "Art & Design": [
-            "Art Tutorials",
-            "Digital Design",
-            "Drawing Tips",
-            "Painting Guide",
-            "Graphic Design",
-            "Animation",
-            "Creative Process",
-            "Art Challenges"
-        ],
-        "DIY & Crafts": [
-            "Craft Tutorials",
-            "DIY Projects",
-            "Upcycling",
-            "Home Decor",
-            "Handmade Items",
-            "Gift Ideas",
-            "Easy Crafts",
-            "Seasonal Projects"
-        ],
-        "Photography": [
-            "Photo Tips",
-            "Camera Tricks",
-            "Editing Tutorial",
-            "Composition Guide",
-            "Lighting Setup",
-            "Phone Photography",
-            "Props Ideas",
-            "Photo Challenges"
-        ],
-        "Music": [
-            "Music Production",
-            "Instrument Tips",
-            "Song Covers",
-            "Music Theory",
-            "Beat Making",
-            "Vocal Training",
-            "Music Reviews",
-            "Artist Features"
-        ]
-    },
-    "Business & Money": {
-        "Entrepreneurship": [
-            "Business Tips",
-            "Startup Guide",
-            "Marketing Strategy",
-            "Sales Techniques",
-            "Business Models",
-            "Success Stories",
-            "Growth Hacks",
-            "Business Tools"
-        ],
-        "Finance": [
-            "Money Tips",
-            "Investment Guide",
-            "Saving Strategies",
-            "Budgeting Help",
-            "Credit Advice",
-            "Tax Tips",
-            "Wealth Building",
-            "Financial Literacy"
-        ],
-        "Side Hustles": [
-            "Online Business",
-            "Passive Income",
-            "Freelancing Tips",
-            "E-commerce Guide",
-            "Digital Products",
-            "Service Business",
-            "Income Streams",
-            "Business Ideas"
-        ],
-        "Career Growth": [
-            "Job Search",
-            "Interview Prep",
-            "Resume Tips",
-            "Career Change",
-            "Skill Development",
-            "Salary Negotiation",
-            "Work Life Balance",
-            "Professional Growth"
-        ]
-    }
-}
+    @staticmethod
+    def _balanced_weights(rows) -> List[float]:
+        """Each category, then each of its subcategories, is equally likely whatever its size."""
+        categories = {}
+        for cat, subcat, _ in rows:
+            categories.setdefault(cat, {}).setdefault(subcat, 0)
+            categories[cat][subcat] += 1
+        return [1.0 / (len(categories) * len(categories[cat]) * categories[cat][subcat]) for cat, subcat, _ in rows]
+
+    def _draw(self, axis: str, draw):
+        """A draw not among the axis' recent ones, if one turns up within MAX_REDRAWS."""
+        window = self._windows[axis]
+        for _ in range(MAX_REDRAWS):
+            value = draw()
+            if value not in window:
+                break
+        window.add(value)
+        return value
+
+    def _topic_index(self, category: Optional[str] = None, subcategory: Optional[str] = None) -> int:
+        if subcategory:
+            start, end = self._subcategory_slices[(category, subcategory)]
+            return self._draw("topic", lambda: self.rng.randrange(start, end))
+        offset, table = self._topic_tables[category]
+        return self._draw("topic", lambda: offset + table.draw(self.rng))
+
+    def topic(self, category: str, subcategory: Optional[str] = None) -> str:
+        with self._lock:
+            return self.topics[self._topic_index(category, subcategory)][2]
+
+    def sample(self, category: Optional[str] = None, subcategory: Optional[str] = None) -> Dict:
+        """One combination, optionally from a given category or subcategory."""
+        with self._lock:
+            cat, subcat, topic = self.topics[self._topic_index(category, subcategory)]
+            framework = self.frameworks[self._draw("story_framework", lambda: self._framework_table.draw(self.rng))]
+            hooks, emotions = self._hook_tables[framework], self._emotion_tables[framework]
+            structures = self._structure_tables[(cat, subcat)]
+            return {
+                "category": cat,
+                "subcategory": subcat,
+                "topic": topic,
+                "hook_type": self.hooks[self._draw("hook_type", lambda: hooks.draw(self.rng))],
+                "emotion": self.emotions[self._draw("emotion", lambda: emotions.draw(self.rng))],
+                "story_framework": framework,
+                "video_structure": self.structures[self._draw("video_structure", lambda: structures.draw(self.rng))]
+            }
+
+    def combinations(self, count: Optional[int] = None, category: Optional[str] = None,
+                     subcategory: Optional[str] = None):
+        """Yield count combinations (endlessly if None), each drawn only when asked for."""
+        drawn = 0
+        while count is None or drawn < count:
+            yield self.sample(category, subcategory)
+            drawn += 1
+
+def get_sampler() -> ComboSampler:
+    """The session's shared sampler over the current config, built on first use and after each reload."""
+    global _sampler
+    with _sampler_lock:
+        config = current_config()
+        if _sampler is None or _sampler.config is not config:
+            _sampler = ComboSampler(config=config)
+        return _sampler
 
 # Add helper functions for content selection
 def get_random_topic(category: str, subcategory: str = None) -> str:
-    """Get a random topic from specified category/subcategory"""
-    if subcategory:
-        return random.choice(CONTENT_CATEGORIES[category][subcategory])
-    topics = []
-    for subcat in CONTENT_CATEGORIES[category].values():
-        topics.extend(subcat)
-    return random.choice(topics)
-
-def get_trending_combinations() -> List[Dict]:
-    """Generate trending content combinations"""
-    return [
-        {
-            "category": cat,
-            "subcategory": subcat,
-            "topic": topic,
-            "hook_type": random.choice(list(HOOK_TYPES.keys())),
-            "emotion": random.choice([e for ems in EMOTIONS.values() for e in ems])
-        }
-        for cat, subcats in CONTENT_CATEGORIES.items()
-        for subcat, topics in subcats.items()
-        for topic in topics
-    ]
\ No newline at end of file
+    """Get a random topic from specified category/subcategory, avoiding recent repeats"""
+    return get_sampler().topic(category, subcategory)
+
+def get_trending_combinations(count: Optional[int] = None, category: Optional[str] = None):
+    """Yield trending content combinations lazily (one per topic by default)"""
+    sampler = get_sampler()
+    if count is None:
+        count = len(sampler.topics)
+    return sampler.combinations(count, category)
+
+
+reload_config()
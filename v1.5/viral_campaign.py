@@ -0,0 +1,423 @@
+# viral_campaign.py
+
+import os
+import re
+import json
+import time
+import random
+import logging
+from TTS.api import TTS
+from viral_character import ViralVideo, ViralCharacterConfig, create_viral_video, estimate_tiktok_duration
+from viral_generator import get_structure_speed, get_structure_pause
+from tiktok_config import current_config, watch_config
+from speech_rate_model import SpeechRateModel
+from shared_functions import call_llm_api
+from duration_fitter import trim_script_to_duration, fit_audio_to_window, format_duration_report
+from pipeline import Pipeline, Stage
+from audio_processing import trim_silence, apply_edge_fades, LoudnessNormalizer
+from audio_pool import BufferPool, WorkerModels, synthesize_pooled
+from audio_writer import AudioFileWriter, format_writer_stats
+from session_journal import SessionJournal, read_journal
+
+# Get the module-specific logger
+logger = logging.getLogger(__name__)
+
+# Every campaign gets its own directory under this one
+CAMPAIGNS_DIR = "campaigns"
+QUEUE_FILENAME = "queue.jsonl"
+INDEX_FILENAME = "index.json"
+TTS_MODEL_NAME = "tts_models/en/vctk/vits"
+DEFAULT_CAMPAIGN_VIDEOS = 10
+# Number of attempts at writing a script before the job is left for the next run
+SCRIPT_ATTEMPTS = 3
+STAGE_QUEUE_SIZE = 2
+
+def _slug(text, max_length=40):
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')[:max_length] or 'video'
+
+def load_campaign_spec(path):
+    """
+    Read a campaign spec, a JSON object such as
+        {"name": "launch", "videos": 12, "categories": ["Educational", "Lifestyle/Fitness"],
+         "hooks": ["Question"], "frameworks": ["Problem-Solution"], "structures": ["Hook-Content-CTA"],
+         "emotions": ["Excited"], "seed": 7, "use_template_hooks": true, "use_template_outros": false}
+    Every key is optional: the matrix axes default to everything in tiktok_config, and categories
+    may name a single subcategory as "Category/Subcategory". Unknown names and a 'videos' that is
+    not a positive integer raise ValueError.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    config = current_config()
+    spec.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    spec.setdefault('videos', DEFAULT_CAMPAIGN_VIDEOS)
+    if isinstance(spec['videos'], bool) or not isinstance(spec['videos'], int) or spec['videos'] < 1:
+        raise ValueError(f"Campaign spec 'videos' must be a positive integer, got {spec['videos']!r}")
+    spec.setdefault('seed', None)
+    spec.setdefault('use_template_hooks', True)
+    spec.setdefault('use_template_outros', False)
+    spec.setdefault('categories', list(config.CONTENT_CATEGORIES))
+    for key, known in (('hooks', config.HOOK_TYPES), ('frameworks', config.STORY_FRAMEWORKS), ('structures', config.VIDEO_STRUCTURES)):
+        spec.setdefault(key, list(known))
+        unknown = [name for name in spec[key] if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown {key} in campaign spec: {', '.join(unknown)}")
+    for entry in spec['categories']:
+        category, _, subcategory = entry.partition('/')
+        if category not in config.CONTENT_CATEGORIES or (subcategory and subcategory not in config.CONTENT_CATEGORIES[category]):
+            raise ValueError(f"Unknown category in campaign spec: {entry}")
+    unknown = [emotion for emotion in spec.get('emotions') or [] if emotion not in config.EMOTION_SET]
+    if unknown:
+        raise ValueError(f"Unknown emotions in campaign spec: {', '.join(unknown)}")
+    return spec
+
+def plan_campaign(spec):
+    """
+    Pick spec['videos'] distinct (topic, hook, framework, structure) jobs from the campaign matrix.
+    Combinations are drawn by their index in the matrix, so the full product is never built.
+    """
+    rng = random.Random(spec['seed'])
+    config = current_config()
+    selected = [tuple(entry.partition('/')[::2]) for entry in spec['categories']]
+    topics = [
+        row for row in config.TOPICS
+        if any(row[0] == category and (not subcategory or row[1] == subcategory)
+               for category, subcategory in selected)
+    ]
+    axes = [topics, spec['hooks'], spec['frameworks'], spec['structures']]
+    combinations = 1
+    for axis in axes:
+        combinations *= len(axis)
+    if spec['videos'] > combinations:
+        logger.warning(f"Campaign '{spec['name']}' asks for {spec['videos']} videos but its matrix has {combinations} combinations")
+
+    jobs = []
+    for number, index in enumerate(rng.sample(range(combinations), min(spec['videos'], combinations)), 1):
+        picks = []
+        for axis in reversed(axes):
+            index, position = divmod(index, len(axis))
+            picks.append(axis[position])
+        structure, framework, hook, (category, subcategory, topic) = picks
+        # Only emotions the prompt accepts as they are, so the plan records what is used
+        emotions = spec.get('emotions') or config.framework_emotions(framework) or config.EMOTION_LIST
+        jobs.append({
+            'job_id': f"{number:04d}_{_slug(topic)}",
+            'category': category,
+            'subcategory': subcategory,
+            'topic': topic,
+            'hook_type': hook,
+            'story_framework': framework,
+            'video_structure': structure,
+            'emotion': rng.choice(emotions)
+        })
+    return jobs
+
+class CampaignQueue:
+    """
+    Persistent work queue of a campaign: an append-only JSONL file holding the planned jobs and
+    what became of them. Only 'done' is final, so jobs that were in flight or failed when a run
+    ended are handed out again by the next run, while the plan itself never changes.
+    """
+
+    def __init__(self, path, plan):
+        self.path = path
+        self.jobs = {}
+        self.results = {}
+        self.attempts = {}
+        if os.path.exists(path):
+            for record in read_journal(path):
+                if record['type'] == 'job':
+                    self.jobs[record['job']['job_id']] = record['job']
+                elif record['type'] == 'claimed':
+                    self.attempts[record['job_id']] = self.attempts.get(record['job_id'], 0) + 1
+                elif record['type'] == 'done':
+                    self.results[record['job_id']] = record
+        self._journal = SessionJournal(path, append=True)
+        if not self.jobs:
+            for job in plan():
+                self.jobs[job['job_id']] = job
+                self._journal.append('job', job=job)
+        self._claimed_at = {}
+
+    def pending(self):
+        """Jobs not done yet, in plan order."""
+        return [job for job_id, job in self.jobs.items() if job_id not in self.results]
+
+    def claim(self, job_id):
+        self._claimed_at[job_id] = time.monotonic()
+        self.attempts[job_id] = self.attempts.get(job_id, 0) + 1
+        self._journal.append('claimed', job_id=job_id)
+
+    def done(self, job_id, **result):
+        """Mark a job finished; its latency runs from its claim to now."""
+        latency = time.monotonic() - self._claimed_at.pop(job_id, time.monotonic())
+        self.results[job_id] = self._journal.append('done', job_id=job_id, latency_seconds=round(latency, 3), **result)
+
+    def failed(self, job_id, error):
+        self._claimed_at.pop(job_id, None)
+        self._journal.append('failed', job_id=job_id, error=str(error))
+
+    def close(self):
+        self._journal.close()
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def campaign_stats(latencies, audio_seconds, elapsed):
+    """Throughput and per-job latency of one run."""
+    stats = {
+        'jobs': len(latencies),
+        'elapsed_seconds': round(elapsed, 3),
+        'videos_per_minute': round(len(latencies) / elapsed * 60, 3) if elapsed > 0 else 0.0,
+        'audio_seconds': round(audio_seconds, 3),
+        'audio_seconds_per_second': round(audio_seconds / elapsed, 3) if elapsed > 0 else 0.0
+    }
+    if latencies:
+        stats.update(
+            latency_p50=round(_percentile(latencies, 0.5), 3),
+            latency_p90=round(_percentile(latencies, 0.9), 3),
+            latency_max=round(max(latencies), 3)
+        )
+    return stats
+
+def write_campaign_index(path, spec, campaign_queue, run_stats):
+    """Index of every planned job with its output, replaced atomically."""
+    index = {
+        'name': spec['name'],
+        'spec': spec,
+        'jobs': [
+            {**job, 'status': 'done' if job_id in campaign_queue.results else 'pending',
+             'attempts': campaign_queue.attempts.get(job_id, 0), **{
+                key: value for key, value in campaign_queue.results.get(job_id, {}).items()
+                if key not in ('type', 'job_id')
+            }}
+            for job_id, job in campaign_queue.jobs.items()
+        ],
+        'last_run': run_stats
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def viral_campaign_process(
+    audio_buffer,
+    stop_event,
+    spec,
+    selected_speaker,
+    audio_format,
+    llm_concurrency,
+    tts_workers,
+    progress_queue,
+    pause_event
+):
+    """
+    Process that renders a campaign: every planned (topic, hook, framework, structure) job becomes
+    one video, with scripts and synthesis spread over worker pools. Jobs are independent of each
+    other, so unlike a regular TikTok session no script builds on the previous ones.
+    """
+    campaign_dir = os.path.join(CAMPAIGNS_DIR, _slug(spec['name'], max_length=80))
+    audio_dir = os.path.join(campaign_dir, "audio")
+    os.makedirs(audio_dir, exist_ok=True)
+    campaign_queue = CampaignQueue(os.path.join(campaign_dir, QUEUE_FILENAME), lambda: plan_campaign(spec))
+    pending = campaign_queue.pending()
+    print(f"\nCampaign '{spec['name']}': {len(campaign_queue.jobs)} jobs planned, {len(pending)} to render")
+    logger.info(f"Campaign '{spec['name']}' in {campaign_dir}: {len(pending)} of {len(campaign_queue.jobs)} jobs pending")
+
+    # Initialize TTS model
+    print("\nInitializing TTS model for the campaign...")
+    logger.info("Initializing TTS model for the campaign...")
+    tts_model = TTS(TTS_MODEL_NAME, progress_bar=False, gpu=False)
+    print("TTS model loaded successfully.")
+    logger.info("TTS model loaded successfully.")
+    # Edits to tiktok_config.json apply to the jobs that start after them
+    watch_config(stop_event)
+
+    llm_concurrency = max(1, llm_concurrency)
+    worker_models = WorkerModels(tts_model, lambda: TTS(TTS_MODEL_NAME, progress_bar=False, gpu=False), tts_workers)
+    rate_model = SpeechRateModel.load()
+    sample_rate = tts_model.synthesizer.output_sample_rate
+    # Keeps every video at the same loudness in the exported files
+    normalizer = LoudnessNormalizer.for_sink('file', sample_rate)
+    pool = BufferPool()
+    writer = AudioFileWriter(audio_format)
+    latencies = []
+    audio_seconds = 0.0
+    published = 0
+    started = time.perf_counter()
+
+    def jobs():
+        """Source: pending jobs in plan order, claimed as they enter the pipeline"""
+        for job in pending:
+            campaign_queue.claim(job['job_id'])
+            yield job
+
+    def write_script(job):
+        # One config snapshot for everything about this job, through to its post-processing
+        config = current_config()
+        structure_timing = config.VIDEO_STRUCTURES[job['video_structure']]['typical_duration']
+        target_duration = (structure_timing[0] + structure_timing[1]) / 2
+        speed = get_structure_speed(job['video_structure'])
+        job_config = ViralCharacterConfig(
+            num_videos=1,
+            video_duration=target_duration,
+            selected_emotion=job['emotion'],
+            selected_hook_type=job['hook_type'],
+            selected_topic=job['topic'],
+            use_template_outros=spec['use_template_outros'],
+            use_template_hooks=spec['use_template_hooks'],
+            llm_generated_topics=False,
+            video_structure=job['video_structure'],
+            story_framework=job['story_framework'],
+            category=job['category'],
+            subcategory=job['subcategory'],
+            audio_format=audio_format
+        )
+        video = ViralVideo(
+            topic=job['topic'],
+            hook_type=job['hook_type'],
+            duration=target_duration,
+            emotion=job['emotion'],
+            use_template_outro=spec['use_template_outros'],
+            category=job['category'],
+            subcategory=job['subcategory'],
+            video_structure=job['video_structure'],
+            story_framework=job['story_framework'],
+            outro_category=None,
+            outro_template=random.choice(config.ALL_OUTROS) if spec['use_template_outros'] else None,
+            speech_speed=speed,
+            target_words=rate_model.words_for_duration(target_duration, selected_speaker, speed),
+            max_duration=structure_timing[1],
+            config=config
+        )
+
+        def llm_api(prompt, duration_budget=None):
+            return call_llm_api(prompt, duration_budget=duration_budget, rate_model=rate_model, speaker=selected_speaker, speed=speed)
+
+        for attempt in range(1, SCRIPT_ATTEMPTS + 1):
+            try:
+                content, estimated_duration = create_viral_video(
+                    llm_api, video, job_config, [], rate_model=rate_model, speaker=selected_speaker
+                )
+                break
+            except Exception as e:
+                logger.error(f"Error writing the script of {job['job_id']} (attempt {attempt}): {e}", exc_info=True)
+                if stop_event.wait(1):
+                    return None
+        else:
+            campaign_queue.failed(job['job_id'], "script generation failed")
+            return None
+
+        # Trim scripts that are far too long at sentence boundaries before synthesis
+        estimate = lambda text: estimate_tiktok_duration(text, rate_model=rate_model, speaker=selected_speaker, speed=speed)
+        if estimated_duration > structure_timing[1] * (1 + job_config.duration_tolerance):
+            content = trim_script_to_duration(content, structure_timing[1], estimate_fn=estimate)
+        return job, content, speed, config
+
+    def synthesize(item):
+        job, content, speed, config = item
+        try:
+            wav = synthesize_pooled(worker_models.get(), pool, content, speaker=selected_speaker, speed=speed)
+        except Exception as e:
+            logger.error(f"TTS synthesis error for {job['job_id']}: {e}", exc_info=True)
+            campaign_queue.failed(job['job_id'], e)
+            return None
+        return job, content, speed, config, wav
+
+    def post_process(item):
+        job, content, speed, config, wav = item
+        wav = trim_silence(wav, sample_rate)
+        rate_model.observe(content, len(wav) / sample_rate, selected_speaker, speed)
+        wav, duration_report = fit_audio_to_window(
+            wav,
+            sample_rate,
+            config.VIDEO_STRUCTURES[job['video_structure']]['typical_duration'],
+            tolerance=ViralCharacterConfig.duration_tolerance
+        )
+        return job, content, wav, duration_report
+
+    def publish(item):
+        nonlocal audio_seconds, published
+        job, content, wav, duration_report = item
+        min_duration, max_duration = duration_report['window']
+        duration_summary = format_duration_report((min_duration + max_duration) / 2, duration_report)
+
+        def on_written(path):
+            campaign_queue.done(
+                job['job_id'],
+                audio_path=path,
+                script=content,
+                duration_seconds=round(duration_report['achieved_duration'], 3),
+                in_window=duration_report['in_window']
+            )
+            latencies.append(campaign_queue.results[job['job_id']]['latency_seconds'])
+
+        apply_edge_fades(wav, sample_rate)
+        # Normalized for the file on a copy, so the player normalizes the queued clip only once
+        file_wav = pool.acquire(len(wav))
+        file_wav[:] = wav
+        normalizer.process(file_wav)
+        audio_filename = writer.submit(os.path.join(audio_dir, job['job_id']), file_wav, sample_rate, on_written=on_written)
+        audio_seconds += duration_report['achieved_duration']
+        published += 1
+        print(f"[{job['job_id']}] {job['topic']} / {job['hook_type']} / {job['story_framework']} -> {audio_filename}")
+        print(f"    Duration - {duration_summary}")
+        logger.info(f"Campaign job {job['job_id']} queued for {audio_filename}")
+
+        # Put audio in the playback buffer (blocks while it is full), with a pause after the video
+        audio_buffer.put(wav, sample_rate, gap_after=get_structure_pause(job['video_structure']))
+        progress_queue.put({
+            'total_duration_seconds': audio_seconds,
+            'videos_completed': len(campaign_queue.jobs) - len(pending) + published,
+            'total_videos': len(campaign_queue.jobs),
+            'writer_queue_depth': writer.queue_depth(),
+            **audio_buffer.depth()
+        })
+        return item
+
+    # Stage graph: campaign jobs -> script (LLM workers) -> tts (TTS workers) -> post-process -> sink
+    pipeline = Pipeline(
+        "campaign",
+        jobs(),
+        [
+            Stage("script", write_script, concurrency=llm_concurrency, maxsize=max(STAGE_QUEUE_SIZE, llm_concurrency)),
+            Stage("tts", synthesize, concurrency=max(1, tts_workers), maxsize=max(STAGE_QUEUE_SIZE, tts_workers)),
+            Stage("post-process", post_process, maxsize=STAGE_QUEUE_SIZE),
+            Stage("sink", publish, maxsize=STAGE_QUEUE_SIZE),
+        ],
+        stop_event=stop_event,
+        pause_event=pause_event
+    )
+    pipeline.on_cancel(audio_buffer.wake)
+    pipeline_stats = pipeline.run()
+    # Observations the speech rate model has not saved yet
+    rate_model.close()
+    # Finish writing queued audio files before indexing
+    writer.close()
+    campaign_queue.close()
+
+    run_stats = campaign_stats(latencies, audio_seconds, time.perf_counter() - started)
+    run_stats['stages'] = {
+        name: {'processed': stage['processed'], 'utilization': round(stage['utilization'], 3)}
+        for name, stage in pipeline_stats['stages'].items()
+    }
+    index_path = os.path.join(campaign_dir, INDEX_FILENAME)
+    write_campaign_index(index_path, spec, campaign_queue, run_stats)
+
+    # Cleanup
+    stop_event.set()
+
+    print(f"\nCampaign '{spec['name']}' run completed:")
+    print(f"- Jobs done: {len(campaign_queue.results)}/{len(campaign_queue.jobs)} ({run_stats['jobs']} this run)")
+    print(
+        f"- Throughput: {run_stats['videos_per_minute']:.2f} videos/min, "
+        f"{run_stats['audio_seconds_per_second']:.2f} audio seconds per second"
+    )
+    if latencies:
+        print(
+            f"- Job latency: p50 {run_stats['latency_p50']:.1f}s, p90 {run_stats['latency_p90']:.1f}s, "
+            f"max {run_stats['latency_max']:.1f}s"
+        )
+    print(f"- Index: {index_path}")
+    print(f"- Audio writer: {format_writer_stats(writer.stats())}")
+    logger.info(f"Campaign '{spec['name']}' run completed: {run_stats}")
@@ -5,14 +5,7 @@ from typing import List, Optional
 import random
 import re
 from textblob import TextBlob
-from tiktok_config import (
-    EMOTIONS,
-    HOOK_TYPES,
-    OUTROS,
-    CONTENT_CATEGORIES,
-    STORY_FRAMEWORKS,
-    VIDEO_STRUCTURES
-)
+from tiktok_config import ConfigSnapshot, current_config
 
 @dataclass
 class ViralVideo:
@@ -29,6 +22,10 @@ class ViralVideo:
     outro_category: Optional[str]
     outro_template: Optional[str] = None
     custom_outro: Optional[str] = None
+    speech_speed: float = 1.0
+    target_words: Optional[int] = None
+    max_duration: Optional[float] = None  # Audio duration budget for the LLM
+    config: Optional[ConfigSnapshot] = None  # tiktok_config tables the video was planned with (current if None)
 
 @dataclass
 class ViralCharacterConfig:
@@ -48,6 +45,9 @@ class ViralCharacterConfig:
     selected_category: Optional[str] = None
     outro_category: Optional[str] = None
     outro_subcategory: Optional[str] = None  # Added field
+    duration_tolerance: float = 0.15  # Max time-stretch applied to fit the structure's window
+    audio_format: str = 'wav'  # Format of the saved audio files (see audio_writer.AUDIO_FORMATS)
+    resume: bool = False  # Continue an interrupted session from its journal
 
 def generate_viral_prompt(
     conversation_history: str,
@@ -63,10 +63,12 @@ engaging, authentic, and crafted to resonate with your audience while maintainin
 unique style and personality.
 """
 
+    # One snapshot for every lookup, so a config reload cannot change the tables halfway through
+    config = video_config.config or current_config()
+
     # Generate hook example
     hook_instruction = ''
     if character_config.use_template_hooks and video_config.hook_type:
-        hook_templates = HOOK_TYPES[video_config.hook_type]['templates']
         placeholder_values = {
             'topic': video_config.topic or "{topic}",
             'number': '50',
@@ -74,18 +76,10 @@ unique style and personality.
             'amount': '$100',
             'percentage': '50%'
         }
-        # Validate and format hook templates
-        valid_templates = []
-        for template in hook_templates:
-            try:
-                # Try to format the template with the placeholders
-                hook_example = template.format(**placeholder_values)
-                valid_templates.append(hook_example)
-            except KeyError:
-                # Skip templates that require placeholders we don't have
-                continue
+        # Only templates whose placeholders we have values for
+        valid_templates = config.FORMATTABLE_HOOK_TEMPLATES[video_config.hook_type]
         if valid_templates:
-            hook_example = random.choice(valid_templates)
+            hook_example = random.choice(valid_templates).format(**placeholder_values)
             hook_instruction = f'- Start with a captivating hook similar to: "{hook_example}"\n'
         else:
             # If no valid templates, provide general instruction
@@ -101,17 +95,18 @@ unique style and personality.
         outro_style_line = f'- End with an engaging outro that encourages interaction.\n'
 
     # Validate and set the emotion
-    if character_config.selected_emotion not in [emotion for emotions in EMOTIONS.values() for emotion in emotions]:
-        best_emotions = STORY_FRAMEWORKS[video_config.story_framework].get('best_emotions', [])
+    if character_config.selected_emotion not in config.EMOTION_SET:
+        best_emotions = config.STORY_FRAMEWORKS[video_config.story_framework].get('best_emotions', [])
         if best_emotions:
             video_config.emotion = random.choice(best_emotions)
         else:
-            video_config.emotion = random.choice([emotion for emotions in EMOTIONS.values() for emotion in emotions])
+            video_config.emotion = random.choice(config.EMOTION_LIST)
 
     # Build the prompt
     prompt = (
         f"{base_profile}\n\n"
-        f"Create a TikTok script that is approximately {video_config.duration} seconds long.\n\n"
+        f"Create a TikTok script that is approximately {video_config.duration} seconds long"
+        f"{f' (about {video_config.target_words} words)' if video_config.target_words else ''}.\n\n"
         f"Topic: {video_config.topic}\n"
         f"Category: {video_config.category}\n"
         f"Emotion/Tone: {video_config.emotion}\n\n"
@@ -179,13 +174,18 @@ def detect_viral_emotion(text: str) -> str:
 
 def estimate_tiktok_duration(
     text: str,
-    speaking_rate: float = 150
+    speaking_rate: float = 150,
+    rate_model=None,
+    speaker: Optional[str] = None,
+    speed: float = 1.0
 ) -> float:
     """
     Estimate the duration of TikTok content when spoken.
-    speaking_rate: words per minute
+    speaking_rate: words per minute, used when no calibrated rate_model is given
     Returns: duration in seconds
     """
+    if rate_model is not None:
+        return rate_model.predict(text, speaker, speed)
     words = len(text.split())
     duration = (words / speaking_rate) * 60
     return duration
@@ -194,7 +194,9 @@ def create_viral_video(
     llm_api,
     video_config: ViralVideo,
     character_config: ViralCharacterConfig,
-    conversation_history: List[str]
+    conversation_history: List[str],
+    rate_model=None,
+    speaker: Optional[str] = None
 ) -> tuple[str, float]:
     """
     Creates a single TikTok video script and returns it with its estimated duration.
@@ -206,8 +208,8 @@ def create_viral_video(
         character_config
     )
 
-    # Get content from LLM
-    content = llm_api(prompt)
+    # Get content from LLM, bounded by the video's duration budget
+    content = llm_api(prompt, duration_budget=video_config.max_duration)
 
     if not content:
         content = "Failed to generate content. Please try again."
@@ -217,14 +219,19 @@ def create_viral_video(
 
     # Estimate duration
     duration = estimate_tiktok_duration(
-        clean_content
+        clean_content,
+        rate_model=rate_model,
+        speaker=speaker,
+        speed=video_config.speech_speed
     )
 
     return clean_content, duration
 
 class ViralCharacter:
-    def __init__(self, llm_api):
+    def __init__(self, llm_api, rate_model=None, speaker=None):
         self.llm_api = llm_api
+        self.rate_model = rate_model
+        self.speaker = speaker
         self.conversation_history = []
         self.videos_created = 0
         self.total_duration = 0
@@ -242,7 +249,9 @@ class ViralCharacter:
             self.llm_api,
             video_config,
             config,
-            self.conversation_history
+            self.conversation_history,
+            rate_model=self.rate_model,
+            speaker=self.speaker
         )
 
         # Update history and counters
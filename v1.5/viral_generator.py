@@ -2,24 +2,52 @@
 
 import time
 import random
-import numpy as np
 from TTS.api import TTS
-from threading import Thread
 import psutil
-from viral_character import ViralCharacter, ViralVideo, ViralCharacterConfig
-from tiktok_config import OUTROS, VIDEO_STRUCTURES, STORY_FRAMEWORKS
+from viral_character import ViralCharacter, ViralVideo, ViralCharacterConfig, estimate_tiktok_duration
+from tiktok_config import VIDEO_STRUCTURES, STORY_FRAMEWORKS, get_sampler, watch_config
+from speech_rate_model import SpeechRateModel
+from shared_functions import call_llm_api
+from duration_fitter import trim_script_to_duration, fit_audio_to_window, format_duration_report
+from pipeline import Pipeline, Stage
+from filler_library import load_filler_library
+from audio_processing import trim_silence, apply_edge_fades, LoudnessNormalizer
+from audio_pool import BufferPool, synthesize_pooled
+from audio_writer import AudioFileWriter, format_writer_stats
+from session_journal import SessionJournal, journal_path, read_journal, compact_journal, export_report
+from dataclasses import asdict
 import logging
 import traceback
-import queue
-from queue import Queue as ThreadQueue
 import os
-import soundfile as sf  # Added import
 
 # Get the module-specific logger
 logger = logging.getLogger(__name__)
 
+# Stage graph settings
+LLM_CONCURRENCY = 1  # Scripts build on the history of previous scripts
+TTS_CONCURRENCY = 1
+STAGE_QUEUE_SIZE = 2
+
+def get_structure_speed(video_structure):
+    """TTS speed that gives each video structure an appropriate pacing"""
+    structure_speed = 0.85  # Base speed
+    if 'Tutorial' in video_structure:
+        structure_speed = 0.9  # Slightly faster for tutorials
+    elif 'Story' in video_structure:
+        structure_speed = 0.8  # Slower for stories
+    return structure_speed
+
+def get_structure_pause(video_structure):
+    """Pause the listener hears after each video, based on structure"""
+    pause_time = 0.5
+    if 'Story' in video_structure:
+        pause_time = 0.8  # Longer pause after stories
+    elif 'Quick' in video_structure:
+        pause_time = 0.3  # Shorter pause for quick content
+    return pause_time
+
 def viral_generator_process(
-    audio_queue,
+    audio_buffer,
     stop_event,
     desired_duration_seconds,
     output_filename,
@@ -35,9 +63,8 @@ def viral_generator_process(
 
     # Initialize variables
     conversation_history = []
-    conversation_transcript = ""
     total_duration_seconds = 0
-    videos_created = 0
+    videos_in_window = 0
 
     # Initialize TTS model
     print(f"\nInitializing TTS model for TikTok video generation...")
@@ -45,216 +72,339 @@ def viral_generator_process(
     tts_model = TTS("tts_models/en/vctk/vits", progress_bar=False, gpu=False)
     print("TTS model loaded successfully.")
     logger.info("TTS model loaded successfully.")
-
-    # Create a thread-safe queue for video content
-    content_queue = ThreadQueue(maxsize=5)  # Buffer for 5 videos
-
-    def generate_video_content():
-        """Thread function to generate video content"""
-        nonlocal videos_created
-
-        # Initialize the ViralCharacter with the llm_api function
-        character = ViralCharacter(llm_api)
-
-        while videos_created < viral_config.num_videos and not stop_event.is_set():
-            # Pause if pause_event is set
-            if pause_event.is_set():
-                time.sleep(1)
-                continue
-
+    # Edits to tiktok_config.json apply to the videos that start after them
+    watch_config(stop_event)
+
+    # Speech rate model calibrated from every synthesis in previous sessions
+    rate_model = SpeechRateModel.load()
+    structure_speed = get_structure_speed(viral_config.video_structure)
+    structure_pause = get_structure_pause(viral_config.video_structure)
+    duration_window = VIDEO_STRUCTURES[viral_config.video_structure]['typical_duration']
+    sample_rate = tts_model.synthesizer.output_sample_rate
+    # Keeps every video at the same loudness in the exported files (the player normalizes what it plays)
+    normalizer = LoudnessNormalizer.for_sink('file', sample_rate)
+    # Reused buffers for synthesized audio, so post-processing works in place
+    pool = BufferPool()
+    # Audio files are written in the background so the next video's TTS never waits on disk
+    writer = AudioFileWriter(viral_config.audio_format)
+    # Every script, video and filler is journaled as it is produced; the .txt report is derived from it,
+    # and a resumed session rebuilds its state from it
+    journal_file = journal_path(output_filename)
+    recovered_scripts = {}  # Video number -> script whose audio was never saved
+    next_video_number = 1
+    resuming = viral_config.resume and os.path.exists(journal_file)
+    if resuming:
+        saved = {record['video_number'] for record in read_journal(journal_file) if record['type'] == 'video_saved'}
+        for record in read_journal(journal_file):
+            if 'video_number' in record:
+                next_video_number = max(next_video_number, record['video_number'] + 1)
+            if record['type'] == 'script' and record['video_number'] not in saved:
+                recovered_scripts[record['video_number']] = record['content']
+            elif record['type'] == 'video' and record['video_number'] in saved:
+                conversation_history.append(record['content'])
+                total_duration_seconds += record['duration_report']['achieved_duration']
+                if record['duration_report']['in_window']:
+                    videos_in_window += 1
+        # Drop the stale records of unfinished videos and the scripts of saved ones. The scripts of
+        # unfinished videos stay until their audio is saved, so a second interruption cannot lose them
+        compact_journal(
+            journal_file,
+            lambda record: record['type'] not in ('script', 'video', 'video_saved', 'end')
+            or (record['type'] == 'script') != (record.get('video_number') in saved)
+        )
+        print(
+            f"Resuming: {len(conversation_history)} videos already saved, "
+            f"{len(recovered_scripts)} scripts to synthesize again"
+        )
+        logger.info(f"Resuming session from {journal_file}: {len(conversation_history)} saved, {len(recovered_scripts)} scripts recovered")
+    elif viral_config.resume:
+        print(f"No journal found at {journal_file}; starting a new session.")
+    journal = SessionJournal(journal_file, append=resuming)
+    journal.append('resume' if resuming else 'session', mode='viral', speaker=selected_speaker, config=asdict(viral_config))
+
+    # Bridge lines the player inserts when the buffer runs low
+    audio_buffer.offer_fillers(load_filler_library("Viral", tts_model, selected_speaker, structure_speed))
+
+    def video_configs():
+        """Source: (video number, configuration) per requested video, after scripts recovered on resume"""
+        video_number = next_video_number
+        for recovered_number in sorted(recovered_scripts):
+            yield recovered_number, recovered_scripts[recovered_number]
+        for _ in range(viral_config.num_videos - len(conversation_history) - len(recovered_scripts)):
+            # Every lookup for this video comes from one config snapshot, the one the topic sampler draws from
+            sampler = get_sampler()
+            config = sampler.config
+
+            # Get structure-specific timing
+            structure_timing = config.VIDEO_STRUCTURES[viral_config.video_structure]['typical_duration']
+            target_duration = (structure_timing[0] + structure_timing[1]) / 2
+
+            # Handle outro template selection
+            outro_template = None
+            if viral_config.use_template_outros and viral_config.outro_category:
+                # From the subcategory if one is set, else from the whole category
+                outro_template = random.choice(config.outro_templates(viral_config.outro_category, viral_config.outro_subcategory))
+
+            # Without a chosen topic, every video gets its own from the category, avoiding recent repeats
+            topic = viral_config.selected_topic
+            if topic is None and viral_config.category in config.CONTENT_CATEGORIES:
+                topic = sampler.topic(viral_config.category, viral_config.subcategory)
+
+            # Create video configuration with new fields
+            yield video_number, ViralVideo(
+                topic=topic,
+                hook_type=viral_config.selected_hook_type,
+                duration=target_duration,  # Use structure-specific duration
+                emotion=viral_config.selected_emotion,
+                use_template_outro=viral_config.use_template_outros,
+                category=viral_config.category,
+                subcategory=viral_config.subcategory,
+                video_structure=viral_config.video_structure,
+                story_framework=viral_config.story_framework,
+                outro_category=viral_config.outro_category,
+                outro_template=outro_template,
+                speech_speed=structure_speed,
+                target_words=rate_model.words_for_duration(target_duration, selected_speaker, structure_speed),
+                max_duration=structure_timing[1],
+                config=config
+            )
+            video_number += 1
+
+    def write_script(item):
+        video_number, current_video = item
+        if isinstance(current_video, str):
+            # Script recovered from the journal of an interrupted session
+            return video_number, current_video, estimate_duration(current_video)
+        if audio_buffer.low_water.is_set():
+            # Playback is running dry: aim for the short end of the duration window
+            current_video.max_duration = duration_window[0]
+        # Keep trying until the video exists or the session stops, so a session never
+        # completes with fewer videos than requested
+        attempt = 0
+        while True:
+            attempt += 1
+            # Check CPU usage
+            while psutil.cpu_percent(interval=0.1) > max_cpu_usage * 100:
+                time.sleep(0.1)
             try:
-                # Check CPU usage
-                while psutil.cpu_percent(interval=0.1) > max_cpu_usage * 100:
-                    time.sleep(0.1)
-
-                # Get structure-specific timing
-                structure_timing = VIDEO_STRUCTURES[viral_config.video_structure]['typical_duration']
-                target_duration = (structure_timing[0] + structure_timing[1]) / 2
-
-                # Handle outro template selection
-                outro_template = None
-                if viral_config.use_template_outros and viral_config.outro_category:
-                    outro_section = OUTROS['Template'][viral_config.outro_category]
-                    if viral_config.outro_subcategory:
-                        # If subcategory exists, select from it
-                        templates = outro_section[viral_config.outro_subcategory]
-                        outro_template = random.choice(templates)
-                    elif isinstance(outro_section, list):
-                        # Directly select if it's a list
-                        templates = outro_section
-                        outro_template = random.choice(templates)
-                    else:
-                        # Randomly select from all subcategories
-                        all_templates = []
-                        for subtemplates in outro_section.values():
-                            all_templates.extend(subtemplates)
-                        outro_template = random.choice(all_templates)
-
-                # Create video configuration with new fields
-                current_video = ViralVideo(
-                    topic=viral_config.selected_topic,
-                    hook_type=viral_config.selected_hook_type,
-                    duration=target_duration,  # Use structure-specific duration
-                    emotion=viral_config.selected_emotion,
-                    use_template_outro=viral_config.use_template_outros,
-                    category=viral_config.category,
-                    subcategory=viral_config.subcategory,
-                    video_structure=viral_config.video_structure,
-                    story_framework=viral_config.story_framework,
-                    outro_category=viral_config.outro_category,
-                    outro_template=outro_template
-                )
-
                 # Generate content using viral character
-                content, duration = character.create_video(viral_config, current_video)
-
-                # Put content in queue
-                content_queue.put((content, duration))
-                videos_created += 1
-
+                content, estimated_duration = character.create_video(viral_config, current_video)
+                return video_number, content, estimated_duration
             except Exception as e:
-                logger.error(f"Error generating video content: {e}", exc_info=True)
+                logger.error(f"Error generating video content (attempt {attempt}): {e}", exc_info=True)
                 print(f"Error generating video content: {e}")
-                time.sleep(1)  # Brief pause before retry
-
-    # Define the llm_api function using the same format as in shared_functions.py
-    def llm_api(prompt):
-        import subprocess
-
-        # Construct the command as per your working example
-        command = ["ollama", "run", "hf.co/ArliAI/Mistral-Small-22B-ArliAI-RPMax-v1.1-GGUF:latest"]
-
-        try:
-            result = subprocess.run(
-                command,
-                input=prompt,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding='utf-8',
-                check=True
+                if stop_event.wait(1):  # Brief pause before retry
+                    return None
+
+    def fit_script(item):
+        video_number, content, estimated_duration = item
+        # Trim scripts that are far too long at sentence boundaries before synthesis
+        max_script_duration = duration_window[1] * (1 + viral_config.duration_tolerance)
+        if estimated_duration > max_script_duration:
+            content = trim_script_to_duration(content, duration_window[1], estimate_fn=estimate_duration)
+            logger.info(
+                f"Trimmed script from an estimated {estimated_duration:.1f}s "
+                f"to fit the {duration_window[1]}s limit"
             )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            error_message = e.stderr.strip()
-            logger.error(f"Error calling LLM API: {error_message}", exc_info=True)
-            print(f"Error calling LLM API: {error_message}")
-            return ""
+        # Checkpoint: a resumed session synthesizes this script again instead of rewriting it
+        journal.append('script', video_number=video_number, content=content)
+        return video_number, content
+
+    def synthesize(item):
+        video_number, content = item
+        started = time.perf_counter()
+        # Generate the audio with structure-appropriate pacing
+        wav = synthesize_pooled(
+            tts_model,
+            pool,
+            content,
+            speaker=selected_speaker,
+            speed=structure_speed
+        )
+        return video_number, content, wav, time.perf_counter() - started
+
+    def post_process(item):
+        video_number, content, wav, synthesis_seconds = item
+
+        # Trim edge silence so the pause between videos is set by gap_after alone
+        wav = trim_silence(wav, sample_rate)
+
+        # Calibrate the speech rate model with the measured synthesis
+        rate_model.observe(content, len(wav) / sample_rate, selected_speaker, structure_speed)
+
+        # Fit the measured clip into the structure's duration window
+        wav, duration_report = fit_audio_to_window(
+            wav,
+            sample_rate,
+            duration_window,
+            tolerance=viral_config.duration_tolerance
+        )
+        return video_number, content, wav, duration_report, synthesis_seconds
+
+    def record_fillers():
+        for event in audio_buffer.drain_events():
+            if event.get('type') == 'filler':
+                journal.append('filler', text=event['text'], played_at=event.get('time'))
+
+    def publish(item):
+        nonlocal total_duration_seconds, videos_in_window
+        video_number, content, wav, duration_report, synthesis_seconds = item
+        record_fillers()
+        conversation_history.append(content)
+
+        duration_summary = format_duration_report(viral_config.video_duration, duration_report)
+        if duration_report['in_window']:
+            videos_in_window += 1
+
+        # Calculate actual duration
+        actual_duration = duration_report['achieved_duration']
+        total_duration_seconds += actual_duration
+
+        print(f"Video {video_number} duration - {duration_summary}")
+        logger.info(f"Video {video_number} duration - {duration_summary}")
+
+        # Save audio to file in the background, faded in and out at the trimmed edges
+        apply_edge_fades(wav, sample_rate)
+        # The file gets its own normalized copy; the clip queued for playback is normalized by the player
+        file_wav = pool.acquire(len(wav))
+        file_wav[:] = wav
+        normalizer.process(file_wav)
+        audio_filename = writer.submit(
+            os.path.join(audio_save_path, f"video_{video_number}"),
+            file_wav,
+            sample_rate,
+            # Checkpoint: the video is complete once its audio is on disk
+            on_written=lambda path: journal.append('video_saved', video_number=video_number, audio_path=path)
+        )
+        print(f"Audio for Video {video_number} queued for {audio_filename}")
+        logger.info(f"Audio for Video {video_number} queued for {audio_filename}")
+
+        journal.append(
+            'video',
+            video_number=video_number,
+            structure=viral_config.video_structure,
+            framework=viral_config.story_framework,
+            content=content,
+            duration_summary=duration_summary,
+            duration_report=duration_report,
+            synthesis_seconds=synthesis_seconds,
+            audio_path=audio_filename,
+            gap_after=structure_pause
+        )
+
+        # Put audio in the playback buffer (blocks while it is full), with a pause after the video
+        audio_buffer.put(wav, sample_rate, gap_after=structure_pause)
+
+        # Update progress with enhanced information
+        progress_info = {
+            'total_duration_seconds': total_duration_seconds,
+            'videos_completed': len(conversation_history),
+            'total_videos': viral_config.num_videos,
+            'current_structure': viral_config.video_structure,
+            'current_framework': viral_config.story_framework,
+            'target_duration': viral_config.video_duration,
+            'achieved_duration': actual_duration,
+            'estimated_remaining': (viral_config.num_videos - len(conversation_history)) * estimate_duration(content),
+            'writer_queue_depth': writer.queue_depth(),
+            **audio_buffer.depth()
+        }
+        progress_queue.put(progress_info)
+
+        # Check if we've hit the desired duration (if specified)
+        if desired_duration_seconds > 0 and total_duration_seconds >= desired_duration_seconds:
+            stop_event.set()
+        return item
+
+    # Define the llm_api function, bounding generation by the audio duration budget
+    def llm_api(prompt, duration_budget=None):
+        return call_llm_api(
+            prompt,
+            duration_budget=duration_budget,
+            rate_model=rate_model,
+            speaker=selected_speaker,
+            speed=structure_speed
+        )
+
+    def estimate_duration(text):
+        """Spoken duration of text for the selected speaker and structure speed"""
+        return estimate_tiktok_duration(
+            text,
+            rate_model=rate_model,
+            speaker=selected_speaker,
+            speed=structure_speed
+        )
 
     # Attach llm_api to character_config for topic generation
     ViralCharacterConfig.llm_api = staticmethod(llm_api)
 
-    # Start content generation thread
-    generator_thread = Thread(target=generate_video_content)
-    generator_thread.daemon = True
-    generator_thread.start()
+    # Initialize the ViralCharacter with the llm_api function
+    character = ViralCharacter(llm_api, rate_model=rate_model, speaker=selected_speaker)
 
     audio_save_path = os.path.join(os.getcwd(), f"{output_filename}_audio")
     os.makedirs(audio_save_path, exist_ok=True)
 
-    while not stop_event.is_set():
-        # Pause if pause_event is set
-        if pause_event.is_set():
-            time.sleep(1)
-            continue
-
-        try:
-            # Check if we've created all requested videos
-            if videos_created >= viral_config.num_videos and content_queue.empty():
-                break
-
-            # Get content from queue
-            try:
-                content, estimated_duration = content_queue.get(timeout=1)
-            except queue.Empty:
-                continue  # No content available yet, loop again
-
-            # Update transcript with more detailed formatting
-            conversation_transcript += f"\n=== Video {len(conversation_history) + 1} ===\n"
-            conversation_transcript += f"Structure: {viral_config.video_structure}\n"
-            conversation_transcript += f"Framework: {viral_config.story_framework}\n"
-            conversation_transcript += f"Duration: {estimated_duration:.1f}s\n"
-            conversation_transcript += f"Content:\n{content}\n"
-            conversation_history.append(content)
-
-            # Generate speech with structure-appropriate pacing
-            structure_speed = 0.85  # Base speed
-            if 'Tutorial' in viral_config.video_structure:
-                structure_speed = 0.9  # Slightly faster for tutorials
-            elif 'Story' in viral_config.video_structure:
-                structure_speed = 0.8  # Slower for stories
-
-            # Generate the audio
-            wav = tts_model.tts(
-                text=content,
-                speaker=selected_speaker,
-                speed=structure_speed
+    # Stage graph: video config -> script (prompt + LLM + clean) -> fit -> tts -> post-process -> sink
+    pipeline = Pipeline(
+        "viral",
+        video_configs(),
+        [
+            Stage("script", write_script, concurrency=LLM_CONCURRENCY, maxsize=STAGE_QUEUE_SIZE),
+            Stage("fit", fit_script, maxsize=STAGE_QUEUE_SIZE),
+            Stage("tts", synthesize, concurrency=TTS_CONCURRENCY, maxsize=STAGE_QUEUE_SIZE),
+            Stage("post-process", post_process, maxsize=STAGE_QUEUE_SIZE),
+            Stage("sink", publish, maxsize=STAGE_QUEUE_SIZE),
+        ],
+        stop_event=stop_event,
+        pause_event=pause_event
+    )
+    pipeline.on_cancel(audio_buffer.wake)
+    pipeline.run()
+    # Observations the speech rate model has not saved yet
+    rate_model.close()
+
+    record_fillers()
+    logger.info(f"Audio buffer pool: {pool.stats()}")
+    # Finish writing queued audio files before reporting
+    writer.close()
+
+    journal.append(
+        'end',
+        total_videos=len(conversation_history),
+        total_duration_seconds=total_duration_seconds,
+        videos_in_window=videos_in_window
+    )
+    journal.close()
+
+    # Save enhanced transcript, derived from the journal
+    def format_record(record):
+        if record['type'] == 'video':
+            return (
+                f"\n=== Video {record['video_number']} ===\n"
+                f"Structure: {record['structure']}\n"
+                f"Framework: {record['framework']}\n"
+                f"Duration: {record['duration_summary']}\n"
+                f"Content:\n{record['content']}\n"
             )
+        if record['type'] == 'filler':
+            return f"\n[Filler] {record['text']}\n"
+        return None
 
-            # Process audio
-            wav = np.array(wav, dtype=np.float32)
-            wav = wav / np.max(np.abs(wav))
-
-            # Calculate actual duration
-            actual_duration = len(wav) / tts_model.synthesizer.output_sample_rate
-            total_duration_seconds += actual_duration
-
-            # Put audio in queue
-            audio_queue.put(wav)
-
-            # Save audio to file
-            audio_filename = os.path.join(audio_save_path, f"video_{len(conversation_history)}.wav")
-            # Save audio using soundfile
-            sf.write(audio_filename, wav, samplerate=tts_model.synthesizer.output_sample_rate)
-            print(f"Audio for Video {len(conversation_history)} saved to {audio_filename}")
-            logger.info(f"Audio for Video {len(conversation_history)} saved to {audio_filename}")
-
-            # Update progress with enhanced information
-            progress_info = {
-                'total_duration_seconds': total_duration_seconds,
-                'videos_completed': len(conversation_history),
-                'total_videos': viral_config.num_videos,
-                'current_structure': viral_config.video_structure,
-                'current_framework': viral_config.story_framework,
-                'estimated_remaining': (viral_config.num_videos - len(conversation_history)) * estimated_duration
-            }
-            progress_queue.put(progress_info)
-
-            # Check if we've hit the desired duration (if specified)
-            if desired_duration_seconds > 0 and total_duration_seconds >= desired_duration_seconds:
-                stop_event.set()
-                break
-
-            # Dynamic pause between videos based on structure
-            pause_time = 0.5
-            if 'Story' in viral_config.video_structure:
-                pause_time = 0.8  # Longer pause after stories
-            elif 'Quick' in viral_config.video_structure:
-                pause_time = 0.3  # Shorter pause for quick content
-            time.sleep(pause_time)
-
-        except Exception as e:
-            if stop_event.is_set():
-                break
-            logger.error(f"Error in video generation loop: {e}", exc_info=True)
-            print(f"Error in video generation loop: {e}")
-            time.sleep(1)
-
-    # Save enhanced transcript
     try:
-        with open(f"{output_filename}.txt", "w", encoding="utf-8") as f:
-            f.write(f"=== TikTok Content Generation Report ===\n")
-            f.write(f"Structure: {viral_config.video_structure}\n")
-            f.write(f"Framework: {viral_config.story_framework}\n")
-            f.write(f"Total Videos: {len(conversation_history)}\n")
-            f.write(f"Total Duration: {total_duration_seconds:.2f} seconds\n\n")
-            f.write(conversation_transcript)
+        header = (
+            f"=== TikTok Content Generation Report ===\n"
+            f"Structure: {viral_config.video_structure}\n"
+            f"Framework: {viral_config.story_framework}\n"
+            f"Total Videos: {len(conversation_history)}\n"
+            f"Total Duration: {total_duration_seconds:.2f} seconds\n"
+            f"Videos Inside Duration Window: {videos_in_window}/{len(conversation_history)}\n\n"
+        )
+        export_report(journal.path, f"{output_filename}.txt", format_record, header=header)
     except Exception as e:
         logger.error(f"Error saving transcript: {e}", exc_info=True)
         print(f"Error saving transcript: {e}")
 
     # Cleanup
     stop_event.set()
-    generator_thread.join(timeout=1)
 
     print(f"\nTikTok video generation completed:")
     print(f"- Total videos created: {len(conversation_history)}")
@@ -263,6 +413,7 @@ def viral_generator_process(
         print(f"- Average duration per video: {total_duration_seconds/len(conversation_history):.2f} seconds")
     else:
         print("- No videos were created.")
-    print(f"- Transcript saved to: {output_filename}.txt")
+    print(f"- Transcript saved to: {output_filename}.txt (journal: {journal.path})")
     print(f"- Audio files saved in: {audio_save_path}")
+    print(f"- Audio writer: {format_writer_stats(writer.stats())}")
     logger.info("TikTok video generation completed.")